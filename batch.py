@@ -0,0 +1,221 @@
+"""
+Headless batch planning. Runs everything up to (but not including) the drawing for many images at once, so images can be planned ahead of time
+(on any OS, no Paint window or monitor required) and only drawn later.
+
+Images are planned concurrently across a process pool, with at most `--max-in-flight` images submitted at any one time so memory stays bounded on large directories.
+For every input image, the following is written to `<output dir>/<image name>/` (see plan_dir_names):
+    palette.json        the palette, see Palette.save
+    palette.png         the palette as an image
+    preview.png         what the processed image looks like once drawn
+    instructions        the DBM instruction bundle, see instructions/from_processed_image.py, checked to draw exactly the preview (see instructions/verify.py)
+    plan.json           (only with --time-budget) the scale, STROKE_SIZE and cleanup picked to fit the budget, see instructions/budget.py
+    fidelity.json       how close the preview is to the original image, with comparison.png and delta_e_processed.png, see image_processing/image/fidelity.py
+
+Usage:
+    python batch.py [input directory or glob] [output directory] [--workers N] [--max-in-flight N] [--size WIDTHxHEIGHT] [--time-budget SECONDS]
+Defaults for everything are taken from settings.env.
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from dotenv import dotenv_values
+
+from image_processing import create_palette, open_image, create_processed_image, save_image, Palette
+from image_processing.image.fidelity import fidelity_report
+from image_processing.image.resize import set_target_size, target_size, parse_size
+from instructions import from_processed_image
+from instructions.budget import plan_for_budget
+from instructions.cost_model import CostModel
+from instructions.verify import check_instructions
+from logger import PROGRESS_LOG
+
+
+_settings = dotenv_values("settings.env")
+BATCH_INPUT = _settings.get("BATCH_INPUT") or "./images"
+BATCH_OUTPUT_DIR = _settings.get("BATCH_OUTPUT_DIR") or "./output"
+
+IMAGE_SUFFIXES = [".png", ".jpeg", ".jpg"]
+
+# names of the timed stages of planning a single image, in order
+STAGES = ("open", "palette", "quantize", "budget", "instructions", "verify", "write", "fidelity")
+
+
+def find_images(source: str) -> list[Path]:
+    """Return all image paths in `source`, which is either a directory or a glob pattern (ie. ./images/*.jpg)."""
+    source_path = Path(source)
+    if source_path.is_dir():
+        paths = source_path.iterdir()
+    else:
+        paths = (Path(p) for p in glob.glob(source, recursive=True))
+    return sorted(p for p in paths if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def plan_dir_names(image_paths: list[Path]) -> list[str]:
+    """The name of the directory every image in `image_paths` is planned to, its name without the suffix (ie. "cat" for cat.jpg).
+    Images that would share one (ie. cat.jpg and cat.png) are told apart by their suffix ("cat_jpg", "cat_png"), and by a number after that if still the same (ie. from different directories)."""
+    stem_counts = Counter(path.stem for path in image_paths)
+    names = [path.stem if stem_counts[path.stem] == 1 else f"{path.stem}_{path.suffix.lstrip(".").lower()}"
+             for path in image_paths]
+
+    name_counts = Counter(names)
+    seen: Counter[str] = Counter()
+    for i, name in enumerate(names):
+        if name_counts[name] > 1:
+            seen[name] += 1
+            names[i] = f"{name}_{seen[name]}"
+    return names
+
+
+def _init_worker(size: tuple[int, int]) -> None:
+    """Process pool initializer. Every worker resizes to the same target size, which is only computed once in the main process."""
+    set_target_size(size)
+
+
+def plan_image(image_path: Path, output_dir: Path, time_budget: float | None = None, model: CostModel | None = None, palette: Palette | None = None) -> dict[str, float]:
+    """Create the palette, processed image and instructions for one image, and write them all to `output_dir`. Returns the seconds spent in each stage (see STAGES).
+    With a `time_budget` (seconds), the image is planned to be drawn within it using the cost `model` (see instructions/budget.py).
+    A `palette` already created for the image is used as is, rather than creating it again."""
+    timings = {}
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    img = open_image(image_path)
+    timings["open"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if palette is None:
+        palette = create_palette(img)
+    timings["palette"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processed_img = create_processed_image(img, palette)
+    timings["quantize"] = time.perf_counter() - start
+
+    pitch = 1
+    preview_img = processed_img
+    if time_budget is not None:
+        start = time.perf_counter()
+        budget_plan = plan_for_budget(
+            img, processed_img, palette, time_budget, model)
+        budget_plan.save(output_dir / "plan.json")
+        processed_img = budget_plan.processed_image
+        pitch = budget_plan.pitch
+        preview_img = budget_plan.preview()
+        timings["budget"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # already inside a worker process, so don't start yet another process pool per image
+    from_processed_image(processed_img, palette,
+                         output_dir / "instructions", parallel=False, pitch=pitch)
+    timings["instructions"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    check_instructions(output_dir / "instructions", processed_img, palette, pitch)
+    timings["verify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    palette.save(output_dir / "palette.json")
+    palette.to_image().save(output_dir / "palette.png")
+    save_image(preview_img, palette, output_dir / "preview.png")
+    timings["write"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fidelity_report(output_dir, img, preview_img, palette)
+    timings["fidelity"] = time.perf_counter() - start
+
+    return timings
+
+
+def run_batch(image_paths: list[Path], output_dir: Path, workers: int | None = None, max_in_flight: int | None = None, time_budget: float | None = None) -> dict[str, float]:
+    """Plan every image in `image_paths` across a process pool, writing outputs to a subdirectory of `output_dir` per image. See plan_image for `time_budget`.
+    Returns the summed seconds spent in each stage across all images that were planned successfully."""
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 2
+
+    totals = {stage: 0.0 for stage in STAGES}
+    num_done = 0
+    num_failed = 0
+
+    def collect(done: set[concurrent.futures.Future]) -> None:
+        nonlocal num_done, num_failed
+        for future in done:
+            image_path = futures[future]
+            try:
+                timings = future.result()
+            except Exception as e:
+                num_failed += 1
+                PROGRESS_LOG.log(f"FAILED TO PLAN {image_path}: {e!r}")
+                continue
+
+            num_done += 1
+            for stage, seconds in timings.items():
+                totals[stage] += seconds
+            PROGRESS_LOG.log(f"PLANNED {image_path} ({
+                             num_done + num_failed}/{len(image_paths)})")
+
+    # calibrated once here rather than in every worker
+    model = CostModel.calibrated() if time_budget is not None else None
+
+    start = time.perf_counter()
+    futures: dict[concurrent.futures.Future, Path] = {}
+    pending: set[concurrent.futures.Future] = set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(target_size(),)) as executor:
+        for image_path, dir_name in zip(image_paths, plan_dir_names(image_paths)):
+            # bounded in-flight queue, wait for something to finish before submitting more
+            if len(pending) >= max_in_flight:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+
+            future = executor.submit(
+                plan_image, image_path, output_dir / dir_name, time_budget, model)
+            futures[future] = image_path
+            pending.add(future)
+
+        done, _ = concurrent.futures.wait(pending)
+        collect(done)
+    elapsed = time.perf_counter() - start
+
+    PROGRESS_LOG.log(f"BATCH FINISHED: {num_done} planned, {num_failed} failed in {
+                     elapsed:.2f}s ({num_done / elapsed if elapsed else 0:.3f} images/sec)")
+    for stage, seconds in totals.items():
+        PROGRESS_LOG.log(f"    {stage:<12} {seconds:>10.2f}s total, {
+                         seconds / num_done if num_done else 0:.3f}s per image")
+
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plan many images without drawing them.")
+    parser.add_argument("input", nargs="?", default=BATCH_INPUT,
+                        help="directory or glob of input images")
+    parser.add_argument("output", nargs="?", default=BATCH_OUTPUT_DIR,
+                        help="directory to write each image's outputs to")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="maximum images submitted at once (default: twice the workers)")
+    parser.add_argument("--size", type=parse_size, default=None,
+                        help="WIDTHxHEIGHT to resize images to fit in, instead of TARGET_SIZE or the monitor")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="seconds each drawing should take at most, picks the scale, stroke size and cleanup to fit (see instructions/budget.py)")
+    args = parser.parse_args()
+
+    if args.size is not None:
+        set_target_size(args.size)
+
+    image_paths = find_images(args.input)
+    PROGRESS_LOG.log(f"BEGINNING BATCH OF {len(image_paths)} IMAGES FROM {
+                     args.input} TO {args.output}")
+    run_batch(image_paths, Path(args.output),
+              args.workers, args.max_in_flight, args.time_budget)
+
+
+if __name__ == '__main__':
+    main()
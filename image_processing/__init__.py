@@ -1,5 +1,5 @@
-from image_processing.image import show_image, create_processed_image
-from image_processing.palette import create_palette, open_image, Palette
+from image_processing.image import show_image, save_image, create_processed_image
+from image_processing.palette import create_palette, create_shared_palette, open_image, Palette
 
 
 # open_image -> create_image -> (optional) show_image  <- add config setting for this
@@ -0,0 +1,30 @@
+"""
+Cleanup filters for processed images (planes of palette indices, see from_image.py), trading a little accuracy for fewer strokes to draw.
+"""
+
+import numpy as np
+
+
+def remove_short_runs(processed_image: np.ndarray, min_run: int) -> np.ndarray:
+    """Return a copy of `processed_image` where every horizontal run of one color shorter than `min_run` pixels takes the color of the run to its left, so it merges into it.
+    The first run of every row is always kept. A `min_run` of 1 or less changes nothing."""
+    if min_run <= 1:
+        return processed_image.copy()
+
+    rows, cols = processed_image.shape
+    flat = processed_image.ravel()
+
+    # a run starts at the start of every row, and wherever the color changes
+    is_start = np.ones(flat.shape, dtype=bool)
+    is_start[1:] = flat[1:] != flat[:-1]
+    is_start[::cols] = True
+    starts = np.flatnonzero(is_start)
+    lengths = np.diff(np.append(starts, flat.size))
+
+    # short runs take the color of the closest kept run before them, found by forward filling the indices of kept runs
+    keep = (lengths >= min_run) | (starts % cols == 0)
+    kept_index = np.where(keep, np.arange(starts.size), 0)
+    np.maximum.accumulate(kept_index, out=kept_index)
+    colors = flat[starts][kept_index]
+
+    return np.repeat(colors, lengths).reshape(rows, cols)
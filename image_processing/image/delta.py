@@ -0,0 +1,56 @@
+"""
+Delta processed images, for drawing a frame on top of the previous frame instead of from scratch.
+
+A delta image is a processed image (see from_image.py) where every pixel that is the same as in the previous frame is UNCHANGED instead of a palette index.
+UNCHANGED is never the index of a palette color, so no instructions are ever made for those pixels.
+"""
+
+import numpy as np
+
+
+# marks pixels that don't need drawing, far above the number of colors in any palette
+UNCHANGED = 255
+
+
+def delta_image(previous: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """The delta image that turns the processed image `previous` into `current` once drawn on top of it."""
+    return np.where(previous == current, np.uint8(UNCHANGED), current)
+
+
+def apply_delta(previous: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    """The processed image that results from drawing `delta` on top of `previous`."""
+    return np.where(delta == UNCHANGED, previous, delta)
+
+
+def bridge_gaps(delta: np.ndarray, wanted: np.ndarray) -> np.ndarray:
+    """Fill gaps of UNCHANGED pixels in `delta` that sit between two drawn runs of the same color, where that color is what the whole gap should be anyway (in `wanted`, the processed image).
+    Those pixels are already right on the canvas, so drawing over them is harmless, and it joins the two strokes on either side into one."""
+    rows, cols = delta.shape
+    flat = delta.ravel()
+
+    is_start = np.ones(flat.shape, dtype=bool)
+    is_start[1:] = flat[1:] != flat[:-1]
+    is_start[::cols] = True
+    starts = np.flatnonzero(is_start)
+    lengths = np.diff(np.append(starts, flat.size))
+    colors = flat[starts]
+
+    # gaps with a drawn run of the same color on both sides, on the same row
+    same_row_before = np.zeros(starts.shape, dtype=bool)
+    same_row_before[1:] = starts[1:] % cols != 0
+    same_row_after = np.zeros(starts.shape, dtype=bool)
+    same_row_after[:-1] = starts[1:] % cols != 0
+    left = np.roll(colors, 1)
+    right = np.roll(colors, -1)
+    candidate = (colors == UNCHANGED) & same_row_before & same_row_after & (
+        left == right) & (left != UNCHANGED)
+    if not candidate.any():
+        return delta
+
+    # of those, the gaps where every pixel should be that color
+    fill_color = np.where(candidate, left, UNCHANGED).astype(np.uint8)
+    matches = wanted.ravel() == np.repeat(fill_color, lengths)
+    candidate &= np.add.reduceat(matches, starts) == lengths
+
+    colors = np.where(candidate, fill_color, colors)
+    return np.repeat(colors, lengths).reshape(rows, cols)
@@ -0,0 +1,171 @@
+"""
+Fidelity metrics, how close a drawing is to the original image. Everything that makes drawing faster (cleanup, sampling, wider strokes, coarse passes) costs some closeness, this measures how much.
+
+Up to three versions of an image are compared:
+    source      the original image, as opened (and resized) by open_image
+    processed   the image quantized to the palette, as planned to be drawn (ie. preview.png of batch.py)
+    canvas      what was actually drawn, ie. a drawing saved from Paint
+Closeness is the CIE76 delta E of every pixel, like budget.py and repair.py use. Versions of a different size than the source (ie. planned at a smaller scale) are scaled to its size first, nearest neighbour.
+Processed images can be given as palette indices (with their palette) or RGB, everything is vectorized over whole images, and images are only ever written to disk, so it all runs headless.
+
+Usage (from the repository root), to compare files:
+    python -m image_processing.image.fidelity [source image] [processed image] [--canvas CANVAS] [--output DIRECTORY] [--size WIDTHxHEIGHT]
+"""
+
+import argparse
+import json
+from dataclasses import dataclass, asdict
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_processing.image.resize import set_target_size, parse_size
+from image_processing.palette.color_space import rgb_to_lab
+from image_processing.palette.get_image_colors import open_image
+from image_processing.palette.palette import Palette
+
+
+# CIE76 delta E of about 2.3 is the smallest difference most people notice, see FidelityStats.perceptible
+PERCEPTIBLE_DELTA_E = 2.3
+# delta E shown as the hottest color of heat maps, anything further is clipped to it
+HEAT_MAP_MAX_DELTA_E = 50
+# colors of the heat map from a delta E of 0 to HEAT_MAP_MAX_DELTA_E, evenly spaced and blended in between
+HEAT_MAP_COLORS = np.asarray(((0, 0, 0), (40, 0, 120), (200, 0, 80), (255, 140, 0), (255, 255, 200)),
+                             dtype=np.float32)
+# pixels between the images of a side by side comparison
+SIDE_BY_SIDE_GAP = 4
+
+
+@dataclass
+class FidelityStats:
+    """Statistics of the delta E of every pixel between two versions of an image."""
+    mean: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    perceptible: float      # fraction of pixels at least PERCEPTIBLE_DELTA_E apart
+
+    @classmethod
+    def from_delta_e(cls, delta_e: np.ndarray) -> "FidelityStats":
+        """The statistics of a `delta_e` map, see delta_e_map."""
+        p50, p90, p99 = np.percentile(delta_e, (50, 90, 99))
+        return cls(float(delta_e.mean()), float(p50), float(p90), float(p99), float(delta_e.max()),
+                   float(np.count_nonzero(delta_e >= PERCEPTIBLE_DELTA_E) / delta_e.size))
+
+
+def _fit(image: np.ndarray, shape: tuple[int, ...]) -> np.ndarray:
+    """Scale `image` to the rows and columns of `shape`, nearest neighbour. Returned as is if it already is that size."""
+    rows, cols = shape[:2]
+    if image.shape[:2] == (rows, cols):
+        return image
+    row_index = np.arange(rows) * image.shape[0] // rows
+    col_index = np.arange(cols) * image.shape[1] // cols
+    return image[np.ix_(row_index, col_index)]
+
+
+def to_rgb(image: np.ndarray, palette: Palette | None = None) -> np.ndarray:
+    """`image` as RGB, either already RGB or a processed image of palette indices (with its `palette`)."""
+    if image.ndim == 3:
+        return image
+    if palette is None:
+        raise ValueError("A processed image of palette indices needs its palette.")
+    return palette.rgb[image]
+
+
+def to_lab(image: np.ndarray, palette: Palette | None = None) -> np.ndarray:
+    """`image` (see to_rgb) in CIE L*ab. A processed image only needs its palette's colors converted, rather than every pixel."""
+    if image.ndim == 3:
+        return rgb_to_lab(image)
+    if palette is None:
+        raise ValueError("A processed image of palette indices needs its palette.")
+    return palette.lab[image]
+
+
+def delta_e_map(reference: np.ndarray, compare: np.ndarray, palette: Palette | None = None) -> np.ndarray:
+    """The CIE76 delta E of every pixel of `compare` from `reference` (see to_lab for both, sharing `palette` if either is a processed image), the size of `reference`."""
+    reference_lab = to_lab(reference, palette)
+    compare_lab = _fit(to_lab(compare, palette), reference_lab.shape)
+    return np.linalg.norm(reference_lab - compare_lab, axis=-1)
+
+
+def heat_map(delta_e: np.ndarray, max_delta_e: float = HEAT_MAP_MAX_DELTA_E) -> Image.Image:
+    """Render a `delta_e` map as an image, from black (no difference) through HEAT_MAP_COLORS up to `max_delta_e`."""
+    stops = np.linspace(0, max_delta_e, len(HEAT_MAP_COLORS))
+    clipped = np.clip(delta_e, 0, max_delta_e)
+    channels = [np.interp(clipped, stops, HEAT_MAP_COLORS[:, channel])
+                for channel in range(3)]
+    return Image.fromarray(np.stack(channels, axis=-1).astype(np.uint8), "RGB")
+
+
+def side_by_side(images: list[np.ndarray], palette: Palette | None = None) -> Image.Image:
+    """Put `images` (see to_rgb, sharing `palette`) next to each other, all scaled to the size of the first, with SIDE_BY_SIDE_GAP white pixels in between."""
+    rows, cols = images[0].shape[:2]
+    gap = np.full((rows, SIDE_BY_SIDE_GAP, 3), 255, dtype=np.uint8)
+    parts = []
+    for image in images:
+        if parts:
+            parts.append(gap)
+        parts.append(_fit(to_rgb(image, palette), (rows, cols)))
+    return Image.fromarray(np.concatenate(parts, axis=1), "RGB")
+
+
+def fidelity_report(output_dir: Path, source: np.ndarray, processed: np.ndarray, palette: Palette | None = None,
+                    canvas: np.ndarray | None = None) -> dict[str, FidelityStats]:
+    """Compare the `source` image (RGB) to its `processed` image (see to_rgb), and to the `canvas` (RGB) actually drawn if given. Writes to `output_dir`:
+        fidelity.json           the FidelityStats of every comparison
+        comparison.png          the source, processed image and canvas side by side
+        delta_e_<name>.png      a heat map of every comparison, see heat_map
+    The comparisons are "processed" (source to processed), and with a canvas, "canvas" (source to canvas) and "replay" (processed to canvas, what went wrong while drawing).
+    Returns the stats by comparison name."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    comparisons = {"processed": (source, processed)}
+    if canvas is not None:
+        comparisons["canvas"] = (source, canvas)
+        comparisons["replay"] = (_fit(to_rgb(processed, palette), source.shape), canvas)
+
+    stats = {}
+    for name, (reference, compare) in comparisons.items():
+        delta_e = delta_e_map(reference, compare, palette)
+        stats[name] = FidelityStats.from_delta_e(delta_e)
+        heat_map(delta_e).save(output_dir / f"delta_e_{name}.png")
+
+    side_by_side([source, processed] if canvas is None else [source, processed, canvas],
+                 palette).save(output_dir / "comparison.png")
+    with open(output_dir / "fidelity.json", "w") as f:
+        json.dump({name: asdict(stat) for name, stat in stats.items()}, f, indent=4)
+    return stats
+
+
+def _open_rgb(path: Path) -> np.ndarray:
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure how close a planned (and drawn) image is to the original, without a display.")
+    parser.add_argument("source", help="the original image, resized like it is when planned")
+    parser.add_argument("processed", help="the planned image, ie. preview.png of batch.py")
+    parser.add_argument("--canvas", default=None,
+                        help="a drawing of it saved from Paint, to also measure what went wrong while drawing")
+    parser.add_argument("--output", default="./output/fidelity",
+                        help="directory to write the stats and images to")
+    parser.add_argument("--size", type=parse_size, default=None,
+                        help="WIDTHxHEIGHT the image was resized to fit in when planned, instead of TARGET_SIZE or the monitor")
+    args = parser.parse_args()
+
+    if args.size is not None:
+        set_target_size(args.size)
+    source = open_image(Path(args.source))
+    canvas = _open_rgb(Path(args.canvas)) if args.canvas else None
+    stats = fidelity_report(Path(args.output), source,
+                            _open_rgb(Path(args.processed)), canvas=canvas)
+    for name, stat in stats.items():
+        print(f"{name:<10} mean {stat.mean:6.2f}  p50 {stat.p50:6.2f}  p90 {stat.p90:6.2f}  p99 {stat.p99:6.2f}  max {stat.max:6.2f}  "
+              f"perceptible {stat.perceptible:6.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Repairs of existing drawings. An existing canvas (ie. a drawing saved from Paint, partially done or botched) is compared to the processed image it should look like,
+and a delta image (see delta.py) is made of only the pixels that are wrong, so only those are drawn again.
+
+A canvas pixel is right if its color is within a tolerance (CIE76 delta E) of the palette color it should be. Drawn colors are rarely exact (brush anti-aliasing, JPEG saves), hence the tolerance.
+"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_processing.image.delta import UNCHANGED
+from image_processing.palette import Palette
+from image_processing.palette.color_space import rgb_to_lab
+
+
+def open_canvas(path: Path, shape: tuple[int, ...]) -> np.ndarray:
+    """Open a saved canvas as an RGB array with the same rows and columns as `shape`. Canvases smaller than that are padded with black (so the padding is redrawn), larger ones are cropped."""
+    with Image.open(path) as img:
+        canvas = np.asarray(img.convert("RGB"))
+    rows, cols = shape[:2]
+    fitted = np.zeros((rows, cols, 3), dtype=np.uint8)
+    fitted[:canvas.shape[0], :canvas.shape[1]] = canvas[:rows, :cols]
+    return fitted
+
+
+def repair_image(canvas: np.ndarray, processed_image: np.ndarray, palette: Palette, tolerance: float) -> np.ndarray:
+    """The delta image that fixes `canvas` (RGB, the same size as `processed_image`): every pixel further than `tolerance` delta E from the palette color it should be is redrawn, the rest are UNCHANGED."""
+    target_lab = palette.lab[processed_image]
+    distance = np.linalg.norm(rgb_to_lab(canvas) - target_lab, axis=-1)
+    return np.where(distance > tolerance, processed_image, np.uint8(UNCHANGED))
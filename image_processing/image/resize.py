@@ -1,11 +1,55 @@
-from screeninfo import get_monitors
 from PIL.Image import Image
+from dotenv import dotenv_values
 # Resizes images that are too large to fit the size of the current monitor, since it'll be re-drawn in paint anyway
 
+# Optional "WIDTHxHEIGHT" override of the target size, so images can be processed without a monitor (headless)
+_TARGET_SIZE_SETTING = dotenv_values("settings.env").get("TARGET_SIZE")
+
+# How much of the smallest monitor the image is allowed to take up
+MONITOR_FRACTION = 0.75
+
+# target size is computed at most once per process, see target_size()
+_target_size: tuple[int, int] | None = None
+
+
+def parse_size(size: str) -> tuple[int, int]:
+    """Parse a "WIDTHxHEIGHT" string (ie. 1440x810) into a (width, height) tuple."""
+    width, height = size.lower().split("x")
+    return (int(width), int(height))
+
+
+def set_target_size(size: tuple[int, int] | None) -> None:
+    """Override the size images are resized to fit in. Useful when there is no monitor to query, such as headless batch runs. Pass None to go back to querying the monitors."""
+    global _target_size
+    _target_size = size
 
-def resize_to_monitor(image: Image) -> Image:
-    """Resize the image to fit in the smallest monitor on the system."""
-    min_size = sorted(get_monitors(), key=lambda m: m.width * m.height)[0]
 
-    image.thumbnail((min_size.width * 0.75, min_size.height * 0.75))
+def target_size() -> tuple[int, int]:
+    """Return the (width, height) box images are resized to fit in.
+    Either the TARGET_SIZE setting, or a fraction of the smallest monitor on the system. Monitors are only enumerated once per process."""
+    global _target_size
+    if _target_size is None:
+        if _TARGET_SIZE_SETTING:
+            _target_size = parse_size(_TARGET_SIZE_SETTING)
+        else:
+            # imported here so that headless runs with a TARGET_SIZE never need screeninfo
+            from screeninfo import get_monitors
+            min_size = sorted(get_monitors(), key=lambda m: m.width * m.height)[0]
+            _target_size = (int(min_size.width * MONITOR_FRACTION),
+                            int(min_size.height * MONITOR_FRACTION))
+    return _target_size
+
+
+def draft_to_monitor(image: Image) -> Image:
+    """Let the decoder of an image that isn't loaded yet decode it at a reduced scale that is still at least the size resize_to_monitor resizes to.
+    Only does anything for JPEGs (draft mode decodes at 1/2, 1/4 or 1/8 scale), so they are never decoded at full resolution."""
+    # picks the smallest scale that is still at least the target size
+    image.draft("RGB", target_size())
+    return image
+
+
+def resize_to_monitor(image: Image) -> Image:
+    """Resize the image to fit in the smallest monitor on the system (or the overridden target size).
+    Resizing only filters properly in RGB, palette ("P") and grayscale ("L") images resize about as bad as nearest neighbour, so convert them first. See draft_to_monitor for loading JPEGs smaller."""
+    image.thumbnail(target_size())
     return image
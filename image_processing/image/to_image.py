@@ -4,44 +4,36 @@ This technically doesn't need to be a part of the Redrawer program, but is rathe
 The process is as follows:
     1) [all of from_image process]
     2) Translate the output matrix of palette indices to RGB
-    3) (if called) show the image
+    3) (if called) show the image, or save it to a file
 
 """
 
 
+from pathlib import Path
 from image_processing.palette.palette import RGB, Palette
 import numpy as np
 from PIL import Image
-from numba import njit
 
 
-@njit
 def _translate_palette_indices_to_rgb(palette_image_array: np.ndarray, palette_array: np.ndarray) -> np.ndarray:
     """Translates an Numpy array of palette indices (used for drawing directions) to an RGB image array."""
-    image_matrix = np.ones(
-        shape=(
-            # row , col of the pixel in the image
-            *palette_image_array.shape[:2],
-            3    # row, col of the color in palette
-        ), dtype=np.uint8
-    )
+    return palette_array[palette_image_array]
 
-    for row, indices_row in enumerate(palette_image_array):
-        for col, palette_index in enumerate(indices_row):
-            # convert [row][col] index to dim1 index
-            index = palette_index[0] * 10 + palette_index[1]
-            rgb = np.asarray(palette_array[index])
 
-            image_matrix[row, col] = rgb
+def to_image(palette_image_array: np.ndarray, palette: Palette) -> Image.Image:
+    """Translates a numpy array of palette indices (used for drawing directions) to an RGB image array, then converts it to an actual image using PIL."""
+    img_arr = _translate_palette_indices_to_rgb(
+        palette_image_array, palette.rgb)
 
-    return image_matrix
+    return Image.fromarray(img_arr, 'RGB')
 
 
 def show_image(palette_image_array: np.ndarray, palette: Palette) -> None:
-    """Translates a numpy array of palette indices (used for drawing directions) to an RGB image array, then converts it to an actual image using PIL and shows it. 
+    """Translates a numpy array of palette indices (used for drawing directions) to an image and shows it. 
     Used only for seeing what the drawing directions should draw, without having it done."""
-    img_arr = _translate_palette_indices_to_rgb(
-        palette_image_array, palette.asarray())
+    to_image(palette_image_array, palette).show()
+
 
-    img = Image.fromarray(img_arr, 'RGB')
-    img.show()
+def save_image(palette_image_array: np.ndarray, palette: Palette, path: Path) -> None:
+    """Translates a numpy array of palette indices (used for drawing directions) to an image and saves it to `path` (ie. as a PNG preview). Works without a display."""
+    to_image(palette_image_array, palette).save(path)
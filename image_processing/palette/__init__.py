@@ -2,7 +2,7 @@
 # Responsible for reading the image to produce the full color palette.
 # Contains a lot of helper functions to expose these functions below
 
-from image_processing.palette.get_image_colors import create_palette, open_image
+from image_processing.palette.get_image_colors import create_palette, create_shared_palette, open_image
 
 # mainly for type annotations
 from image_processing.palette.palette import Palette
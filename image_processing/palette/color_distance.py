@@ -1,9 +1,22 @@
-from math import sqrt
-from image_processing.palette.palette import RGB, DEFAULT_PALETTE
+"""
+Color distance metrics, and the palette's distinct color search that uses them.
+
+Every metric is registered in METRICS by name (see COLOR_DISTANCE_METHOD in settings.env), and is made of:
+    precompute      converts RGB colors once into whatever the metric compares (RGB itself, or CIE L*ab, see color_space.py)
+    kernel          the distances between many precomputed colors and every palette color at once, a (colors x palette colors) array
+    distinctiveness how far apart colors have to be to both go in the palette, in the metric's own units
+So quantizing an image converts every distinct color of it once, and compares them all to the palette in one vectorized pass (see nearest_palette_colors),
+rather than converting both colors of every pixel and palette color pair again. Register a new metric with register_metric.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
 import numpy as np
-from numba import njit
 from dotenv import dotenv_values
 
+from image_processing.palette.palette import RGB, DEFAULT_PALETTE, pack_rgb
+from image_processing.palette.color_space import rgb_to_lab
 from logger import PROGRESS_LOG
 
 # Different ways of calculating distinctiveness value:
@@ -11,117 +24,186 @@ from logger import PROGRESS_LOG
 # Optimize this by reducing the resolution to a low amount
 
 
-# What kind of color distance method to use, either "redmean", "euclidean", "deltaE", and potentially others. Different methods produce different results.
+# What kind of color distance method to use, any name in METRICS ("redmean", "euclidean", "deltaE", "cie94", "ciede2000"). Different methods produce different results.
 # See below functions to view exactly how different methods are implemented and what they're based off of.
-# deltaE takes the longest (complex calculations) but produces best results
+# ciede2000 matches how different people see colors best, deltaE (CIE76) is close to it for a fraction of the work
 COLOR_DISTANCE_METHOD = dotenv_values("settings.env")["COLOR_DISTANCE_METHOD"]
 
-
-# constant constants, aka don't touch
-# How distinct the colors generated need to be. Default value should be 500.
-# Decreasing generally produces more similar colors
-# Increasing generally produces more different colors
-DISTINCTIVENESS_VALUE = {
-    "redmean": 500,    # default around 500
-    "euclidean": 10,   # default around 10
-    "deltaE": 10       # default around 10
-}[COLOR_DISTANCE_METHOD]  # type: ignore
-
 # Search through only PARTITION_KTH of the most frequent colors to find distinct colors to add to the palette.
 # Smaller the number, faster the distinct colors are found.
-# But after using NJIT, searching for distinct colors isn't terribly time consuming, at least compared to the color matrices
+# But after vectorizing the color distances, searching for distinct colors isn't terribly time consuming, at least compared to quantizing
 # Best not to touch
 PARTITION_KTH = 7000
 
+# colors compared to the palette at once, bounds the memory of the (colors x palette colors) distances and the metric's intermediates
+CHUNK_SIZE = 1 << 16
+
+
+@dataclass(frozen=True)
+class DistanceMetric:
+    name: str
+    # RGB colors (..., 3) to what the kernel compares, float32 (..., 3)
+    precompute: Callable[[np.ndarray], np.ndarray]
+    # precomputed colors (n, 3) and palette colors (m, 3) to their distances (n, m)
+    kernel: Callable[[np.ndarray, np.ndarray], np.ndarray]
+    # How distinct the colors generated need to be.
+    # Decreasing generally produces more similar colors
+    # Increasing generally produces more different colors
+    distinctiveness: float
+
+    def distances(self, colors: np.ndarray, palette_colors: np.ndarray) -> np.ndarray:
+        """The distances between every RGB color in `colors` (n x 3) and every one of `palette_colors` (m x 3), as an (n x m) array."""
+        return self.kernel(self.precompute(colors), self.precompute(palette_colors))
+
+
+METRICS: dict[str, DistanceMetric] = {}
+
+
+def register_metric(metric: DistanceMetric) -> DistanceMetric:
+    """Make `metric` usable as a COLOR_DISTANCE_METHOD. Returns it."""
+    METRICS[metric.name] = metric
+    return metric
+
+
+def get_metric(name: str | None = None) -> DistanceMetric:
+    """The metric registered as `name`, default COLOR_DISTANCE_METHOD."""
+    name = name or COLOR_DISTANCE_METHOD
+    if name not in METRICS:
+        raise ValueError(
+            f"Invalid COLOR_DISTANCE_METHOD \"{name}\". Please provide one of {", ".join(METRICS)}.")
+    return METRICS[name]
+
+
+def _as_float(rgb: np.ndarray) -> np.ndarray:
+    return np.asarray(rgb, dtype=np.float32)
+
 
 # All functions having to do with color distance, whether the colors are near each other, or if colors are distinct
 
-@njit(fastmath=True)
-def _redmean_color_distance(source: np.ndarray, compare: np.ndarray) -> int:
+def _redmean_kernel(colors: np.ndarray, palette_colors: np.ndarray) -> np.ndarray:
     """Utilizes the low-cost approximation algorithm found here:
     https://www.compuphase.com/cmetric.htm
     https://en.wikipedia.org/wiki/Color_difference -> "redmean"
 
     Weighted values to compensate for how humans see colorn differently, but doesn't really work appropriately most times on computers...
     """
-    mean_red = (source[0] + compare[0]) / 2
-    red_diff = source[0] - compare[0]
-    green_diff = source[1] - compare[1]
-    blue_diff = source[2] - compare[2]
-    return int(sqrt(
+    source, compare = palette_colors[None, :, :], colors[:, None, :]
+    mean_red = (source[..., 0] + compare[..., 0]) / 2
+    red_diff = source[..., 0] - compare[..., 0]
+    green_diff = source[..., 1] - compare[..., 1]
+    blue_diff = source[..., 2] - compare[..., 2]
+    return np.sqrt(np.maximum(
         (512 + mean_red) * red_diff * red_diff +
         4 * green_diff * green_diff +
-        (767-red_diff) * blue_diff * blue_diff
-    ))
+        (767-red_diff) * blue_diff * blue_diff, 0))
 
 
-@njit(fastmath=True)
-def _euclid_color_distance(source: np.ndarray, compare: np.ndarray) -> int:
-    """Basic Euclidean color distance using a standard distance formula. A non-weighted version of redmean."""
-    red_diff = source[0] - compare[0]
-    green_diff = source[1] - compare[1]
-    blue_diff = source[2] - compare[2]
-    return int(sqrt(red_diff * red_diff + green_diff * green_diff + blue_diff * blue_diff))
+def _euclid_kernel(colors: np.ndarray, palette_colors: np.ndarray) -> np.ndarray:
+    """Basic Euclidean color distance using a standard distance formula. A non-weighted version of redmean. On L*ab colors, this is Delta E (CIE76)."""
+    diff = colors[:, None, :] - palette_colors[None, :, :]
+    return np.sqrt(np.einsum("nmc,nmc->nm", diff, diff))
 
 
-@njit(fastmath=True)
-def _delta_e_distance(source: np.ndarray, compare: np.ndarray) -> int:
+def _cie94_kernel(colors: np.ndarray, palette_colors: np.ndarray) -> np.ndarray:
+    """
+    Delta E (CIE94) between L*ab colors, with the graphic arts weights (kL = 1, K1 = 0.045, K2 = 0.015). The image's color is the reference, so it decides the chroma weighting.
+    Equations found here: https://en.wikipedia.org/wiki/Color_difference#CIE94
     """
-    Calculate Delta E variance from source color to compare color, using the CIE L*ab color space.
-    Numba can't use external functions (otherwise we'd use skimage.color.rgb2lab), so manually do the calculations/conversions ourselves.
-    To calculate Delta-E, we first must convert RGB to XYZ, then XYZ to L*ab, then euclidean distance of L*ab source and compare
-    Equations found here: https://www.easyrgb.com/en/math.php
+    lab1, lab2 = colors[:, None, :], palette_colors[None, :, :]
+    chroma1 = np.hypot(lab1[..., 1], lab1[..., 2])
+    chroma2 = np.hypot(lab2[..., 1], lab2[..., 2])
+    delta_l = lab1[..., 0] - lab2[..., 0]
+    delta_c = chroma1 - chroma2
+    delta_a = lab1[..., 1] - lab2[..., 1]
+    delta_b = lab1[..., 2] - lab2[..., 2]
+    delta_h_squared = np.maximum(
+        delta_a * delta_a + delta_b * delta_b - delta_c * delta_c, 0)
+
+    weight_c = 1 + 0.045 * chroma1
+    weight_h = 1 + 0.015 * chroma1
+    return np.sqrt(delta_l * delta_l + (delta_c / weight_c) ** 2 + delta_h_squared / (weight_h * weight_h))
+
+
+def _ciede2000_kernel(colors: np.ndarray, palette_colors: np.ndarray) -> np.ndarray:
     """
-    # casts to float32 and creates a copy
-    new_source = source.astype(np.float32)
-    new_compare = compare.astype(np.float32)
-
-    # RGB to XYZ
-    for color in [new_source, new_compare]:
-        color /= 255
-        mask = color > 0.04045
-        color[mask] = np.power((color[mask] + 0.055) / 1.055, 2.4)
-        color[~mask] /= 12.92
-        color *= 100
-        x = color[0] * 0.4124 + color[1] * 0.3576 + color[2] * 0.1805
-        y = color[0] * 0.2126 + color[1] * 0.7152 + color[2] * 0.0722
-        z = color[0] * 0.0193 + color[1] * 0.1192 + color[2] * 0.9505
-        color[:] = [x, y, z]
-
-    # XYZ to CIE L*ab
-    # default: x_ref=95.047, y_ref=100., z_ref=108.883
-    for color in [new_source, new_compare]:
-        color[0] /= 95.047
-        color[1] /= 100
-        color[2] /= 108.883
-
-        mask = color > 0.008856
-        color[mask] = np.cbrt(color[mask])
-        color[~mask] = (7.787 * color[~mask]) + (16/116)
-        # color *= 100
-        L = 116 * color[1] - 16
-        a = 500 * (color[0] - color[1])
-        b = 200 * (color[1] - color[2])
-        color[:] = [L, a, b]
-
-    # can use euclidean color distance since it implements same algorithm anyway
-    return _euclid_color_distance(new_source, new_compare)
-
-
-@njit(fastmath=True)
-def color_distance(source: np.ndarray, compare: np.ndarray) -> int:
+    Delta E (CIEDE2000) between L*ab colors, with kL = kC = kH = 1.
+    Equations found here: https://en.wikipedia.org/wiki/Color_difference#CIEDE2000 (and Sharma et al., "The CIEDE2000 Color-Difference Formula")
+    """
+    lab1, lab2 = colors[:, None, :], palette_colors[None, :, :]
+    l1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    l2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    # a* is stretched for neutral colors
+    mean_chroma = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    mean_chroma_7 = mean_chroma ** 7
+    g = 0.5 * (1 - np.sqrt(mean_chroma_7 / (mean_chroma_7 + 25.0 ** 7)))
+    a1, a2 = a1 * (1 + g), a2 * (1 + g)
+    chroma1, chroma2 = np.hypot(a1, b1), np.hypot(a2, b2)
+    hue1 = np.degrees(np.arctan2(b1, a1)) % 360
+    hue2 = np.degrees(np.arctan2(b2, a2)) % 360
+
+    delta_l = l2 - l1
+    delta_c = chroma2 - chroma1
+    chroma_product = chroma1 * chroma2
+    hue_diff = hue2 - hue1
+    delta_hue = np.where(hue_diff > 180, hue_diff - 360,
+                         np.where(hue_diff < -180, hue_diff + 360, hue_diff))
+    delta_hue = np.where(chroma_product == 0, 0, delta_hue)
+    delta_h = 2 * np.sqrt(chroma_product) * np.sin(np.radians(delta_hue) / 2)
+
+    mean_l = (l1 + l2) / 2
+    mean_c = (chroma1 + chroma2) / 2
+    hue_sum = hue1 + hue2
+    mean_hue = np.where(np.abs(hue1 - hue2) <= 180, hue_sum / 2,
+                        np.where(hue_sum < 360, (hue_sum + 360) / 2, (hue_sum - 360) / 2))
+    mean_hue = np.where(chroma_product == 0, hue_sum, mean_hue)
+
+    t = (1 - 0.17 * np.cos(np.radians(mean_hue - 30))
+         + 0.24 * np.cos(np.radians(2 * mean_hue))
+         + 0.32 * np.cos(np.radians(3 * mean_hue + 6))
+         - 0.20 * np.cos(np.radians(4 * mean_hue - 63)))
+    mean_l_50 = (mean_l - 50) ** 2
+    weight_l = 1 + 0.015 * mean_l_50 / np.sqrt(20 + mean_l_50)
+    weight_c = 1 + 0.045 * mean_c
+    weight_h = 1 + 0.015 * mean_c * t
+    mean_c_7 = mean_c ** 7
+    rotation = (-2 * np.sqrt(mean_c_7 / (mean_c_7 + 25.0 ** 7))
+                * np.sin(np.radians(60 * np.exp(-((mean_hue - 275) / 25) ** 2))))
+
+    term_l = delta_l / weight_l
+    term_c = delta_c / weight_c
+    term_h = delta_h / weight_h
+    return np.sqrt(np.maximum(term_l * term_l + term_c * term_c + term_h * term_h + rotation * term_c * term_h, 0))
+
+
+register_metric(DistanceMetric("redmean", _as_float, _redmean_kernel, 500))       # default around 500
+register_metric(DistanceMetric("euclidean", _as_float, _euclid_kernel, 10))       # default around 10
+register_metric(DistanceMetric("deltaE", rgb_to_lab, _euclid_kernel, 10))         # default around 10
+register_metric(DistanceMetric("cie94", rgb_to_lab, _cie94_kernel, 7))            # default around 7
+register_metric(DistanceMetric("ciede2000", rgb_to_lab, _ciede2000_kernel, 7))    # default around 7
+
+
+def nearest_palette_colors(image_array: np.ndarray, palette_rgb: np.ndarray, metric: DistanceMetric | None = None) -> np.ndarray:
+    """The index of the nearest palette color (of `palette_rgb`, num_colors x 3) to every pixel of the RGB `image_array`, by `metric` (default COLOR_DISTANCE_METHOD).
+    Returned as a uint8 array the shape of the image without its last axis. Every distinct color of the image is only compared once."""
+    metric = metric or get_metric()
+    colors, pixel_colors = np.unique(
+        pack_rgb(image_array).ravel(), return_inverse=True)
+    unique_rgb = np.stack(
+        ((colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF), axis=-1)
+
+    palette_features = metric.precompute(palette_rgb)
+    nearest = np.empty(len(colors), dtype=np.uint8)
+    for start in range(0, len(colors), CHUNK_SIZE):
+        chunk = metric.precompute(unique_rgb[start:start + CHUNK_SIZE])
+        nearest[start:start + CHUNK_SIZE] = np.argmin(
+            metric.kernel(chunk, palette_features), axis=1)
+    return nearest[pixel_colors].reshape(image_array.shape[:-1])
+
+
+def color_distance(source: np.ndarray, compare: np.ndarray) -> float:
     """Returns the color distance between RGB ndarray source and RGB ndarray compare. Uses the color distance method given."""
-    match COLOR_DISTANCE_METHOD:
-        case "redmean":
-            c_dist_func = _redmean_color_distance
-        case "euclidean":
-            c_dist_func = _euclid_color_distance
-        case "deltaE":
-            c_dist_func = _delta_e_distance
-        case _:
-            raise TypeError(
-                "Invalid COLOR_DISTANCE_METHOD for is_near_color function. Please provide a correct color distance function.")
-    return c_dist_func(np.asarray(source), np.asarray(compare))
+    return float(get_metric().distances(np.asarray(source)[None], np.asarray(compare)[None])[0, 0])
 
 
 def is_near_color(source: RGB, compare: RGB, max_distance) -> bool:
@@ -138,10 +220,12 @@ def most_frequent_distinct_RGB(image_array: np.ndarray, num_colors: int = 10) ->
     # see: https://stackoverflow.com/a/26553855
     flattened = image_array.reshape(-1, image_array.shape[-1])
 
-    # next, find the 20 most frequent unique values (with their counts) on axis 0 (prevents flattening the last dimension)
+    # next, find the PARTITION_KTH most frequent unique values (with their counts) on axis 0 (prevents flattening the last dimension)
     values, counts = np.unique(flattened, return_counts=True, axis=0)
-    ind = np.argpartition(-counts, kth=min(len(counts)-1,  # set max partitions to the settings.env specified or the maximum supported by the image
+    top = np.argpartition(-counts, kth=min(len(counts)-1,  # set max partitions to the settings.env specified or the maximum supported by the image
                           PARTITION_KTH))[:PARTITION_KTH]
+    # argpartition leaves them in no particular order, so sort them to go through the most frequent first (and ind[0] really is the most frequent)
+    ind = top[np.argsort(-counts[top], kind="stable")]
 
     # seperate out colors that are non-distinct. Since the default palette is guaranteed to be there, make them all distinctive colors.
     # segregate default palette colors and custom distinctive colors, and apply different weights
@@ -155,23 +239,21 @@ def most_frequent_distinct_RGB(image_array: np.ndarray, num_colors: int = 10) ->
     distinctive_colors_filter = [*DEFAULT_PALETTE, most_freq_color]
     extra_palette_colors = []  # colors actually outputted and to be added to palette
 
-    # I most definitely should move this into it's own function, but I am frankly tired. No thanks!
+    # every candidate and filter color is precomputed once, and a candidate is compared to the whole filter at once
+    metric = get_metric()
+    candidates = values[ind]
+    candidate_features = metric.precompute(candidates)
+    filter_features = list(metric.precompute(
+        np.asarray(distinctive_colors_filter)))
+
     cur_color = 1
     while len(extra_palette_colors) < num_colors and cur_color < len(ind):
-        array_color = values[ind[cur_color]]
-        rgb = RGB(
-            int(array_color[0]),
-            int(array_color[1]),
-            int(array_color[2])
-        )
-        for color in distinctive_colors_filter:
-            # if the array_color is distinct from all other colors in distinct_colors, add it
-
-            if is_near_color(rgb, color, DISTINCTIVENESS_VALUE):
-                # it isn't distinct, so don't bother adding it
-                break
-        else:
+        # if the candidate is distinct from all other colors in distinctive_colors_filter, add it
+        features = candidate_features[cur_color]
+        if not (metric.kernel(features[None], np.asarray(filter_features)) < metric.distinctiveness).any():
+            rgb = RGB(*(int(channel) for channel in candidates[cur_color]))
             distinctive_colors_filter.append(rgb)
+            filter_features.append(features)
             extra_palette_colors.append(rgb)
         # increment
         cur_color += 1
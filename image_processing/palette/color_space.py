@@ -0,0 +1,35 @@
+"""
+Vectorized color space conversions, for converting many colors at once (ie. a whole palette or image) with numpy rather than one color at a time.
+rgb_to_lab converts sRGB (D65) to CIE L*ab with the equations found here: https://www.easyrgb.com/en/math.php. It's what the L*ab metrics in METRICS (deltaE, cie94, ciede2000, see color_distance.py) measure distances in.
+"""
+
+import numpy as np
+
+
+# D65 reference white, the one sRGB is defined with
+_XYZ_REF = np.asarray((95.047, 100, 108.883), dtype=np.float32)
+
+_RGB_TO_XYZ = np.asarray((
+    (0.4124, 0.3576, 0.1805),
+    (0.2126, 0.7152, 0.0722),
+    (0.0193, 0.1192, 0.9505),
+), dtype=np.float32)
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Convert an array of RGB colors of shape (..., 3) (0 to 255) to CIE L*ab, returned as a float32 array of the same shape."""
+    # RGB to XYZ
+    color = np.asarray(rgb, dtype=np.float32) / 255
+    linear = np.where(color > 0.04045,
+                      np.power((color + 0.055) / 1.055, 2.4),
+                      color / 12.92) * 100
+    xyz = linear @ _RGB_TO_XYZ.T
+
+    # XYZ to CIE L*ab
+    xyz /= _XYZ_REF
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), (7.787 * xyz) + (16/116))
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
@@ -4,17 +4,26 @@ from dotenv import dotenv_values
 import numpy as np
 from image_processing.palette.color_distance import most_frequent_distinct_RGB
 from image_processing.palette.palette import Palette
-from image_processing.image.resize import resize_to_monitor
+from image_processing.image.resize import draft_to_monitor, resize_to_monitor
+
+
+# at most this many pixels (spread evenly over all images) are looked at to create a shared palette, see create_shared_palette
+SHARED_PALETTE_MAX_PIXELS = 4_000_000
 
 
 def open_image(path: Path, resize=True) -> np.ndarray:
-    """Open an image and convert it into a Numpy array of shape width x height x RGB. If `resize` is set to true, then also resize it to be smaller than the active monitor."""
-    img = Image.open(path, formats=["PNG", "JPEG"]).convert('RGB')
+    """Open an image and convert it into a Numpy array of shape width x height x RGB. If `resize` is set to true, then also resize it to be smaller than the active monitor.
+    Large JPEGs are decoded at a reduced scale to begin with (see draft_to_monitor), and everything is converted to RGB before resizing so it is filtered properly."""
+    img = Image.open(path, formats=["PNG", "JPEG"])
+    if resize:
+        img = draft_to_monitor(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
     if resize:
         img = resize_to_monitor(img)
 
-    array = np.asarray(img, dtype=np.uint8)
-    # array = np.asarray(img, dtype=np.int32)
+    # an RGB image is already uint8 and C-contiguous, so no further copies are made
+    array = np.asarray(img)
     return array
 
 
@@ -23,3 +32,14 @@ def create_palette(image_array: np.ndarray) -> Palette:
     extra_colors = most_frequent_distinct_RGB(image_array)
     palette = Palette(extra_colors)
     return palette
+
+
+def create_shared_palette(image_arrays: list[np.ndarray]) -> Palette:
+    """Create one palette for many images (ie. the frames of an animation), from the most frequent colors across all of them.
+    Every image is sampled evenly so that no more than SHARED_PALETTE_MAX_PIXELS pixels are looked at in total."""
+    total_pixels = sum(image.shape[0] * image.shape[1]
+                       for image in image_arrays)
+    step = max(1, total_pixels // SHARED_PALETTE_MAX_PIXELS)
+    pixels = np.concatenate([image.reshape(-1, image.shape[-1])[::step]
+                            for image in image_arrays])
+    return create_palette(pixels)
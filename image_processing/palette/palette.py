@@ -1,14 +1,17 @@
 from collections import namedtuple
+from functools import cached_property
+import hashlib
 import json
 from pathlib import Path
 from PIL import Image
 import numpy as np
+from image_processing.palette.color_space import rgb_to_lab
 
 
 RGB = namedtuple("RGB", ["red", "green", "blue"], defaults=[0, 0, 0])
 
 
-with open(Path(r'.\image_processing\palette\default_palette.json')) as f:
+with open(Path(__file__).parent / 'default_palette.json') as f:
     # all colors in RGB tuple
     _default_palette = []
 
@@ -29,7 +32,8 @@ class Palette:
     A 3x10 2D list
     Create a palette with extra colors from an image by initializing and passing in output from get_image_colors.most_frequent_distinct_RGB
 
-    It would have been better to use a dataclass to represent this but we're too far in.
+    A Palette is immutable once created. The colors are stored once in a uint8 (num_colors x 3) array, and every other form (float, L*ab, packed, hash) is computed at most once.
+    All arrays returned are read-only, since they are shared between every caller.
     """
 
     def __init__(self, extra_colors: list[RGB] | None = None) -> None:
@@ -37,9 +41,19 @@ class Palette:
             raise ValueError(f"Cannot add {len(
                 extra_colors)} extra colors. Max extra colors to add to the palette is 10.")
 
-        self._palette: list[list[RGB]] = list(_default_palette)
+        rows = [tuple(row) for row in _default_palette]
         if extra_colors:
-            self._palette.append([rgb_color for rgb_color in extra_colors])
+            rows.append(tuple(RGB(*rgb_color) for rgb_color in extra_colors))
+        self._palette: tuple[tuple[RGB, ...], ...] = tuple(rows)
+        self._flattened_palette: tuple[RGB, ...] = tuple(
+            rgb for row in self._palette for rgb in row)
+
+        self._array = _read_only(
+            np.asarray(self._flattened_palette, dtype=np.uint8).reshape(-1, 3))
+
+        # index (in flattened_palette) -> (row, col) position, computed once since processed images only store indices
+        self._positions: tuple[tuple[int, int], ...] = tuple(
+            (row, col) for row, colors in enumerate(self._palette) for col in range(len(colors)))
 
     @property
     def shape(self) -> tuple[int, int]:
@@ -49,45 +63,96 @@ class Palette:
     @property
     def num_colors(self) -> int:
         """Return the number of colors in the palette"""
-        return sum([1 for _ in self.flattened_palette])
+        return self._array.shape[0]
 
     @property
-    def palette(self) -> list[list[RGB]]:
+    def palette(self) -> tuple[tuple[RGB, ...], ...]:
         """Represents the RGB colors in a row-column fashion as they would appear on ms-paint."""
         return self._palette
 
     @property
-    def flattened_palette(self) -> list[RGB]:
-        """Return a list of all RGB lists from the self.palette"""
-        return [rgb for row in self._palette for rgb in row]
+    def flattened_palette(self) -> tuple[RGB, ...]:
+        """Return all RGB colors from self.palette in one flat tuple"""
+        return self._flattened_palette
 
-    def asarray(self) -> np.ndarray:
-        """Convert Palette object (Flattened palette specifically) to a low level Numpy array"""
-        palette_arr = np.zeros(
-            shape=(
-                self.num_colors, 3
-            )
-        )
+    @property
+    def positions(self) -> tuple[tuple[int, int], ...]:
+        """The (row, col) position of every color, in the same order as flattened_palette (the order of the indices in a processed image)."""
+        return self._positions
 
-        for i, rgb in enumerate(self.flattened_palette):
-            palette_arr[i] = np.asarray(rgb, dtype=np.uint8)
+    def position(self, index: int) -> tuple[int, int]:
+        """Return the (row, col) position in the palette of the color at `index` of flattened_palette."""
+        return self._positions[index]
 
-        return palette_arr
+    def index(self, row: int, col: int) -> int:
+        """Return the index in flattened_palette of the color at position (`row`, `col`). The inverse of Palette.position."""
+        return row * len(self._palette[0]) + col
 
-    def show_in_image(self) -> None:
-        """Creates a temporary image that shows the color palette. Typically used for testing purposes"""
+    @property
+    def rgb(self) -> np.ndarray:
+        """The palette's colors as a uint8 (num_colors x 3) array, in flattened_palette order."""
+        return self._array
+
+    @cached_property
+    def _float_array(self) -> np.ndarray:
+        return _read_only(self._array.astype(np.float32))
+
+    def asarray(self) -> np.ndarray:
+        """Return the palette's colors (flattened palette specifically) as a float32 (num_colors x 3) Numpy array, for color distance calculations."""
+        return self._float_array
+
+    @cached_property
+    def lab(self) -> np.ndarray:
+        """The palette's colors converted to CIE L*ab, as a float32 (num_colors x 3) array."""
+        return _read_only(rgb_to_lab(self._array))
+
+    @cached_property
+    def packed(self) -> np.ndarray:
+        """The palette's colors packed into 24 bits each (0xRRGGBB), as a uint32 array. Useful as keys when matching pixels to palette colors exactly."""
+        return _read_only(pack_rgb(self._array))
+
+    @cached_property
+    def content_hash(self) -> str:
+        """A hash of the palette's colors and layout. Palettes with the same colors in the same positions have the same hash, so it can be used to key caches of results."""
+        digest = hashlib.sha1(self._array.tobytes())
+        digest.update(bytes(len(row) for row in self._palette))
+        return digest.hexdigest()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Palette):
+            return NotImplemented
+        return self.content_hash == other.content_hash
+
+    def __hash__(self) -> int:
+        return hash(self.content_hash)
+
+    def to_image(self) -> Image.Image:
+        """Creates an image that shows the color palette, each color being a 100x100 square."""
         scale = 100
 
-        shape = self.shape
-        img = Image.new(mode="RGB", size=(shape[0]*scale, shape[1]*scale))
-        img.load()
-        for i, row in enumerate(self.palette):
-            for j, color in enumerate(row):
-                for x in range(0, scale):
-                    for y in range(0, scale):
-                        img.putpixel(
-                            (j*scale+x, i*scale+y), (color.red, color.green, color.blue))
-        img.show()
+        cols, rows = self.shape
+        grid = np.zeros((rows, cols, 3), dtype=np.uint8)
+        for i, row in enumerate(self._palette):
+            grid[i, :len(row)] = row
+        return Image.fromarray(grid.repeat(scale, axis=0).repeat(scale, axis=1), 'RGB')
+
+    def show_in_image(self) -> None:
+        """Creates a temporary image that shows the color palette. Typically used for testing purposes"""
+        self.to_image().show()
+
+    def save(self, path: Path) -> None:
+        """Save the palette's RGB colors (in rows, like self.palette) to a JSON file, in the same format as default_palette.json."""
+        with open(path, "w") as f:
+            json.dump({"palette": [[list(rgb) for rgb in row]
+                      for row in self._palette]}, f)
+
+    @classmethod
+    def load(cls, path: Path) -> "Palette":
+        """Load a palette that was saved with Palette.save."""
+        with open(path) as f:
+            rows = json.load(f)["palette"]
+        extra_colors = [RGB(*rgb) for rgb in rows[2]] if len(rows) > 2 else None
+        return cls(extra_colors)
 
     def __repr__(self) -> str:
         out = ""
@@ -98,3 +163,15 @@ class Palette:
         # out.replace(".", "\n\n\n")
         # out.replace(".", "")
         return out
+
+
+def pack_rgb(rgb: np.ndarray) -> np.ndarray:
+    """Pack an array of RGB colors of shape (..., 3) into 24 bit integers (0xRRGGBB) of shape (...)."""
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    """Mark `array` as read-only and return it."""
+    array.setflags(write=False)
+    return array
@@ -1 +1,2 @@
-from instructions.from_processed_image import from_processed_image
+from instructions.from_processed_image import from_processed_image, iter_instructions, bundle_hash, make_portable, shutdown_pool, pixel_areas, read_areas, color_keys, read_instructions, AREAS_KEY, TEMP_DIR, TEMP_FPATH
+from instructions.parse import parse_instructions, parse_polylines
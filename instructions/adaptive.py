@@ -0,0 +1,66 @@
+"""
+Adaptive resolution drawing plans, so mostly flat areas of an image are drawn with a few wide strokes and only the detailed areas with the final stroke size.
+
+The image is split into cells the width of the widest stroke (see STROKE_SIZE_PX in interactions/constants.py), and every cell is drawn in its majority color if that makes more of its pixels right on the canvas than it makes wrong.
+The pixels still wrong after that are left to the next narrower stroke, and so on down to the final stroke size, which draws whatever is still wrong pixel by pixel, so the finished drawing is exactly the processed image.
+This is a region tree rather than a strict quadtree, the stroke widths (8, 5, 3 pixels) don't divide each other, so every level is its own grid over the whole image.
+
+Cells are only ever drawn whole rather than only when they're a single color: on quantized photos even flat looking areas are speckled, and a row of pixels still needs its own stroke if a single pixel of it is left.
+What the canvas shows is tracked by a model of it, like in instructions/progressive.py: the most frequent color (bucketed first), with each drawn cell painting a `pitch` by `pitch` block of the model.
+Each level is drawn with one stroke size switch.
+"""
+
+import numpy as np
+
+from image_processing.image.delta import UNCHANGED, bridge_gaps
+from image_processing.palette import Palette
+from .progressive import DrawingPass, order_by_area
+
+
+# the stroke sizes of the cell levels, widest first (only the ones wider than the final stroke size)
+CELL_STROKE_SIZES = (4, 3)
+
+
+def _cells(image: np.ndarray, pitch: int) -> np.ndarray:
+    """View the whole `pitch` by `pitch` cells of `image` as a (cell rows, pitch, cell cols, pitch) array. The strips left over at the right and bottom edges are left out."""
+    cell_rows, cell_cols = image.shape[0] // pitch, image.shape[1] // pitch
+    return image[:cell_rows * pitch, :cell_cols * pitch].reshape(cell_rows, pitch, cell_cols, pitch)
+
+
+def plan_adaptive(processed_image: np.ndarray, palette: Palette, final_stroke_size: int, stroke_size_px: dict[int, int]) -> list[DrawingPass]:
+    """Plan drawing `processed_image` with cells of CELL_STROKE_SIZES first, then fixing what they got wrong with `final_stroke_size`, one pass per stroke size.
+    `stroke_size_px` is how many pixels wide each stroke size is. The first pass starts by bucketing the most frequent color (see _BasicRedrawer.redraw_stream)."""
+    background = int(np.argmax(np.bincount(processed_image.ravel())))
+    canvas = np.full_like(processed_image, background)
+
+    passes = []
+    for stroke_size in (size for size in CELL_STROKE_SIZES if size > final_stroke_size):
+        pitch = stroke_size_px[stroke_size]
+        cells = _cells(processed_image, pitch)
+        canvas_cells = _cells(canvas, pitch)
+
+        # majority color of every cell, one palette color at a time to keep memory down
+        majority = np.zeros(cells.shape[::2], dtype=np.uint8)
+        majority_count = np.zeros(cells.shape[::2], dtype=np.intp)
+        for index in np.unique(cells):
+            count = np.count_nonzero(cells == index, axis=(1, 3))
+            better = count > majority_count
+            majority[better] = index
+            majority_count[better] = count[better]
+
+        # gaps are bridged where the majority color is wanted, which may make a few pixels wrong, but the narrower passes fix those anyway
+        already_right = np.count_nonzero(cells == canvas_cells, axis=(1, 3))
+        image = bridge_gaps(np.where(majority_count > already_right, majority,
+                                     np.uint8(UNCHANGED)), majority)
+        order = order_by_area(image, palette, None if passes else background)
+        passes.append(DrawingPass(stroke_size, pitch, image, order))
+
+        draw = image != UNCHANGED
+        canvas_cells[:] = np.where(
+            draw[:, None, :, None], image[:, None, :, None], canvas_cells)
+
+    image = bridge_gaps(np.where(canvas == processed_image, np.uint8(
+        UNCHANGED), processed_image), processed_image)
+    order = order_by_area(image, palette, None if passes else background)
+    passes.append(DrawingPass(final_stroke_size, 1, image, order))
+    return passes
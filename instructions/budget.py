@@ -0,0 +1,109 @@
+"""
+Plans drawings to fit in a time budget.
+
+Given the processed image at full size, every combination of
+    - scale         how much smaller than the full size to draw
+    - stroke size   the STROKE_SIZE to draw with, every stroke covering a row as tall as the stroke is wide (see STROKE_SIZE_PX in interactions/constants.py)
+    - min run       the cleanup threshold, horizontal runs shorter than this are merged into their neighbor (see remove_short_runs)
+is estimated with the cost model (see cost_model.py). Of the combinations estimated to fit in the budget, the one closest to the original image is picked,
+closeness being the mean CIE76 delta E between the original image and the drawing, scaled back up to the full size.
+
+Nothing is quantized again, smaller scales and wider strokes sample the full size processed image.
+"""
+
+import json
+import itertools
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+
+import numpy as np
+
+from image_processing.image.cleanup import remove_short_runs
+from image_processing.palette import Palette
+from image_processing.palette.color_space import rgb_to_lab
+from instructions.cost_model import CostModel, PlanStats
+from logger import PROGRESS_LOG
+
+
+SCALES = (1.0, 0.75, 0.5, 0.35, 0.25)
+STROKE_SIZES = (1, 2, 3, 4)
+MIN_RUNS = (1, 2, 3, 5, 8)
+
+
+@dataclass
+class BudgetPlan:
+    """The settings picked to draw an image in a time budget, how long it should take, and how close to the original it is."""
+    scale: float
+    stroke_size: int
+    pitch: int                      # pixels per processed image pixel, the from_processed_image pitch
+    min_run: int
+    estimated_seconds: float
+    mean_delta_e: float
+    # the processed image to draw (at the scale, one pixel per stroke row), for from_processed_image with `pitch`
+    processed_image: np.ndarray = field(repr=False, compare=False)
+
+    def preview(self) -> np.ndarray:
+        """The processed image as it will look once drawn, one pixel per canvas pixel."""
+        return np.repeat(np.repeat(self.processed_image, self.pitch, axis=0), self.pitch, axis=1)
+
+    def save(self, path: Path) -> None:
+        """Save everything but the processed image as JSON to `path`."""
+        settings = asdict(self)
+        del settings["processed_image"]
+        with open(path, "w") as f:
+            json.dump(settings, f, indent=4)
+
+
+def sample_processed_image(processed_image: np.ndarray, scale: float, pitch: int) -> np.ndarray:
+    """Sample a processed image at `scale` of its size, with one pixel per `pitch` pixels (nearest neighbour, from the middle of each block)."""
+    rows, cols = processed_image.shape
+    num_rows = max(1, int(rows * scale / pitch))
+    num_cols = max(1, int(cols * scale / pitch))
+    row_index = ((np.arange(num_rows) + 0.5) * rows / num_rows).astype(np.intp)
+    col_index = ((np.arange(num_cols) + 0.5) * cols / num_cols).astype(np.intp)
+    return processed_image[np.ix_(row_index, col_index)]
+
+
+def _mean_delta_e(image_lab: np.ndarray, palette_lab: np.ndarray, sampled: np.ndarray) -> float:
+    """Mean CIE76 delta E between the original image (in L*ab) and a sampled processed image scaled back up to the same size."""
+    rows, cols = image_lab.shape[:2]
+    row_index = np.arange(rows) * sampled.shape[0] // rows
+    col_index = np.arange(cols) * sampled.shape[1] // cols
+    drawn_lab = palette_lab[sampled[np.ix_(row_index, col_index)]]
+    return float(np.linalg.norm(image_lab - drawn_lab, axis=-1).mean())
+
+
+def plan_for_budget(image: np.ndarray, processed_image: np.ndarray, palette: Palette, budget_seconds: float,
+                    model: CostModel | None = None) -> BudgetPlan:
+    """Pick the scale, stroke size and cleanup threshold that draw `image` (RGB, with `processed_image` quantized from it) closest to the original in `budget_seconds`.
+    If nothing fits, the fastest plan is returned instead. `model` defaults to CostModel.calibrated()."""
+    import interactions.constants as C
+    model = model if model is not None else CostModel.calibrated()
+    image_lab = rgb_to_lab(image)
+    custom_colors = len(palette.palette[2]) if len(palette.palette) > 2 else 0
+
+    best: BudgetPlan | None = None
+    fastest: BudgetPlan | None = None
+    for scale, stroke_size, min_run in itertools.product(SCALES, STROKE_SIZES, MIN_RUNS):
+        pitch = C.STROKE_SIZE_PX[stroke_size]
+        sampled = remove_short_runs(sample_processed_image(
+            processed_image, scale, pitch), min_run)
+        seconds = model.estimate(PlanStats.from_processed_image(
+            sampled, pitch, custom_colors, setup=True))
+
+        fits = seconds <= budget_seconds
+        if not fits and fastest is not None and seconds >= fastest.estimated_seconds:
+            continue
+        plan = BudgetPlan(scale, stroke_size, pitch, min_run, seconds,
+                          _mean_delta_e(image_lab, palette.lab, sampled), sampled)
+        if fits and (best is None or plan.mean_delta_e < best.mean_delta_e):
+            best = plan
+        if fastest is None or seconds < fastest.estimated_seconds:
+            fastest = plan
+
+    if best is None:
+        PROGRESS_LOG.log(f"NO PLAN FITS IN {budget_seconds:.0f}s, USING THE FASTEST ({
+                         fastest.estimated_seconds:.0f}s)")  # type: ignore
+        best = fastest
+    PROGRESS_LOG.log(f"PLANNED FOR BUDGET: {best}")
+    return best  # type: ignore
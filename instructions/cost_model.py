@@ -0,0 +1,217 @@
+"""
+Estimates how long a drawing will take, before drawing it.
+
+A plan is boiled down to a few counts (PlanStats): clicks, drags, total drag length, color switches, custom colors to create and other toolbar actions.
+The estimate is a weighted sum of these counts (CostModel), where the weights are seconds per click, per drag, per pixel dragged, etc.
+The default weights come from the delays in interactions/constants.py, and can be calibrated against the measured times of real drawings with least squares.
+
+Measured drawings are appended to a samples file (one JSON object per line, see record_sample), which CostModel.calibrated fits to.
+"""
+
+import dbm
+import json
+from dataclasses import dataclass, asdict, fields
+from pathlib import Path
+
+import numpy as np
+
+from instructions.from_processed_image import INSTRUCTION_TYPE, TEMP_DIR, color_keys, read_instructions
+from instructions.parse import parse_instructions, parse_polylines
+
+
+# where measured drawings are recorded, see record_sample
+COST_SAMPLES_FPATH: Path = TEMP_DIR / "cost_samples.jsonl"
+
+# the toolbar actions of bucketing the first color (bucket, click, back to the brush)
+_BUCKET_ACTIONS = 3
+# the toolbar actions of setting up the canvas (resize, brush type and stroke size dropdowns)
+_SETUP_ACTIONS = 5
+
+
+@dataclass
+class PlanStats:
+    """Everything about a plan that the time it takes to draw depends on."""
+    clicks: int = 0
+    drags: int = 0
+    drag_px: int = 0            # total length of all drags
+    color_switches: int = 0     # colors selected from the palette
+    custom_colors: int = 0      # custom colors created with the edit colors dialog
+    toolbar_actions: int = 0    # any other toolbar clicks that wait for the toolbar
+
+    def features(self) -> np.ndarray:
+        """The counts as a feature vector, in the same order as CostModel's weights (the last feature being a constant 1)."""
+        return np.asarray([*asdict(self).values(), 1], dtype=np.float64)
+
+    @classmethod
+    def from_strokes(cls, color_strokes: list[np.ndarray], custom_colors: int = 0, setup: bool = False) -> "PlanStats":
+        """Stats of drawing colors whose (x, y, length) strokes (see parse_instructions) are in `color_strokes`, in drawing order. The first color is bucketed rather than drawn, like the redrawer does.
+        If `setup`, also counts setting up the canvas and creating `custom_colors` custom colors."""
+        stats = cls(custom_colors=custom_colors if setup else 0,
+                    toolbar_actions=_SETUP_ACTIONS if setup else 0)
+        color_strokes = [strokes for strokes in color_strokes if len(strokes)]
+        for num, strokes in enumerate(color_strokes):
+            stats.color_switches += 1
+            if num == 0:
+                stats.toolbar_actions += _BUCKET_ACTIONS
+                continue
+            lengths = strokes[:, 2]
+            is_click = lengths == 1
+            stats.clicks += int(is_click.sum())
+            stats.drags += int((~is_click).sum())
+            stats.drag_px += int(lengths[~is_click].sum())
+        return stats
+
+    @classmethod
+    def from_polylines(cls, color_polylines: list[tuple[np.ndarray, np.ndarray]], custom_colors: int = 0, setup: bool = False) -> "PlanStats":
+        """Like from_strokes, for colors whose polylines (see parse_polylines) are in `color_polylines`. Polylines of one point are clicks, the rest are drags as long as their whole path."""
+        stats = cls(custom_colors=custom_colors if setup else 0,
+                    toolbar_actions=_SETUP_ACTIONS if setup else 0)
+        color_polylines = [polylines for polylines in color_polylines if len(polylines[1])]
+        for num, (points, polyline_ends) in enumerate(color_polylines):
+            stats.color_switches += 1
+            if num == 0:
+                stats.toolbar_actions += _BUCKET_ACTIONS
+                continue
+            is_click = np.diff(polyline_ends, prepend=0) == 1
+            stats.clicks += int(is_click.sum())
+            stats.drags += int((~is_click).sum())
+            # the steps between polylines aren't drawn, only the steps within them
+            steps = np.abs(np.diff(points, axis=0)).sum(axis=1)
+            stats.drag_px += int(steps.sum() - steps[polyline_ends[:-1] - 1].sum())
+        return stats
+
+    @classmethod
+    def from_dbm(cls, path: Path, ordered_keys: list[bytes] | None = None, custom_colors: int = 0, setup: bool = False) -> "PlanStats":
+        """Stats of drawing the instruction DBM at `path` (see from_processed_image), in the order of `ordered_keys` (defaulting to the most strokes first)."""
+        with dbm.open(path, 'r') as instrucs:
+            keys = ordered_keys if ordered_keys is not None else color_keys(
+                instrucs)
+            if INSTRUCTION_TYPE == "polyline":
+                color_polylines = [parse_polylines(
+                    read_instructions(instrucs, key).decode()) for key in keys]
+            else:
+                color_strokes = [parse_instructions(
+                    read_instructions(instrucs, key).decode()) for key in keys]
+
+        if INSTRUCTION_TYPE == "polyline":
+            if ordered_keys is None:
+                color_polylines.sort(key=lambda polylines: len(polylines[1]), reverse=True)
+            return cls.from_polylines(color_polylines, custom_colors, setup)
+        if ordered_keys is None:
+            color_strokes.sort(key=len, reverse=True)
+        return cls.from_strokes(color_strokes, custom_colors, setup)
+
+    @classmethod
+    def from_processed_image(cls, processed_image: np.ndarray, pitch: int = 1, custom_colors: int = 0, setup: bool = False) -> "PlanStats":
+        """Stats of drawing a processed image with from_processed_image(..., pitch=`pitch`), without computing any instructions. Colors are drawn most pixels first."""
+        rows, cols = processed_image.shape
+        flat = processed_image.ravel()
+
+        # the same runs as _instructions_for_rows, for all colors at once
+        is_start = np.ones(flat.shape, dtype=bool)
+        is_start[1:] = flat[1:] != flat[:-1]
+        is_start[::cols] = True
+        starts = np.flatnonzero(is_start)
+        lengths = np.diff(np.append(starts, flat.size)) * pitch
+        colors = flat[starts]
+
+        # the color with the most pixels is bucketed
+        areas = np.bincount(flat)
+        bucketed = int(np.argmax(areas))
+        drawn = colors != bucketed
+        is_click = (lengths == 1) & drawn
+        is_drag = (lengths != 1) & drawn
+
+        return cls(clicks=int(is_click.sum()),
+                   drags=int(is_drag.sum()),
+                   drag_px=int(lengths[is_drag].sum()),
+                   color_switches=int(np.count_nonzero(areas)),
+                   custom_colors=custom_colors if setup else 0,
+                   toolbar_actions=_BUCKET_ACTIONS + (_SETUP_ACTIONS if setup else 0))
+
+
+@dataclass
+class CostModel:
+    """Seconds taken by each of the counts in PlanStats, plus a constant."""
+    per_click: float
+    per_drag: float
+    per_drag_px: float
+    per_color_switch: float
+    per_custom_color: float
+    per_toolbar_action: float
+    constant: float = 0
+
+    def weights(self) -> np.ndarray:
+        return np.asarray(list(asdict(self).values()), dtype=np.float64)
+
+    def estimate(self, stats: PlanStats) -> float:
+        """Estimated seconds to draw a plan with `stats`."""
+        return float(stats.features() @ self.weights())
+
+    @classmethod
+    def from_constants(cls) -> "CostModel":
+        """The model implied by the pacing budgets in interactions/constants.py, assuming Paint keeps up with every event."""
+        # imported here so the instructions module doesn't need the interactions module unless estimating
+        import interactions.constants as C
+        budgets = C.EVENT_BUDGETS
+        overhead = C.EVENT_OVERHEAD
+        return cls(
+            per_click=budgets["stroke_click"] + overhead,
+            per_drag=budgets["stroke_press"] +
+            budgets["stroke_release"] + 2 * overhead,
+            per_drag_px=0,
+            # set_color clicks the color twice, waiting for the toolbar before and after
+            per_color_switch=2 * budgets["toolbar"],
+            # edit colors button, the dialog, then the rest of the clicks and typing in it
+            per_custom_color=budgets["toolbar"] + budgets["dialog"] +
+            8 * (budgets["click"] + overhead) + 3 * budgets["key"],
+            per_toolbar_action=budgets["toolbar"],
+        )
+
+    def calibrate(self, samples: list[tuple[PlanStats, float]]) -> "CostModel":
+        """Return a new model fit to `samples` of (stats, measured seconds) with least squares.
+        Only weights of counts that the samples actually vary in are fit, the rest are kept. Weights are never negative."""
+        if not samples:
+            return self
+        features = np.stack([stats.features() for stats, _ in samples])
+        seconds = np.asarray([s for _, s in samples], dtype=np.float64)
+
+        weights = self.weights()
+        # the constant is only fit along with everything else if there are enough samples to tell it apart
+        fit = features.any(axis=0)
+        fit[-1] = len(samples) > fit[:-1].sum()
+        if not fit.any():
+            return self
+
+        # fit what is left over once the kept weights are accounted for
+        residual = seconds - features[:, ~fit] @ weights[~fit]
+        solution, *_ = np.linalg.lstsq(features[:, fit], residual, rcond=None)
+        weights[fit] = np.maximum(solution, 0)
+        return CostModel(*weights.tolist())
+
+    @classmethod
+    def calibrated(cls, samples_path: Path = COST_SAMPLES_FPATH) -> "CostModel":
+        """The model from the constants, calibrated with the samples recorded at `samples_path` (if any)."""
+        return cls.from_constants().calibrate(load_samples(samples_path))
+
+
+def record_sample(stats: PlanStats, seconds: float, path: Path = COST_SAMPLES_FPATH) -> None:
+    """Append a measured drawing (the `stats` of what was drawn, and how many `seconds` it took) to the samples at `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps({"stats": asdict(stats), "seconds": seconds}) + "\n")
+
+
+def load_samples(path: Path = COST_SAMPLES_FPATH) -> list[tuple[PlanStats, float]]:
+    """Read every measured drawing recorded at `path`, see record_sample."""
+    if not path.exists():
+        return []
+    names = {f.name for f in fields(PlanStats)}
+    samples = []
+    with open(path) as f:
+        for line in f:
+            sample = json.loads(line)
+            stats = PlanStats(**{k: v for k, v in sample["stats"].items()
+                                 if k in names})
+            samples.append((stats, sample["seconds"]))
+    return samples
@@ -6,20 +6,30 @@ The string can be optionally outputted into a file, and loaded up later.
 
 Uses the following to compute instructions:
 multiprocessing (https://docs.python.org/3/library/multiprocessing.html) where different colors are split into different processes
+    - the worker processes are persistent, and started once per program rather than once per image
+    - the processed image is placed in shared memory (multiprocessing.shared_memory) once, workers only receive its name and the rows to work on
+    - every color is split into bands of ROWS_PER_TASK rows, so a color covering most of a large image is still spread across workers
 dbm (https://docs.python.org/3/library/dbm.html#module-dbm) where instructions are written to, and used later.
+    - only the main process writes to the DBM, in one go, as results come back
 
-
-
-Functional programming because numba will greatly increase the speed it takes to create it.
+Runs of a color are found with numpy over every row at once (see _instructions_for_rows), only the instruction strings are built in Python.
 
 INSTRUCTION SYNTAX:
-....
+basic       [x,y,length];[x2,y2,length2];...    one horizontal stroke per run of a color on a row
+polyline    [x1,y1,x2,y2,...];...               one stroke per chain of runs on neighbouring rows, pressed at the first point, moved through the rest and released at the last
+
+Every color's instructions are under its "row,col" palette position as key. The reserved AREAS_KEY holds how many pixels each color covers instead (see pixel_areas), use color_keys to only get the colors.
 
 """
 
 import numpy as np
 import dbm
+import dbm.dumb
+import hashlib
+import json
 import concurrent.futures
+from collections.abc import Callable, Iterator
+from multiprocessing import shared_memory
 from image_processing.palette import Palette
 from pathlib import Path
 from dotenv import dotenv_values
@@ -33,80 +43,298 @@ _PRINT_PROGRESS = _settings["PRINT_ALL_PROGRESS"] == "true"
 INSTRUCTION_TYPE = _settings["INSTRUCTION_TYPE"]
 
 INSTRUC_MARKER = {
-    "basic": "redrawer-basic-instruction"
+    "basic": "redrawer-basic-instruction",
+    "polyline": "redrawer-polyline-instruction",
 }[INSTRUCTION_TYPE]  # type: ignore
 
 
+# reserved DBM key of the pixel areas of the colors, palette color keys are always "row,col" so it can't clash with one
+AREAS_KEY = b"areas"
+
+# DBM implementation of instruction bundles planned on one machine and drawn on another, see make_portable. Windows Python only has dbm.dumb
+PORTABLE_FORMAT = "dbm.dumb"
+# suffixes of the files of any DBM implementation, besides gdbm's file without one
+_DBM_SUFFIXES = (".db", ".pag", ".dir", ".dat", ".bak")
+
 TEMP_DIR: Path = Path.cwd() / _settings["TEMP_DIR"]  # type: ignore
 TEMP_FPATH: Path = TEMP_DIR / _settings["TEMP_FNAME"]  # type: ignore
 
 
-def from_processed_image(processed_image: np.ndarray, palette: Palette) -> Path:
-    """
-    Turn a processed image into a DBM file with string instructions the `TEMP_INSTRUC_FNAME` name to be used later. See file docstring for the syntax of these "instructions"
-    Returns Path object to the path of the DBM file
-    """
+# rows of the processed image per worker task with basic instructions. Polylines chain runs across rows, so they always get a whole color per task
+ROWS_PER_TASK = 128
 
-    PROGRESS_LOG.log("PROCESSING IMAGE TO INSTRUCTIONS")
+# Persistent worker pool, created on first use and reused for every image after. See _get_pool
+_pool: concurrent.futures.ProcessPoolExecutor | None = None
 
-    TEMP_DIR.mkdir(exist_ok=True)
-    with dbm.open(TEMP_FPATH, 'n') as _:
-        # create a new empty DB to get rid of old one (if existing)
-        pass
 
-    def add_to_dbm(future: concurrent.futures.Future) -> None:
-        key, instruc_value = future.result()
+def _get_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """Return the persistent worker pool, starting it if it hasn't been already."""
+    global _pool
+    if _pool is None:
+        _pool = concurrent.futures.ProcessPoolExecutor()
+    return _pool
 
-        PROGRESS_LOG.log(f"PROCESSED PALETTE COLOR AT ({key})")
 
-        with dbm.open(TEMP_FPATH, 'w') as db:
-            db[key] = instruc_value
+def shutdown_pool() -> None:
+    """Shut down the persistent worker pool. It is started again on the next use."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+# (shared memory name, array shape, array dtype string), everything a worker needs to find a _SharedImage
+SharedImageSpec = tuple[str, tuple[int, ...], str]
+
+
+class _SharedImage:
+    """A copy of an image array in shared memory, so worker processes can read it without it being pickled and sent to each of them.
+    Use as a context manager, the shared memory is freed on exit."""
+
+    def __init__(self, array: np.ndarray) -> None:
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype,
+                            buffer=self._shm.buf)
+        shared[:] = array
+        del shared  # the buffer can't be closed while an array still points to it
 
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        futures = [
-            executor.submit(
-                _compute_instructions_for_palette_color, processed_image, (row, col))
-            for row in range(palette.shape[1]) for col in range(palette.shape[0])
-        ]
+        self.spec: SharedImageSpec = (
+            self._shm.name, array.shape, array.dtype.str)
 
-        for future in futures:
-            future.add_done_callback(add_to_dbm)
+    def __enter__(self) -> "_SharedImage":
+        return self
 
-    return TEMP_FPATH
+    def __exit__(self, *_) -> None:
+        self._shm.close()
+        self._shm.unlink()
 
 
-def _compute_instructions_for_palette_color(processed_image: np.ndarray, palette_color: tuple):
-    """Like the name says, compute the instructions for a palette color.
-    Just to remember: the processed_image doesn't consist of colors, but rather the [row, column] positions of colors in palette_color. We're searching for palette_color in processed_image
+def iter_instructions(processed_image: np.ndarray, palette: Palette, order: list[tuple[int, int]] | None = None, pitch: int = 1) -> Iterator[tuple[str, str]]:
+    """
+    Compute the instructions for every palette color using the persistent worker pool, yielding (key, instructions) as they are computed.
+    Results are yielded in `order` (a list of palette (row, col) positions, defaulting to palette order), so a consumer can start using the first colors while the rest are being computed.
+    Every pixel of the processed image is drawn as a `pitch` by `pitch` square (see _instructions_for_rows).
+    Each color is computed in bands of rows (see ROWS_PER_TASK) on different workers, and the instructions of its bands joined in order, the same as computing it in one go.
+    """
+    order = order if order is not None else list(palette.positions)
+    num_rows = processed_image.shape[0]
+    band_rows = ROWS_PER_TASK if INSTRUCTION_TYPE == "basic" else max(num_rows, 1)
+    row_ranges = [(start, min(start + band_rows, num_rows))
+                  for start in range(0, num_rows, band_rows)] or [(0, num_rows)]
+
+    with _SharedImage(processed_image) as shared_image:
+        pool = _get_pool()
+        futures = [[pool.submit(_compute_instructions_for_palette_color, shared_image.spec, palette.index(*palette_color), palette_color, row_range, pitch)
+                    for row_range in row_ranges]
+                   for palette_color in order]
+
+        try:
+            for color_futures in futures:
+                results = [future.result() for future in color_futures]
+                key = results[0][0]
+                PROGRESS_LOG.log(f"PROCESSED PALETTE COLOR AT ({key})")
+                yield key, "".join(instruc_value for _, instruc_value in results)
+        finally:
+            # if the consumer stopped early, don't leave the rest queued on the persistent pool
+            for color_futures in futures:
+                for future in color_futures:
+                    future.cancel()
+
+
+def from_processed_image(processed_image: np.ndarray, palette: Palette, path: Path = TEMP_FPATH, parallel: bool = True,
+                         order: list[tuple[int, int]] | None = None, on_color: Callable[[str, str], None] | None = None, pitch: int = 1) -> Path:
+    """
+    Turn a processed image into a DBM file with string instructions at `path` (by default, the `TEMP_FNAME` name in `TEMP_DIR`) to be used later. See file docstring for the syntax of these "instructions"
+    If `parallel` is false, every color is computed in this process instead. Use this when the caller is already a worker process (ie. batch mode).
+    Colors are computed in `order` (see iter_instructions), and `on_color(key, instructions)` is called as soon as each color is written, so colors can be used before the rest are done.
+    With a `pitch` above 1, every pixel is drawn as a `pitch` by `pitch` square, for drawing with wider strokes (see STROKE_SIZE_PX in interactions/constants.py).
+    Returns Path object to the path of the DBM file
+    """
+
+    PROGRESS_LOG.log("PROCESSING IMAGE TO INSTRUCTIONS")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    order = order if order is not None else list(palette.positions)
+    if parallel:
+        results = iter_instructions(processed_image, palette, order, pitch)
+    else:
+        results = (_instructions_for_rows(processed_image, palette.index(*palette_color), palette_color, 0, pitch)
+                   for palette_color in order)
+
+    # the only writer of the DBM, a new empty DB gets rid of the old one (if existing)
+    with dbm.open(path, 'n') as db:
+        db[AREAS_KEY] = json.dumps(pixel_areas(processed_image, palette))
+        for key, instruc_value in results:
+            db[key] = instruc_value
+            if on_color is not None:
+                on_color(key, instruc_value)
+
+    return path
+
+
+def pixel_areas(processed_image: np.ndarray, palette: Palette) -> dict[str, int]:
+    """How many pixels of `processed_image` every palette color covers, by instruction key, in one pass over the image. Pixels left UNCHANGED (see delta.py) aren't counted."""
+    counts = np.bincount(processed_image.ravel(),
+                         minlength=palette.num_colors)[:palette.num_colors]
+    return {"{},{}".format(*palette.position(index)): int(count) for index, count in enumerate(counts.tolist())}
+
+
+def read_areas(path: Path = TEMP_FPATH) -> dict[str, int] | None:
+    """The pixel areas stored in the DBM instruction bundle at `path` (see pixel_areas), or None for bundles written before they were stored."""
+    with dbm.open(path, 'r') as db:
+        return json.loads(db[AREAS_KEY]) if AREAS_KEY in db else None
+
+
+def color_keys(db) -> list[bytes]:
+    """The keys of every color in the opened DBM instruction bundle `db`, leaving out AREAS_KEY."""
+    return [key for key in db.keys() if key != AREAS_KEY]
+
+
+def read_instructions(db, key: bytes) -> bytes:
+    """The instructions of the color `key` in the opened DBM instruction bundle `db`. Empty for a color without strokes, which some DBM implementations (ie. ndbm) list the key of but can't read back."""
+    return db.get(key, b"")
+
+
+def _chain_runs(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Link every run (in row-major order, `ends` exclusive) to a run on the next row that shares at least one column with it, if there is one no other run linked to first.
+    Returns the index of the next run in each run's chain, or -1 for the last run of a chain."""
+    if not len(rows):
+        return np.empty(0, dtype=np.intp)
+    width = int(ends.max()) + 1 if len(ends) else 1
+    # runs on a row don't overlap, so row-major order is also sorted by (row, last column)
+    last_columns = rows * width + ends - 1
+    candidates = np.searchsorted(last_columns, (rows + 1) * width + starts)
+    candidates = np.minimum(candidates, len(rows) - 1)
+    linked = (rows[candidates] == rows + 1) & (
+        starts[candidates] < ends) & (ends[candidates] > starts)
+
+    # a run can only continue one chain, the first run (leftmost) to reach it gets it
+    next_run = np.full(len(rows), -1)
+    _, first = np.unique(np.where(linked, candidates, -1), return_index=True)
+    first = first[linked[first]]
+    next_run[first] = candidates[first]
+    return next_run
+
+
+def _polylines(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, pitch: int = 1) -> str:
+    """Polyline instructions of a color's runs (see _instructions_for_rows), with runs on neighbouring rows chained into one stroke (see _chain_runs).
+    Chains snake back and forth, left to right on one row and right to left on the next. The step down to the next row is at a column both runs cover,
+    and it's reached by going back along the row the stroke is on, so no part of a polyline goes anywhere the separate strokes of its runs wouldn't."""
+    next_run = _chain_runs(rows, starts, ends)
+    is_head = np.ones(len(rows), dtype=bool)
+    is_head[next_run[next_run >= 0]] = False
+
+    # the same points as basic instructions, where strokes of one pixel are a click rather than a drag to the pixel after
+    is_click = (ends - starts) * pitch == 1
+    ys = (rows * pitch + pitch // 2).tolist()
+    xs_start = (starts * pitch).tolist()
+    xs_end = np.where(is_click, starts, ends * pitch).tolist()
+    next_run = next_run.tolist()
+
+    instruc = []
+    for run in np.flatnonzero(is_head).tolist():
+        if next_run[run] < 0 and is_click[run]:
+            # single pixels are clicks, the same as basic instructions
+            instruc.append(f"[{xs_start[run]},{ys[run]}];")
+            continue
+
+        points = [xs_start[run], ys[run], xs_end[run], ys[run]]
+        left_to_right = True
+        while next_run[run] >= 0:
+            nxt = next_run[run]
+            y, next_y = ys[run], ys[nxt]
+            if left_to_right:
+                turn = min(xs_end[run], xs_end[nxt])
+                if turn != xs_end[run]:
+                    points += (turn, y)
+                points += (turn, next_y)
+                if xs_end[nxt] != turn:
+                    points += (xs_end[nxt], next_y)
+                points += (xs_start[nxt], next_y)
+            else:
+                turn = max(xs_start[run], xs_start[nxt])
+                if turn != xs_start[run]:
+                    points += (turn, y)
+                points += (turn, next_y)
+                if xs_start[nxt] != turn:
+                    points += (xs_start[nxt], next_y)
+                points += (xs_end[nxt], next_y)
+            left_to_right = not left_to_right
+            run = nxt
+        instruc.append(f"[{",".join(map(str, points))}];")
+
+    return "".join(instruc)
+
+
+def bundle_hash(path: Path = TEMP_FPATH) -> str:
+    """A hash of the contents of the DBM instruction bundle at `path`. The same instructions always have the same hash, whatever DBM implementation wrote them."""
+    digest = hashlib.sha1()
+    with dbm.open(path, 'r') as db:
+        for key in sorted(db.keys()):
+            digest.update(key + b"=" + read_instructions(db, key) + b"\n")
+    return digest.hexdigest()
+
+
+def make_portable(path: Path) -> Path:
+    """Rewrite the DBM instruction bundle at `path` with PORTABLE_FORMAT, so it can be opened on any machine whatever DBM implementation wrote it (ie. ndbm or gdbm on Linux). Returns `path`."""
+    if dbm.whichdb(str(path)) == PORTABLE_FORMAT:
+        return path
+    with dbm.open(path, 'r') as db:
+        contents = {key: read_instructions(db, key) for key in db.keys()}
+
+    # dbm.open picks the implementation from the files it finds, so none of the old ones can be left behind
+    for file in path.parent.iterdir():
+        if file.name == path.name or (file.stem == path.name and file.suffix in _DBM_SUFFIXES):
+            file.unlink()
+    with dbm.dumb.open(str(path), 'n') as db:
+        for key, value in contents.items():
+            db[key] = value
+    return path
+
+
+def _compute_instructions_for_palette_color(image_spec: SharedImageSpec, palette_index: int, palette_color: tuple, row_range: tuple[int, int], pitch: int = 1) -> tuple[str, str]:
+    """Worker process side of iter_instructions. Attach to the shared processed image, and compute the instructions for a palette color (at index `palette_index`, position `palette_color`) in rows `row_range[0]` up to (not including) `row_range[1]`."""
+    name, shape, dtype = image_spec
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        processed_image = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        start, stop = row_range
+        result = _instructions_for_rows(
+            processed_image[start:stop], palette_index, palette_color, start, pitch)
+        del processed_image
+    finally:
+        shm.close()
+    return result
+
+
+def _instructions_for_rows(processed_image: np.ndarray, palette_index: int, palette_color: tuple, row_offset: int, pitch: int = 1) -> tuple[str, str]:
+    """Like the name says, compute the instructions for a palette color. `processed_image` may be a band of rows from the full image, starting at row `row_offset`.
+    Coordinates and lengths are multiplied by `pitch`, with strokes through the middle of each `pitch` tall row, so a stroke `pitch` pixels wide covers the whole row.
+    Just to remember: the processed_image doesn't consist of colors, but rather the index of colors in the palette. We're searching for `palette_index` in processed_image, and the key is its [row, column] `palette_color`
 
     Instruction syntax: [x,y,length];[x2,y2,length2]
     Length is going x direction.
+    With the polyline INSTRUCTION_TYPE, runs are chained into polylines instead, see _polylines.
 
     """
     key = f"{palette_color[0]},{palette_color[1]}"
-    instruc = ""
-
-    for x, row in enumerate(processed_image):
-        tracking = False
-        cur_pos = tuple()
-        cur_length = 1
-
-        for y, color in enumerate(row):
-            is_correct_color = color[0] == palette_color[0] and color[1] == palette_color[1]
-            if is_correct_color and not tracking:
-                cur_pos = (x, y)
-                tracking = True
-            elif is_correct_color and tracking:
-                cur_length += 1
-            elif not is_correct_color and tracking:
-                tracking = False
-                instruc += f"[{cur_pos[1]},{cur_pos[0]},{cur_length}];"
-                # reset
-                cur_pos = tuple()
-                cur_length = 1
-
-        # there might be some leftover buffered, add it
-        if tracking:
-            instruc += f"[{cur_pos[1]},{cur_pos[0]},{cur_length}];"
+
+    # pad every row with a non-matching pixel on both sides, so every run has a start and an end on the same row
+    matches = np.zeros(
+        (processed_image.shape[0], processed_image.shape[1] + 2), dtype=np.int8)
+    matches[:, 1:-1] = processed_image == palette_index
+
+    # +1 where a run starts, -1 one past where a run ends. np.nonzero is row-major, so starts and ends pair up in order
+    changes = np.diff(matches, axis=1)
+    rows, starts = np.nonzero(changes == 1)
+    _, ends = np.nonzero(changes == -1)
+
+    if INSTRUCTION_TYPE == "polyline":
+        return (key, _polylines(rows + row_offset, starts, ends, pitch))
+
+    instruc = "".join([f"[{y},{x},{length}];" for x, y, length in zip(
+        ((rows + row_offset) * pitch + pitch // 2).tolist(), (starts * pitch).tolist(), ((ends - starts) * pitch).tolist())])
 
     return (key, instruc)
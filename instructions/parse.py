@@ -0,0 +1,28 @@
+"""
+Parses the instruction strings found in the instruction DBM (see from_processed_image.py) back into numbers, all at once with numpy rather than one stroke at a time.
+"""
+
+import numpy as np
+
+
+def parse_instructions(color_instrucs: str) -> np.ndarray:
+    """Parse the instructions of one color, "[x,y,length];[x,y,length];...", into an int32 array of shape (number of strokes, 3), with one (x, y, length) row per stroke."""
+    if not color_instrucs:
+        return np.empty((0, 3), dtype=np.int32)
+    # "[1,2,3];[4,5,6];" -> "1,2,3,4,5,6,"
+    numbers = color_instrucs.replace("[", "").replace("];", ",")
+    return np.fromstring(numbers, dtype=np.int32, sep=",").reshape(-1, 3)
+
+
+def parse_polylines(color_instrucs: str) -> tuple[np.ndarray, np.ndarray]:
+    """Parse the polyline instructions of one color, "[x1,y1,x2,y2,...];...", into an int32 array of shape (number of points, 2) with the (x, y) of every point,
+    and the index in it of the end of each polyline (exclusive)."""
+    if not color_instrucs:
+        return np.empty((0, 2), dtype=np.int32), np.empty(0, dtype=np.intp)
+    text = np.frombuffer(color_instrucs.encode(), dtype=np.uint8)
+    # every polyline has one more number than it has commas
+    commas = np.cumsum(text == ord(","))[text == ord("]")]
+    num_numbers = np.diff(commas, prepend=0) + 1
+    numbers = color_instrucs.replace("[", "").replace("];", ",")
+    points = np.fromstring(numbers, dtype=np.int32, sep=",").reshape(-1, 2)
+    return points, np.cumsum(num_numbers // 2)
@@ -0,0 +1,80 @@
+"""
+Progressive (coarse to fine) drawing plans, so a usable image is on the canvas early in a drawing rather than a few finished colors and big gaps.
+
+The first pass draws a low resolution version of the processed image with a wide stroke, one stroke row per `pitch` rows (see STROKE_SIZE_PX in interactions/constants.py).
+Every pass after it is finer, and only draws the cells whose color differs from what the canvas already shows after the passes before it.
+The last pass is at full resolution, so the finished drawing is exactly the processed image.
+
+What the canvas shows is tracked by a model of it: the most frequent color (bucketed first), with each drawn cell painting a `pitch` by `pitch` block of the model.
+Each pass is a delta image (see image_processing/image/delta.py) at its own resolution, ready for from_processed_image with the pass's pitch.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from image_processing.image.delta import UNCHANGED, bridge_gaps
+from image_processing.palette import Palette
+
+
+# the stroke sizes of the coarse passes, drawn in this order (only the ones wider than the final stroke size)
+# one coarse pass is about as many strokes in total as a flat plan, every extra one has cost more strokes than it saved on the images tried
+COARSE_STROKE_SIZES = (4,)
+
+
+@dataclass
+class DrawingPass:
+    """One pass of a drawing in passes, drawn with one stroke size."""
+    stroke_size: int
+    pitch: int
+    image: np.ndarray           # delta image of this pass, one pixel per `pitch` by `pitch` cell
+    order: tuple[bytes, ...]    # instruction keys in drawing order, most pixels first
+
+    @property
+    def num_cells(self) -> int:
+        """The number of cells drawn in this pass."""
+        return int(np.count_nonzero(self.image != UNCHANGED))
+
+
+def order_by_area(image: np.ndarray, palette: Palette, first: int | None = None) -> tuple[bytes, ...]:
+    """Instruction keys of every palette color, ordered by how many pixels of `image` they cover (most first), and with the color at index `first` before everything else."""
+    areas = np.bincount(image[image != UNCHANGED].ravel(),
+                        minlength=palette.num_colors)[:palette.num_colors]
+    order = [int(index) for index in np.argsort(-areas, kind="stable")]
+    if first is not None:
+        order.remove(first)
+        order.insert(0, first)
+    return tuple("{},{}".format(*palette.position(index)).encode() for index in order)
+
+
+def plan_progressive(processed_image: np.ndarray, palette: Palette, final_stroke_size: int, stroke_size_px: dict[int, int]) -> list[DrawingPass]:
+    """Plan drawing `processed_image` in passes, from the widest of COARSE_STROKE_SIZES down to a full resolution pass with `final_stroke_size`.
+    `stroke_size_px` is how many pixels wide each stroke size is. The first pass starts by bucketing its first color (see _BasicRedrawer.redraw_stream)."""
+    rows, cols = processed_image.shape
+    background = int(np.argmax(np.bincount(processed_image.ravel())))
+    canvas = np.full_like(processed_image, background)
+
+    stroke_sizes = [size for size in COARSE_STROKE_SIZES if size > final_stroke_size]
+    pitches = [stroke_size_px[size] for size in stroke_sizes]
+    passes = []
+    for stroke_size, pitch in (*zip(stroke_sizes, pitches), (final_stroke_size, 1)):
+        # only whole cells, the strips left over at the right and bottom edges are drawn by finer passes
+        cell_rows, cell_cols = rows // pitch, cols // pitch
+        centers = (slice(pitch // 2, cell_rows * pitch, pitch),
+                   slice(pitch // 2, cell_cols * pitch, pitch))
+        wanted = processed_image[centers]
+        draw = wanted != canvas[centers]
+
+        image = bridge_gaps(
+            np.where(draw, wanted, np.uint8(UNCHANGED)), wanted)
+        draw = image != UNCHANGED
+        order = order_by_area(image if passes else wanted, palette,
+                               None if passes else background)
+        passes.append(DrawingPass(stroke_size, pitch, image, order))
+
+        # paint the drawn cells onto the canvas model
+        block = canvas[:cell_rows * pitch, :cell_cols *
+                       pitch].reshape(cell_rows, pitch, cell_cols, pitch)
+        block[:] = np.where(draw[:, None, :, None], wanted[:, None, :, None], block)
+
+    return passes
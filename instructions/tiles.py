@@ -0,0 +1,96 @@
+"""
+Tiled drawing plans, for canvases larger than the part of them the Paint window can show (see interactions/viewport.py).
+
+The canvas is split into tiles, each small enough to be fully visible from an origin the viewport can scroll to exactly.
+Each tile is a delta image (see image_processing/image/delta.py) of the whole visible part of the canvas, with only the tile's own pixels drawn,
+so its instructions (see from_processed_image) are already relative to the viewport and nothing needs translating while drawing.
+
+Tiles are visited row by row, snaking left to right and back, so the viewport only ever scrolls to a neighbouring tile.
+The most frequent color is bucketed once at the start (bucketing fills the whole canvas, visible or not), and every tile starts with the color the tile before it ended with, to save a color switch.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from image_processing.image.delta import UNCHANGED
+from image_processing.palette import Palette
+
+
+@dataclass
+class Tile:
+    """One tile of a tiled drawing, drawn with the viewport scrolled to `origin`."""
+    origin: tuple[int, int]                 # (x, y) the viewport is scrolled to
+    bounds: tuple[int, int, int, int]       # (left, top, right, bottom) of the canvas pixels of this tile, right and bottom exclusive
+    image: np.ndarray                       # delta image of the visible part of the canvas, with only this tile's pixels drawn
+    order: tuple[bytes, ...]                # instruction keys of the colors in this tile, in drawing order
+
+    @property
+    def num_pixels(self) -> int:
+        """The number of pixels drawn in this tile."""
+        return int(np.count_nonzero(self.image != UNCHANGED))
+
+
+def _tile_starts(canvas_length: int, view_length: int, scroll_step: int) -> tuple[list[int], list[int]]:
+    """The start of every tile along one axis, and the origin the viewport is scrolled to for each."""
+    if canvas_length <= view_length:
+        return [0], [0]
+    # the origin of a tile is its start rounded down to a notch, so the tile has to leave room for up to one notch less than a whole notch
+    tile_length = view_length - scroll_step + 1
+    if tile_length <= 0:
+        raise ValueError(
+            f"A viewport of {view_length}px can't show a whole tile when scrolling {scroll_step}px at a time.")
+    # the same as the furthest origin of the viewport, see interactions/viewport.py
+    furthest = canvas_length - view_length
+    starts = list(range(0, canvas_length, tile_length))
+    return starts, [min(start - start % scroll_step, furthest) for start in starts]
+
+
+def plan_tiles(processed_image: np.ndarray, palette: Palette, view_size: tuple[int, int], scroll_step: int) -> list[Tile]:
+    """Plan drawing `processed_image` in tiles through a viewport of `view_size` (width, height) that scrolls `scroll_step` pixels at a time.
+    The first tile starts by bucketing the most frequent color (see _BasicRedrawer.redraw_stream), so no tile draws it."""
+    rows, cols = processed_image.shape
+    view_width, view_height = view_size
+    x_starts, x_origins = _tile_starts(cols, view_width, scroll_step)
+    y_starts, y_origins = _tile_starts(rows, view_height, scroll_step)
+
+    areas = np.bincount(processed_image.ravel(),
+                        minlength=palette.num_colors)[:palette.num_colors]
+    background = int(np.argmax(areas))
+    # colors drawn most pixels first, the same in every tile other than for the first color
+    by_area = [int(index) for index in np.argsort(-areas, kind="stable")
+               if index != background]
+
+    tiles = []
+    last_color = background
+    for tile_row, (top, origin_y) in enumerate(zip(y_starts, y_origins)):
+        bottom = y_starts[tile_row + 1] if tile_row + 1 < len(y_starts) else rows
+        columns = list(zip(range(len(x_starts)), x_starts, x_origins))
+        # snake back and forth, so the next tile is always a neighbour
+        if tile_row % 2:
+            columns.reverse()
+
+        for tile_col, left, origin_x in columns:
+            right = x_starts[tile_col + 1] if tile_col + 1 < len(x_starts) else cols
+            visible = processed_image[origin_y:origin_y + view_height,
+                                      origin_x:origin_x + view_width]
+            in_tile = np.zeros(visible.shape, dtype=bool)
+            in_tile[top - origin_y:bottom - origin_y,
+                    left - origin_x:right - origin_x] = True
+            image = np.where(in_tile & (visible != background),
+                             visible, np.uint8(UNCHANGED))
+
+            present = np.bincount(image[image != UNCHANGED].ravel(),
+                                  minlength=palette.num_colors) > 0
+            order = [index for index in by_area if present[index]]
+            if last_color in order:
+                order.remove(last_color)
+                order.insert(0, last_color)
+            if not tiles:
+                order.insert(0, background)
+            if order:
+                last_color = order[-1]
+
+            tiles.append(Tile((origin_x, origin_y), (left, top, right, bottom), image,
+                              tuple("{},{}".format(*palette.position(index)).encode() for index in order)))
+    return tiles
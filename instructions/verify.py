@@ -0,0 +1,197 @@
+"""
+Verifies instruction bundles (see from_processed_image) by rebuilding the image they draw and comparing it to the processed image they were made from,
+so a plan that doesn't draw what it should (ie. a color that went missing, runs dropped at the end of rows, strokes off the canvas) is caught before drawing rather than in Paint.
+
+Every color's strokes are turned back into runs of pixels of the processed image (undoing the `pitch`), and the runs of a color are scattered into per-pixel coverage counts all at once, with a difference array.
+Strokes are taken to cover exactly the pixels of their run, like SimulatedViewport draws them, so it's the plan being checked, not how wide Paint's brush is. Polylines cover their run on every row they go along.
+Then every pixel is checked for being:
+    a gap           a pixel to draw (not UNCHANGED) that no stroke of its color covers
+    an overlap      covered by more than one stroke
+    the wrong color covered by a stroke of a color other than its own (including pixels that should be left UNCHANGED)
+and every stroke for being out of bounds (partly outside of the image), or for polylines, malformed (a diagonal step, or a step over a row).
+It's a few passes over the image per color, so cheap enough to verify every plan before drawing it.
+
+Usage (from the repository root), to verify a plan written by batch.py or plan_server.py:
+    python -m instructions.verify [plan directory] [--instruction-type basic|polyline]
+"""
+
+import argparse
+import dbm
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_processing.image.delta import UNCHANGED
+from image_processing.palette import Palette
+from instructions.from_processed_image import INSTRUCTION_TYPE, color_keys, read_instructions
+from instructions.parse import parse_instructions, parse_polylines
+
+
+class PlanVerificationError(Exception):
+    """Raised when the instructions of a plan don't draw the processed image they were made from."""
+
+    def __init__(self, path: Path, report: "VerifyReport"):
+        self.report = report
+        super().__init__(f"The instructions at \"{path}\" don't draw their processed image: {report}")
+
+
+@dataclass
+class VerifyReport:
+    """What is wrong with an instruction bundle, see the file docstring. Everything is 0 for a bundle that draws its processed image exactly."""
+    num_strokes: int
+    gaps: int               # pixels
+    overlaps: int           # pixels
+    wrong_color: int        # pixels
+    out_of_bounds: int      # strokes
+    malformed: int          # strokes
+
+    @property
+    def ok(self) -> bool:
+        return not (self.gaps or self.overlaps or self.wrong_color or self.out_of_bounds or self.malformed)
+
+    def __str__(self) -> str:
+        return (f"{self.num_strokes} strokes, {self.gaps} gaps, {self.overlaps} overlaps, {self.wrong_color} pixels of the wrong color, "
+                f"{self.out_of_bounds} strokes out of bounds, {self.malformed} malformed")
+
+
+def _basic_runs(color_instrucs: str, pitch: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    """The (rows, starts, ends) of the runs of the processed image that basic instructions cover (ends exclusive), the stroke of each run, and the number of malformed strokes (always 0)."""
+    strokes = parse_instructions(color_instrucs)
+    x, y, length = strokes[:, 0], strokes[:, 1], strokes[:, 2]
+    # the same as _instructions_for_rows in reverse, a length of 1 is a click on a single pixel
+    return y // pitch, x // pitch, -(-(x + length) // pitch), np.arange(len(strokes)), 0
+
+
+def _polyline_runs(color_instrucs: str, pitch: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, int]:
+    """Like _basic_runs for polyline instructions, with one run for every row a polyline goes along (from the leftmost to the rightmost of its points on that row)."""
+    points, ends = parse_polylines(color_instrucs)
+    stroke = np.repeat(np.arange(len(ends)), np.diff(ends, prepend=0))
+    x, y = points[:, 0], points[:, 1]
+
+    # every step between points of the same polyline goes along a row, or down to the next one
+    same = stroke[1:] == stroke[:-1]
+    dx, dy = np.diff(x), np.diff(y)
+    bad_step = same & (((dx != 0) & (dy != 0)) | (np.abs(dy) > pitch))
+    malformed = len(np.unique(stroke[1:][bad_step]))
+
+    # group the points by polyline and row, polylines never come back to a row they left
+    row = y // pitch
+    order = np.lexsort((row, stroke))
+    stroke, row, x = stroke[order], row[order], x[order]
+    group_starts = np.flatnonzero(np.r_[True, (stroke[1:] != stroke[:-1]) | (row[1:] != row[:-1])]) \
+        if len(x) else np.empty(0, dtype=np.intp)
+    starts = np.minimum.reduceat(x, group_starts) if len(x) else x
+    stops = np.maximum.reduceat(x, group_starts) if len(x) else x
+    # clicks (and single pixel runs along a polyline) end where they start, see _polylines
+    stops = np.maximum(stops, starts + 1)
+    return row[group_starts], starts // pitch, -(-stops // pitch), stroke[group_starts], malformed
+
+
+def _color_runs(path: Path, pitch: int, instruction_type: str):
+    """Yield the key, runs and strokes of every color in the instructions at `path`, see _basic_runs."""
+    runs = {"basic": _basic_runs, "polyline": _polyline_runs}[instruction_type]
+    with dbm.open(path, "r") as db:
+        for key in color_keys(db):
+            yield key, *runs(read_instructions(db, key).decode(), pitch)
+
+
+def _coverage(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray, shape: tuple[int, int]) -> np.ndarray:
+    """How many of the runs cover every pixel of an image of `shape`. The runs must be in bounds."""
+    num_rows, num_cols = shape
+    # a difference array with a spare column for runs ending at the right edge, +1 where a run starts and -1 where it ends
+    size = num_rows * (num_cols + 1)
+    diff = np.bincount(rows * (num_cols + 1) + starts, minlength=size) - \
+        np.bincount(rows * (num_cols + 1) + ends, minlength=size)
+    return np.cumsum(diff.reshape(num_rows, num_cols + 1), axis=1)[:, :num_cols]
+
+
+def _canonical(palette: Palette) -> np.ndarray:
+    """For every palette index, the first index of the same RGB color. Strokes of either draw the same thing."""
+    _, first, inverse = np.unique(palette.rgb, axis=0, return_index=True, return_inverse=True)
+    return first[inverse.ravel()].astype(np.uint8)
+
+
+def verify_instructions(path: Path, processed_image: np.ndarray, palette: Palette, pitch: int = 1, instruction_type: str = INSTRUCTION_TYPE,  # type: ignore
+                        reconstruction: np.ndarray | None = None) -> VerifyReport:
+    """Check that the instructions at `path` (written with `pitch`, see from_processed_image) draw exactly `processed_image`, see the file docstring.
+    If `reconstruction` is given (an array the shape of `processed_image`), the image the instructions draw is written into it, UNCHANGED where nothing is drawn."""
+    shape = processed_image.shape
+    canonical = _canonical(palette)
+    wanted = np.where(processed_image == UNCHANGED, np.uint8(UNCHANGED),
+                      canonical[np.minimum(processed_image, palette.num_colors - 1)])
+    if reconstruction is not None:
+        reconstruction[:] = UNCHANGED
+
+    total = np.zeros(shape, dtype=np.int64)
+    covered_wanted = np.zeros(shape, dtype=bool)
+    num_strokes = wrong_color = out_of_bounds = malformed = 0
+    for key, rows, starts, ends, strokes, num_malformed in _color_runs(path, pitch, instruction_type):
+        color = canonical[palette.index(*map(int, key.split(b",")))]
+        num_strokes += int(strokes.max()) + 1 if len(strokes) else 0
+        malformed += num_malformed
+
+        outside = (rows < 0) | (rows >= shape[0]) | (starts < 0) | (ends > shape[1]) | (ends <= starts)
+        out_of_bounds += len(np.unique(strokes[outside]))
+        inside = ~outside
+        coverage = _coverage(rows[inside], starts[inside], ends[inside], shape)
+
+        # a polyline covers its own run once, even if it goes along it back and forth
+        total += coverage
+        drawn = coverage > 0
+        covered_wanted |= drawn & (wanted == color)
+        wrong_color += int(np.count_nonzero(drawn & (wanted != color)))
+        if reconstruction is not None:
+            reconstruction[drawn] = color
+
+    gaps = int(np.count_nonzero((wanted != UNCHANGED) & ~covered_wanted))
+    overlaps = int(np.count_nonzero(total > 1))
+    return VerifyReport(num_strokes, gaps, overlaps, wrong_color, out_of_bounds, malformed)
+
+
+def check_instructions(path: Path, processed_image: np.ndarray, palette: Palette, pitch: int = 1, instruction_type: str = INSTRUCTION_TYPE) -> VerifyReport:  # type: ignore
+    """verify_instructions, raising PlanVerificationError unless the instructions draw `processed_image` exactly."""
+    report = verify_instructions(path, processed_image, palette, pitch, instruction_type)
+    if not report.ok:
+        raise PlanVerificationError(path, report)
+    return report
+
+
+def verify_plan(plan_dir: Path, instruction_type: str = INSTRUCTION_TYPE) -> VerifyReport:  # type: ignore
+    """verify_instructions for a plan written by batch.py, using its palette.json, preview.png and plan.json (for the pitch, if planned for a time budget)."""
+    palette = Palette.load(plan_dir / "palette.json")
+    pitch = 1
+    if (plan_dir / "plan.json").exists():
+        with open(plan_dir / "plan.json") as f:
+            pitch = json.load(f)["pitch"]
+
+    with Image.open(plan_dir / "preview.png") as preview:
+        # one pixel of the processed image is drawn as a pitch by pitch square of the preview
+        packed = np.asarray(preview.convert("RGB"), dtype=np.uint32)[::pitch, ::pitch]
+    packed = (packed[..., 0] << 16) | (packed[..., 1] << 8) | packed[..., 2]
+    palette_order = np.argsort(palette.packed, kind="stable")
+    found = np.searchsorted(palette.packed, packed, sorter=palette_order)
+    found = palette_order[np.minimum(found, palette.num_colors - 1)]
+    if (palette.packed[found] != packed).any():
+        raise ValueError(f"The preview at \"{plan_dir / "preview.png"}\" has colors that aren't in its palette.")
+
+    return verify_instructions(plan_dir / "instructions", found.astype(np.uint8), palette, pitch, instruction_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that a plan's instructions draw exactly its preview, without a display.")
+    parser.add_argument("plan", help="directory of the plan, ie. one image's output of batch.py")
+    parser.add_argument("--instruction-type", choices=("basic", "polyline"), default=INSTRUCTION_TYPE,
+                        help="INSTRUCTION_TYPE the plan was made with, instead of the one in settings.env")
+    args = parser.parse_args()
+
+    report = verify_plan(Path(args.plan), args.instruction_type)
+    print(f"{"OK" if report.ok else "FAILED"}: {report}")
+    raise SystemExit(0 if report.ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Input backends, the only place input events actually leave the program. Everything above them (Cursor, the toolbar and canvas interactions, the pacer) is the same no matter the backend.
+
+    PynputBackend       sends real mouse/keyboard events with pynput, with geometry from the Paint window (Windows only)
+    RecordingBackend    sends nothing, only timestamps every event, with made up geometry. Works anywhere, see benchmark.py
+
+Keys are passed around by name (ie. "enter", "delete"), the names of pynput.keyboard.Key.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+
+from interactions.window import PaintWindow, BoundingRect
+
+
+class InputBackend(ABC):
+    """Sends mouse and keyboard events, and knows where the Paint window is."""
+
+    @abstractmethod
+    def window_rect(self) -> BoundingRect:
+        """The Paint window, relative to the monitor it is on. See PaintWindow.window_rect."""
+
+    @abstractmethod
+    def monitor_rect(self) -> BoundingRect:
+        """The working area of the monitor the Paint window is on. See PaintWindow.monitor_rect."""
+
+    @abstractmethod
+    def move(self, x: int, y: int) -> None:
+        """Move the mouse to (x, y), relative to the screen."""
+
+    @abstractmethod
+    def click(self, num_clicks: int = 1) -> None:
+        """Click the left mouse button `num_clicks` times."""
+
+    @abstractmethod
+    def press(self) -> None:
+        """Press down the left mouse button."""
+
+    @abstractmethod
+    def release(self) -> None:
+        """Release the left mouse button."""
+
+    @abstractmethod
+    def scroll(self, dx: int, dy: int) -> None:
+        """Turn the mouse wheel `dx` notches horizontally and `dy` notches vertically, positive being right and down."""
+
+    @abstractmethod
+    def type(self, text: str) -> None:
+        """Type out `text` on the keyboard."""
+
+    @abstractmethod
+    def tap(self, key: str) -> None:
+        """Press and release the key named `key`."""
+
+    @abstractmethod
+    def hotkey(self, modifier: str, key: str) -> None:
+        """Press and release the character `key` (ie. "a") while holding down the key named `modifier` (ie. "ctrl")."""
+
+
+class PynputBackend(InputBackend):
+    def __init__(self, window: PaintWindow) -> None:
+        """Sends real input events with pynput, to the already initialized Paint `window`."""
+        # imported here so that other backends don't need pynput (or a display) at all
+        from pynput import keyboard, mouse
+
+        self._window = window
+        self._mouse = mouse.Controller()
+        self._keyboard = keyboard.Controller()
+        self._left = mouse.Button.left
+        self._keys = keyboard.Key
+
+    def window_rect(self) -> BoundingRect:
+        return self._window.window_rect()
+
+    def monitor_rect(self) -> BoundingRect:
+        return self._window.monitor_rect()
+
+    def move(self, x: int, y: int) -> None:
+        self._mouse.position = (x, y)
+
+    def click(self, num_clicks: int = 1) -> None:
+        self._mouse.click(self._left, num_clicks)
+
+    def press(self) -> None:
+        self._mouse.press(self._left)
+
+    def release(self) -> None:
+        self._mouse.release(self._left)
+
+    def scroll(self, dx: int, dy: int) -> None:
+        # pynput scrolls up for positive dy
+        self._mouse.scroll(dx, -dy)
+
+    def type(self, text: str) -> None:
+        self._keyboard.type(text)
+
+    def tap(self, key: str) -> None:
+        self._keyboard.tap(self._keys[key])
+
+    def hotkey(self, modifier: str, key: str) -> None:
+        with self._keyboard.pressed(self._keys[modifier]):
+            self._keyboard.tap(key)
+
+
+# events RecordingBackend can count as dropped
+_BUTTON_EVENTS = ("click", "press", "release")
+
+
+class RecordedEvent(NamedTuple):
+    time: float         # time.perf_counter() when the event was sent
+    event: str          # "move", "click", "press", "release", "scroll", "type", "tap" or "hotkey"
+    args: tuple
+
+
+class RecordingBackend(InputBackend):
+    def __init__(self, window_rect: BoundingRect = BoundingRect(0, 0, 1920, 1009),
+                 monitor_rect: BoundingRect = BoundingRect(0, 0, 1920, 1040), min_interval: float = 0) -> None:
+        """Records every event with a timestamp instead of sending it, pretending the Paint window is `window_rect` on a monitor at `monitor_rect`.
+        Mouse buttons pressed, released or clicked less than `min_interval` seconds after the previous one are counted as dropped (see dropped), to simulate an application that can't keep up.
+        Moves are never dropped, the cursor is moved to the start of every stroke right before pressing."""
+        self._window_rect = window_rect
+        self._monitor_rect = monitor_rect
+        self._min_interval = min_interval
+
+        self.events: list[RecordedEvent] = []
+        self._num_dropped = 0
+        self._last_time = float("-inf")
+
+    def _record(self, event: str, *args) -> None:
+        now = time.perf_counter()
+        if event in _BUTTON_EVENTS:
+            if now - self._last_time < self._min_interval:
+                self._num_dropped += 1
+            self._last_time = now
+        self.events.append(RecordedEvent(now, event, args))
+
+    def dropped(self) -> bool:
+        """Whether any events were dropped since the last call. Can be used as the error signal of adaptive pacing."""
+        dropped = self._num_dropped > 0
+        self._num_dropped = 0
+        return dropped
+
+    def clear(self) -> None:
+        """Forget all recorded events."""
+        self.events.clear()
+        self._num_dropped = 0
+        self._last_time = float("-inf")
+
+    def window_rect(self) -> BoundingRect:
+        return self._window_rect
+
+    def monitor_rect(self) -> BoundingRect:
+        return self._monitor_rect
+
+    def move(self, x: int, y: int) -> None:
+        self._record("move", x, y)
+
+    def click(self, num_clicks: int = 1) -> None:
+        self._record("click", num_clicks)
+
+    def press(self) -> None:
+        self._record("press")
+
+    def release(self) -> None:
+        self._record("release")
+
+    def scroll(self, dx: int, dy: int) -> None:
+        self._record("scroll", dx, dy)
+
+    def type(self, text: str) -> None:
+        self._record("type", text)
+
+    def tap(self, key: str) -> None:
+        self._record("tap", key)
+
+    def hotkey(self, modifier: str, key: str) -> None:
+        self._record("hotkey", modifier, key)
@@ -0,0 +1,99 @@
+"""
+Microbenchmarks of the interaction stack, measuring how many input events per second make it through each layer when sending the events themselves costs nothing.
+Runs anywhere (no Paint, no Windows), since events go to a RecordingBackend (see backends.py) rather than the OS.
+
+By default all pacing budgets are set to 0, so the numbers are purely the Python overhead per event. Use --paced to keep the budgets in constants.py.
+Use --adaptive to keep them and pace adaptively instead (see pacing.py), against a backend that drops button events sent less than MICROSECONDS apart, to see the scale of the budgets adaptive pacing settles at.
+
+Usage (from the repository root):
+    python -m interactions.benchmark [--strokes N] [--paced] [--adaptive MICROSECONDS]
+"""
+
+import argparse
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+from interactions.backends import RecordingBackend
+from interactions.cursor import Point
+from interactions.manager import InteractionsManager
+from interactions.pacing import Pacer
+import interactions.constants as C
+
+
+def _bench(name: str, backend: RecordingBackend, run: Callable[[], None], pacer: Pacer | None = None) -> None:
+    """Time `run`, and print the events per second it sent along with the gaps between consecutive events.
+    With the `pacer` of adaptive pacing, it starts over for every benchmark, and the scale it settled at is printed too."""
+    backend.clear()
+    if pacer is not None:
+        pacer.reset()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+
+    num_events = len(backend.events)
+    gaps = np.diff([e.time for e in backend.events]) * 1e6
+    print(f"{name:<16} {num_events:>9} events {elapsed:>8.3f}s {num_events / elapsed:>12,.0f} events/sec    "
+          f"gap between events (us): median {np.median(gaps):.2f}, p99 {np.percentile(gaps, 99):.2f}"
+          + (f"    adaptive scale {pacer.scale:.3f}" if pacer is not None else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure events/sec through the interaction stack, without sending any real input.")
+    parser.add_argument("--strokes", type=int, default=20000,
+                        help="number of clicks/strokes per benchmark")
+    parser.add_argument("--paced", action="store_true",
+                        help="keep the pacing budgets instead of setting them all to 0")
+    parser.add_argument("--adaptive", type=float, default=None, metavar="MICROSECONDS",
+                        help="pace adaptively, with events sent less than MICROSECONDS apart counted as dropped")
+    args = parser.parse_args()
+
+    if args.adaptive is None:
+        backend = RecordingBackend()
+        manager = InteractionsManager(None, backend=backend)
+    else:
+        backend = RecordingBackend(min_interval=args.adaptive / 1e6)
+        manager = InteractionsManager(None, backend=backend, error_signal=backend.dropped)
+    if not args.paced and args.adaptive is None:
+        for event in C.EVENT_BUDGETS:
+            manager.pacer.set_budget(event, 0)
+
+    # strokes spread over a 500x500 area of the canvas, all within the window
+    rng = np.random.default_rng(0)
+    strokes = np.column_stack((rng.integers(0, 500, args.strokes),
+                               rng.integers(0, 500, args.strokes),
+                               rng.integers(2, 20, args.strokes))).astype(np.int32)
+    points = [Point(x, y) for x, y, _ in strokes.tolist()]
+    canvas_points = [manager._transform_point_to_canvas(p) for p in points]
+
+    def clicks():
+        for point in canvas_points:
+            manager._click(point)
+
+    def drags():
+        for point, (x, y, length) in zip(points, strokes.tolist()):
+            manager.canvas_drag(point, Point(x + length, y))
+
+    def drags_to():
+        for point in points:
+            manager.canvas_drag_to(point)
+
+    def replay():
+        manager.replay_strokes(manager.compile_strokes(strokes))
+
+    if args.adaptive is not None:
+        pacing = f"adaptive, dropping events under {args.adaptive:g}us apart"
+    else:
+        pacing = "paced" if args.paced else "unpaced (budgets set to 0)"
+    print(f"{args.strokes} clicks/strokes each, {pacing}")
+    pacer = manager.pacer if args.adaptive is not None else None
+    _bench("_click", backend, clicks, pacer)
+    _bench("canvas_drag", backend, drags, pacer)
+    _bench("canvas_drag_to", backend, drags_to, pacer)
+    _bench("replay_strokes", backend, replay, pacer)
+
+
+if __name__ == '__main__':
+    main()
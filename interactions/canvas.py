@@ -1,7 +1,14 @@
-import time
-from interactions.cursor import Point
+import numpy as np
+from typing import NamedTuple
+from interactions.cursor import Point, EVENT_DTYPE, EVENT_CLICK, EVENT_PRESS, EVENT_RELEASE, EVENT_MOVE
 from interactions.universals import UniversalInteractionsHeader
-from interactions.constants import CANVAS_TOP_LEFT, DEFAULT_DELAY
+from interactions.constants import CANVAS_TOP_LEFT
+
+
+class CompiledStrokes(NamedTuple):
+    """Strokes compiled into the events that draw them, see CanvasInteractions.compile_strokes."""
+    events: np.ndarray          # EVENT_DTYPE records relative to the screen
+    stroke_ends: np.ndarray     # index in events of the end of each stroke (exclusive)
 
 
 class CanvasInteractions(UniversalInteractionsHeader):
@@ -14,23 +21,99 @@ class CanvasInteractions(UniversalInteractionsHeader):
 
     def canvas_click(self, point: Point) -> None:
         """Click on the canvas relative to the top left of the canvas section of the window."""
-        self._click(self._transform_point_to_canvas(point))
+        self._click(self._transform_point_to_canvas(point), post="stroke_click")
 
     def canvas_drag(self, start_point: Point, end_point: Point) -> None:
         """Hold and drag the cursor from `start_point` to `end_point` on the canvas."""
+        self._pacer.wait()
         self._mouse.hold(
             initial_position=self._transform_point_to_canvas(start_point))
-        time.sleep(DEFAULT_DELAY)
+        self._pacer.sent("stroke_press")
+        self._pacer.wait()
         self._mouse.release(
             initial_position=self._transform_point_to_canvas(end_point))
-        time.sleep(DEFAULT_DELAY)
+        self._pacer.sent("stroke_release")
 
     def canvas_drag_to(self, end_point: Point) -> None:
         """Hold and drag the cursor from last cursor location to `end_point` on the canvas."""
+        self._pacer.wait()
         self._mouse.hold()
         self._mouse.release(
             initial_position=self._transform_point_to_canvas(end_point))
-        time.sleep(DEFAULT_DELAY)
+        self._pacer.sent("stroke_release")
+
+    def canvas_scroll(self, dx: int, dy: int) -> None:
+        """Scroll a canvas larger than the window `dx` notches right and `dy` notches down (negative for left and up), with the cursor over the canvas. See viewport.py."""
+        self._pacer.wait()
+        self._move(self._transform_point_to_canvas(Point(5, 5)))
+        if dx:
+            self._backend.scroll(dx, 0)
+        if dy:
+            self._backend.scroll(0, dy)
+        self._pacer.sent("scroll")
+
+    def visible_canvas_size(self) -> tuple[int, int]:
+        """The (width, height) of the part of the canvas the window has room to show, the largest canvas that needs no scrolling."""
+        canvas_rect = self._canvas_rect()
+        return (canvas_rect.width, canvas_rect.height)
+
+    def compile_strokes(self, strokes: np.ndarray) -> CompiledStrokes:
+        """Compile an (n, 3) array of horizontal (x, y, length) strokes on the canvas into the events that draw them, ready for replay_strokes.
+        Strokes of length 1 are a click, the rest a press at (x, y) and a release at (x + length, y), the same as canvas_click and canvas_drag.
+        Every point is converted to the screen and checked to be in the window here, once, instead of for every event while drawing."""
+        x = strokes[:, 0] + CANVAS_TOP_LEFT[0]
+        y = strokes[:, 1] + CANVAS_TOP_LEFT[1]
+        is_click = strokes[:, 2] == 1
+
+        # every stroke gets a press/click event and a release event, releases of clicks are dropped after
+        events = np.empty((len(strokes), 2), dtype=EVENT_DTYPE)
+        events["event"][:, 0] = np.where(is_click, EVENT_CLICK, EVENT_PRESS)
+        events["event"][:, 1] = EVENT_RELEASE
+        events["x"][:, 0] = x
+        events["x"][:, 1] = x + strokes[:, 2]
+        events["y"][:, 0] = y
+        events["y"][:, 1] = y
+
+        keep = np.ones((len(strokes), 2), dtype=bool)
+        keep[:, 1] = ~is_click
+        events = events[keep]
+
+        screen_points = self._mouse.to_screen(
+            np.stack((events["x"], events["y"]), axis=1))
+        events["x"] = screen_points[:, 0]
+        events["y"] = screen_points[:, 1]
+
+        stroke_ends = np.cumsum(np.where(is_click, 1, 2))
+        return CompiledStrokes(events, stroke_ends)
+
+    def compile_polylines(self, points: np.ndarray, polyline_ends: np.ndarray) -> CompiledStrokes:
+        """Compile polylines on the canvas (see parse_polylines) into the events that draw them, ready for replay_strokes.
+        Polylines of one point are a click, the rest a press at the first point, a move to every point after it, and a release at the last one."""
+        num_points = np.diff(polyline_ends, prepend=0)
+        is_first = np.zeros(len(points), dtype=bool)
+        is_first[polyline_ends[:-1]] = True
+        is_first[:1] = True
+        is_last = np.zeros(len(points), dtype=bool)
+        is_last[polyline_ends - 1] = True
+
+        events = np.empty(len(points), dtype=EVENT_DTYPE)
+        events["event"] = EVENT_MOVE
+        events["event"][is_first] = EVENT_PRESS
+        events["event"][is_last] = EVENT_RELEASE
+        events["event"][polyline_ends[num_points == 1] - 1] = EVENT_CLICK
+
+        screen_points = self._mouse.to_screen(
+            points + np.asarray(CANVAS_TOP_LEFT, dtype=np.int32))
+        events["x"] = screen_points[:, 0]
+        events["y"] = screen_points[:, 1]
+        return CompiledStrokes(events, polyline_ends)
+
+    def replay_strokes(self, compiled: CompiledStrokes, start: int = 0, stop: int | None = None) -> None:
+        """Draw strokes number `start` up to (not including) `stop` of some compiled strokes. See Cursor.replay."""
+        stop = len(compiled.stroke_ends) if stop is None else stop
+        if start >= stop:
+            return
+        first_event = compiled.stroke_ends[start - 1] if start else 0
+        self._mouse.replay(
+            compiled.events[first_event:compiled.stroke_ends[stop - 1]], self._pacer)
 
-    # TODO: add a get max canvas size function, based on bottom and right padding constants
-    # perhaps make it a part of the manager?
@@ -9,6 +9,24 @@ with open(Path('./interactions/interaction_points.json')) as f:
 TOOLBAR_LONG_DELAY = 0.4
 DEFAULT_DELAY = 0.00002
 
+# ----- Pacing (see pacing.py) -----
+# Seconds to leave after each type of input event (or before, when used as a pre-delay, ie. waiting for a dropdown to open)
+EVENT_BUDGETS: dict[str, float] = {
+    "click": 0.005,                     # clicks outside of the canvas
+    "key": 0,                           # keyboard taps and typing
+    "toolbar": TOOLBAR_LONG_DELAY,      # toolbar buttons, dropdowns and palette colors taking effect
+    "dialog": TOOLBAR_LONG_DELAY / 2,   # the edit colors dialog opening
+    "stroke_press": DEFAULT_DELAY,      # pressing down to start a stroke on the canvas
+    "stroke_release": DEFAULT_DELAY,    # releasing to end a stroke on the canvas
+    "stroke_click": 0.005,              # single pixel strokes on the canvas
+    "scroll": TOOLBAR_LONG_DELAY / 2,   # the canvas view scrolling, see viewport.py
+    "stroke_move": DEFAULT_DELAY,       # moving to the next point of a polyline stroke, Paint joins the points it sees with straight lines so none can be skipped
+}
+# Events whose budgets adaptive pacing is allowed to shrink. Toolbar and dialog events have no way of telling if they were missed, so they're left alone
+ADAPTIVE_EVENTS = ("stroke_press", "stroke_release", "stroke_click", "stroke_move")
+# Rough Python-side seconds spent per input event on top of its budget, measured with interactions/benchmark.py
+EVENT_OVERHEAD = 0.000005
+
 
 # ----- Toolbar related constants -----
 TOOLBAR = IP["Toolbar"]
@@ -49,6 +67,8 @@ BRUSH_TYPES: dict[str, tuple[int, int]] = TOOLBAR["brushes"]["menu"]
 # --- Stroke
 STROKE_SIZE_BUTTON: tuple[int, int] = TOOLBAR["stroke_size"]["button"]
 STROKE_SIZES: dict[str, tuple[int, int]] = TOOLBAR["stroke_size"]["menu"]
+# How many pixels wide a stroke of each stroke size (1 to 4) is
+STROKE_SIZE_PX: dict[int, int] = {1: 1, 2: 3, 3: 5, 4: 8}
 
 # --- Edit colors
 EDIT_COLORS_BUTTON: tuple[int, int] = TOOLBAR["edit_colors"]["button"]
@@ -66,3 +86,5 @@ CANVAS = INTERACTION_POINTS["Canvas"]
 CANVAS_TOP_LEFT: tuple[int, int] = CANVAS["top-left"]
 CANVAS_BOTTOM_PADDING: int = CANVAS["bottom-padding"]
 CANVAS_RIGHT_PADDING: int = CANVAS["right-padding"]
+# how far one notch of the mouse wheel scrolls a canvas larger than the window, at 100% zoom (see viewport.py)
+SCROLL_STEP_PX: int = CANVAS["scroll-step"]
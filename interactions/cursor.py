@@ -1,11 +1,21 @@
 import os
 import time
+import numpy as np
 from interactions.window import PaintWindow, BoundingRect
-import pynput.mouse as pynmouse
+from interactions.backends import InputBackend, PynputBackend
+from interactions.pacing import Pacer
 from collections import namedtuple
 
 Point = namedtuple("Point", ["x", "y"])
 
+# Compiled event streams (see Cursor.replay) are arrays of these records, with x and y relative to the screen
+EVENT_DTYPE = np.dtype([("event", np.uint8), ("x", np.int32), ("y", np.int32)])
+# event types of compiled event streams. Each moves the cursor to (x, y) first
+EVENT_CLICK = 0
+EVENT_PRESS = 1
+EVENT_RELEASE = 2
+EVENT_MOVE = 3      # moving while pressed, drawing a line from the last event
+
 
 class CursorOutOfWindowError(Exception):
     """Raised when the cursor is assigned to be out of bounds of the Paint window,"""
@@ -16,18 +26,18 @@ class CursorOutOfWindowError(Exception):
 
 
 class Cursor:
-    """Directly interacts with the mouse/cursor position. Wraps the behavior of pynput.mouse.Controller()"""
+    """Directly interacts with the mouse/cursor position. Wraps the mouse side of an input backend (see backends.py)"""
 
-    def __init__(self, window: PaintWindow) -> None:
-        naive_win_rect = window.window_rect()
-        monitor_rect = window.monitor_rect()
+    def __init__(self, backend: InputBackend) -> None:
+        naive_win_rect = backend.window_rect()
+        monitor_rect = backend.monitor_rect()
 
         self._win_rect = BoundingRect(monitor_rect.x + naive_win_rect.x,
                                       monitor_rect.y + naive_win_rect.y,
                                       naive_win_rect.width,
                                       naive_win_rect.height)
 
-        self._mouse = pynmouse.Controller()
+        self._mouse = backend
 
         # _cursor_pos monitors the exact position of the cursor on the screen
         # but the class utilizes @property so the user will only know relative cursor position (relative to window)
@@ -52,11 +62,56 @@ class Cursor:
             raise CursorOutOfWindowError("Y", new_position)
 
         self._cursor_pos = Point(new_x, new_y)
-        self._mouse.position = self._cursor_pos
+        self._mouse.move(new_x, new_y)
+
+    def to_screen(self, points: np.ndarray) -> np.ndarray:
+        """Convert an (n, 2) array of (x, y) points relative to the paint window into points relative to the screen, all at once.
+        Raises CursorOutOfWindowError for the first point outside the window, the same as setting position would."""
+        screen_points = np.asarray(points, dtype=np.int32) + \
+            np.asarray((self._win_rect.x, self._win_rect.y), dtype=np.int32)
+
+        for dimension, axis, low, size in (("X", 0, self._win_rect.x, self._win_rect.width),
+                                           ("Y", 1, self._win_rect.y, self._win_rect.height)):
+            outside = (screen_points[:, axis] <= low) | (
+                screen_points[:, axis] >= low + size)
+            if outside.any():
+                raise CursorOutOfWindowError(
+                    dimension, Point(*points[np.argmax(outside)].tolist()))
+        return screen_points
+
+    def replay(self, events: np.ndarray, pacer: Pacer) -> None:
+        """Send a compiled stream of events (an array of EVENT_DTYPE records, already relative to the screen and checked to be in the window) as fast as the pacer allows.
+        Skips all of the per-event checks and conversions done by position, click, hold and release, so as little time as possible is spent between events."""
+        if not len(events):
+            return
+        move = self._mouse.move
+        press = self._mouse.press
+        release = self._mouse.release
+        click = self._mouse.click
+        wait = pacer.wait
+        sent = pacer.sent
+
+        for event, x, y in events.tolist():
+            wait()
+            move(x, y)
+            if event == EVENT_PRESS:
+                press()
+                sent("stroke_press")
+            elif event == EVENT_RELEASE:
+                release()
+                sent("stroke_release")
+            elif event == EVENT_MOVE:
+                sent("stroke_move")
+            else:
+                click(1)
+                sent("stroke_click")
+
+        self._cursor_pos = Point(x, y)
+        self._held = event in (EVENT_PRESS, EVENT_MOVE)
 
     def click(self, num_clicks: int = 1) -> None:
         """Click the left mouse button once. Optionally specify number of clicks, defaults to one."""
-        self._mouse.click(pynmouse.Button.left, num_clicks)
+        self._mouse.click(num_clicks)
 
     def hold(self, *, initial_position: None | Point = None) -> None:
         """Hold left click button until .release() is called. Does nothing if already being held."""
@@ -66,7 +121,7 @@ class Cursor:
             self._held = True
             if initial_position is not None:
                 self.position = initial_position
-            self._mouse.press(pynmouse.Button.left)
+            self._mouse.press()
 
     def release(self, *, initial_position: None | Point = None) -> None:
         """Release left click button, assuming hold() has already been called. Does nothing if mouse is already released."""
@@ -76,13 +131,13 @@ class Cursor:
             self._held = False
             if initial_position is not None:
                 self.position = initial_position
-            self._mouse.release(pynmouse.Button.left)
+            self._mouse.release()
 
 
 if __name__ == '__main__':
     p = PaintWindow()
     p.initialize_window()
-    i = Cursor(p)
+    i = Cursor(PynputBackend(p))
     time.sleep(0.7)
 
     i.position = Point(800, 100)
@@ -1,9 +1,11 @@
 from interactions.window import PaintWindow, BoundingRect
 from interactions.cursor import Cursor, Point
-from interactions.toolbar import ToolbarInteractions
+from interactions.toolbar import ToolbarInteractions, ToolbarState, ToolbarVerifier
 from interactions.canvas import CanvasInteractions
-from pynput import keyboard
-import time
+from interactions.pacing import Pacer
+from interactions.backends import InputBackend, PynputBackend
+import interactions.constants as C
+from collections.abc import Callable
 
 
 class Singleton(type):
@@ -46,9 +48,41 @@ class InteractionsManager(ToolbarInteractions, CanvasInteractions, metaclass=Sin
      then dynamically add each non-superclass method from the two subclasses back into the GrandSuperClass
      """
 
-    def __init__(self, window: PaintWindow) -> None:
+    def __init__(self, window: PaintWindow | None, error_signal: Callable[[], bool] | None = None, toolbar_verifier: ToolbarVerifier | None = None,
+                 backend: InputBackend | None = None) -> None:
+        """Input events are sent through `backend`, which defaults to real input events (pynput) on the Paint `window`. With any other backend, `window` can be None.
+        With an `error_signal`, pacing is adaptive (see pacing.py), and it's called to check if events are being dropped (returning True if so), ie. RecordingBackend.dropped.
+        Without one, the delays in constants.py are used as they are. Nothing can tell yet whether real Paint dropped events, so real drawings always use fixed pacing.
+        `toolbar_verifier` is called after toolbar actions to check they took effect (see ToolbarVerifier). Without one, toolbar actions are trusted to work."""
+        if backend is None:
+            if window is None:
+                raise ValueError(
+                    "A Paint window is needed to send real input events to.")
+            backend = PynputBackend(window)
         self._window = window
-        self._bounding_rect = window.window_rect()
+        self._backend = backend
+        self._bounding_rect = backend.window_rect()
 
-        self._mouse = Cursor(window)
-        self._keyboard = keyboard.Controller()
+        self._mouse = Cursor(backend)
+
+        self._pacer = Pacer(C.EVENT_BUDGETS, adaptive=error_signal is not None,
+                            adaptive_events=C.ADAPTIVE_EVENTS, error_signal=error_signal)
+
+        self._toolbar_state = ToolbarState()
+        self._toolbar_verifier = toolbar_verifier
+
+    @property
+    def pacer(self) -> Pacer:
+        """The pacer timing every input event, see pacing.py."""
+        return self._pacer
+
+    @property
+    def backend(self) -> InputBackend:
+        """The input backend events are sent through, see backends.py."""
+        return self._backend
+
+    def forget_toolbar_state(self, keep_custom_colors: bool = False) -> None:
+        """Forget everything known about the toolbar, ie. after Paint was used by something else, so the next toolbar actions are all performed.
+        With `keep_custom_colors`, the custom colors created so far are kept, ie. after only saving the drawing, which can't remove them."""
+        custom_colors = self._toolbar_state.custom_colors if keep_custom_colors else []
+        self._toolbar_state = ToolbarState(custom_colors=custom_colors)
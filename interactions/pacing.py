@@ -0,0 +1,105 @@
+"""
+Owns all of the timing between input events sent to Paint. Nothing else in interactions should sleep.
+
+Every event type has a delay budget (see EVENT_BUDGETS in constants.py). Rather than sleeping for the budget right after an event, the Pacer only records a deadline,
+and waits for it right before the next event is sent. Any work done in between (parsing the next stroke, moving the cursor, etc.) then happens during the delay instead of after it.
+Waiting uses time.perf_counter, sleeping for most of the wait and spinning for the last bit, since time.sleep alone can't reliably wait for fractions of a millisecond.
+
+In adaptive mode, the budgets of the drawing events (see ADAPTIVE_EVENTS in constants.py) are scaled down little by little for as long as an error signal says no events were dropped.
+When it says events were dropped, the scale backs off, and never goes back below the scale that dropped events.
+"""
+
+import time
+from collections.abc import Callable
+
+
+# waits shorter than this are spun rather than slept
+_SPIN_THRESHOLD = 0.002
+
+
+def sleep_until(deadline: float) -> None:
+    """Block until time.perf_counter() reaches `deadline`."""
+    remaining = deadline - time.perf_counter()
+    if remaining > _SPIN_THRESHOLD:
+        time.sleep(remaining - _SPIN_THRESHOLD)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class Pacer:
+    def __init__(self, budgets: dict[str, float], *, adaptive: bool = False, adaptive_events: tuple[str, ...] = (),
+                 error_signal: Callable[[], bool] | None = None, check_every: int = 200,
+                 speedup: float = 0.9, backoff: float = 1.5, min_scale: float = 0.05, max_scale: float = 4.0) -> None:
+        """Paces input events using the delay `budgets` (seconds, by event type).
+        If `adaptive`, the budgets of `adaptive_events` are scaled: every `check_every` events `error_signal()` is called (True meaning events were dropped),
+        and the scale is multiplied by `speedup` if no events were dropped, or by `backoff` if they were."""
+        if adaptive and error_signal is None:
+            raise ValueError(
+                "Adaptive pacing needs an error signal to know when events are being dropped.")
+
+        self._budgets = dict(budgets)
+        self._adaptive = adaptive
+        self._adaptive_events = frozenset(adaptive_events)
+        self._error_signal = error_signal
+        self._check_every = check_every
+        self._speedup = speedup
+        self._backoff = backoff
+        self._min_scale = min_scale
+        self._max_scale = max_scale
+
+        self.reset()
+
+        # perf_counter times of the last event sent, and of when the next event may be sent
+        self._last_event = 0.0
+        self._deadline = 0.0
+
+    def reset(self) -> None:
+        """Forget everything adaptive pacing learned, going back to the budgets as they are."""
+        self._scale = 1.0
+        # the lowest scale known to be safe, raised every time events are dropped
+        self._floor = self._min_scale
+        self._events_since_check = 0
+
+    @property
+    def scale(self) -> float:
+        """The current multiplier applied to the budgets of adaptive events (always 1 when not adaptive)."""
+        return self._scale
+
+    def budget(self, event: str) -> float:
+        """The delay, in seconds, currently used for an event of type `event`."""
+        if event in self._adaptive_events:
+            return self._budgets[event] * self._scale
+        return self._budgets[event]
+
+    def set_budget(self, event: str, seconds: float) -> None:
+        """Change the delay budget of an event type."""
+        self._budgets[event] = seconds
+
+    def wait(self, event: str | None = None) -> None:
+        """Block until the next event may be sent: once the delay after the last event is over and, if an `event` type is given, at least its budget after the last event (ie. for a dropdown to open)."""
+        deadline = self._deadline
+        if event is not None:
+            deadline = max(deadline, self._last_event + self.budget(event))
+        sleep_until(deadline)
+
+    def sent(self, event: str) -> None:
+        """Mark that an event of type `event` was just sent, so the next event waits for its budget."""
+        now = time.perf_counter()
+        self._last_event = now
+        self._deadline = now + self.budget(event)
+
+        if self._adaptive and event in self._adaptive_events:
+            self._events_since_check += 1
+            if self._events_since_check >= self._check_every:
+                self._events_since_check = 0
+                self.report(self._error_signal())  # type: ignore
+
+    def report(self, dropped: bool) -> None:
+        """Adjust the adaptive scale given whether events were `dropped` since the last report. Does nothing unless adaptive."""
+        if not self._adaptive:
+            return
+        if dropped:
+            self._scale = min(self._max_scale, self._scale * self._backoff)
+            self._floor = max(self._floor, self._scale)
+        else:
+            self._scale = max(self._floor, self._scale * self._speedup)
@@ -2,10 +2,10 @@ from image_processing.palette.palette import RGB
 from interactions.cursor import Point
 from image_processing import Palette
 from interactions.universals import UniversalInteractionsHeader
-from dataclasses import dataclass
+from collections.abc import Callable
+from dataclasses import dataclass, field
 import interactions.constants as C
 from interactions.window import BoundingRect
-from pynput.keyboard import Key
 
 
 class ResizeNotFitWindowError(Exception):
@@ -20,6 +20,29 @@ class ResizeNotFitWindowError(Exception):
             height} without requiring scrollbar. Maximum possible size for canvas is {canvas_width}x{canvas_height}.""")
 
 
+class ToolbarVerificationError(Exception):
+    """Raised when the toolbar verification hook still disagrees with the expected toolbar state after an action was retried."""
+
+    def __init__(self, action: str, state: "ToolbarState"):
+        super().__init__(f"Toolbar action \"{action}\" did not take effect, even after retrying. Expected toolbar state: {state}")
+
+
+@dataclass
+class ToolbarState:
+    """What the toolbar is known to be set to, so actions that wouldn't change anything can be skipped. None means unknown (always the case right after Paint is started or attached to)."""
+    tool: str | None = None                 # "brush" or "bucket"
+    brush_type: str | None = None           # one of BRUSH_TYPES, the brush the brush button selects
+    stroke_size: int | None = None          # 1 to 4
+    color: tuple[int, int] | None = None    # (row, col) of the selected palette color
+    canvas_size: tuple[int, int] | None = None
+    # custom colors created so far, in the order they fill the custom color slots
+    custom_colors: list[RGB] = field(default_factory=list)
+
+
+# Called with the name of an action and the state the toolbar should be in afterwards, returns True if the toolbar really is in that state
+ToolbarVerifier = Callable[[str, ToolbarState], bool]
+
+
 @dataclass
 class _ColorSelected:
     """Represents the row, column selected in the color palette. ColorSelected is unaware of what actual color has been chosen. Default values are row 0 and column 0 (black color), because default color is black."""
@@ -50,40 +73,81 @@ class ToolbarInteractions(UniversalInteractionsHeader):
         # tracks what color is currently selected from the palette
         self._color_selected = _ColorSelected()
 
+        # everything known about the toolbar, and an optional hook to check it against the real toolbar. Both defined in InteractionsManager
+        self._toolbar_state: ToolbarState
+        self._toolbar_verifier: ToolbarVerifier | None
+
+    @property
+    def toolbar_state(self) -> ToolbarState:
+        """What the toolbar is known to currently be set to."""
+        return self._toolbar_state
+
+    def _verified(self, action: str, perform: Callable[[], None]) -> None:
+        """Perform an action that has already been applied to the toolbar state. If there is a verifier and it says the action didn't take effect, perform it once more before giving up."""
+        perform()
+        if self._toolbar_verifier is None or self._toolbar_verifier(action, self._toolbar_state):
+            return
+        perform()
+        if not self._toolbar_verifier(action, self._toolbar_state):
+            raise ToolbarVerificationError(action, self._toolbar_state)
+
     def set_color(self, row: int, col: int) -> None:
-        """Sets the current color from the palette, based on row/col."""
+        """Sets the current color from the palette, based on row/col. Does nothing if it is already selected."""
         self._color_selected = _ColorSelected(row, col)
+        if self._toolbar_state.color == (row, col):
+            return
+        self._toolbar_state.color = (row, col)
+
+        if self._toolbar_verifier is not None:
+            # the verifier will catch a missed click, so only click once
+            self._verified("set_color", lambda: self._click(self._color_selected.cursor_position(),
+                                                           pre="toolbar", post="toolbar"))
+            return
+
         self._click(self._color_selected.cursor_position(),
-                    pre_delay=C.TOOLBAR_LONG_DELAY, post_delay=C.TOOLBAR_LONG_DELAY)
+                    pre="toolbar", post="toolbar")
         # click it again, with all the delays, just to make sure it happens
         self._click(self._color_selected.cursor_position(),
-                    pre_delay=C.TOOLBAR_LONG_DELAY, post_delay=C.TOOLBAR_LONG_DELAY)
+                    pre="toolbar", post="toolbar")
 
     def set_palette(self, palette: Palette) -> None:
-        """Creates palette colors for the custom colors of a palette."""
-        for rgb in palette.palette[2]:
+        """Creates palette colors for the custom colors of a palette. Custom colors that already exist in the right slots (ie. from a previous image) aren't created again."""
+        custom_colors = list(palette.palette[2]) if len(
+            palette.palette) > 2 else []
+
+        num_existing = 0
+        for existing, rgb in zip(self._toolbar_state.custom_colors, custom_colors):
+            if existing != rgb:
+                break
+            num_existing += 1
+
+        # slots fill in order, so only colors after the ones that already match can be added
+        if num_existing < len(self._toolbar_state.custom_colors):
+            self._toolbar_state.custom_colors = self._toolbar_state.custom_colors[:num_existing]
+        for rgb in custom_colors[num_existing:]:
             self.create_palette_color(rgb)
 
     def create_palette_color(self, rgb: RGB) -> None:
         """Creates a palette color for a given RGB. Note that EDIT_COLORS_MENU constants are relative to center of screen."""
-        rect = self._window.window_rect()
+        rect = self._backend.window_rect()
         center_x = rect.width//2
         center_y = rect.height//2
 
-        self._click(C.EDIT_COLORS_BUTTON, post_delay=C.TOOLBAR_LONG_DELAY/2)
+        self._click(C.EDIT_COLORS_BUTTON, post="dialog")
         self._click(Point(center_x + C.EDIT_COLORS_MENU_RED[0],
                           center_y+C.EDIT_COLORS_MENU_RED[1]), num_clicks=2)
-        self._keyboard.type(str(rgb.red))
+        self._type(str(rgb.red))
         self._click(Point(center_x + C.EDIT_COLORS_MENU_GREEN[0],
                           center_y+C.EDIT_COLORS_MENU_GREEN[1]), num_clicks=2)
-        self._keyboard.type(str(rgb.green))
+        self._type(str(rgb.green))
         self._click(Point(center_x + C.EDIT_COLORS_MENU_BLUE[0],
                           center_y+C.EDIT_COLORS_MENU_BLUE[1]), num_clicks=2)
-        self._keyboard.type(str(rgb.blue))
+        self._type(str(rgb.blue))
         self._click(Point(center_x + C.EDIT_COLORS_MENU_ADD[0],
                           center_y+C.EDIT_COLORS_MENU_ADD[1]))
         self._click(Point(center_x + C.EDIT_COLORS_MENU_OK[0],
                           center_y+C.EDIT_COLORS_MENU_OK[1]))
+        self._toolbar_state.custom_colors.append(RGB(*rgb))
 
     def _ensure_resize_fits(self, width: int, height: int) -> bool:
         """Ensure resize is not greater than the size of the screen, or _window_rect. For this, we'll use constant paddings. 
@@ -95,30 +159,52 @@ class ToolbarInteractions(UniversalInteractionsHeader):
             height <= self._bounding_rect.height - \
             C.CANVAS_TOP_LEFT[1] - C.CANVAS_BOTTOM_PADDING
 
-    def resize(self, width: int, height: int) -> None:
-        """Resize the canvas to a given `width` and `height`. Both dimensions must be small enough so that no scrollbar effect appears."""
-        if not self._ensure_resize_fits(width, height):
+    def resize(self, width: int, height: int, fit_window: bool = True) -> None:
+        """Resize the canvas to a given `width` and `height`. Does nothing if the canvas is already that size.
+        Both dimensions must be small enough so that no scrollbar effect appears, unless not `fit_window` (ie. when drawing in tiles, see viewport.py)."""
+        if fit_window and not self._ensure_resize_fits(width, height):
             raise ResizeNotFitWindowError(width, height, self._bounding_rect)
+        if self._toolbar_state.canvas_size == (width, height):
+            return
+        self._toolbar_state.canvas_size = (width, height)
 
-        self._click(C.RESIZE_BUTTON, pre_delay=C.TOOLBAR_LONG_DELAY)
+        self._click(C.RESIZE_BUTTON, pre="toolbar")
         self._click(C.RESIZE_MENU_PIXELS)
         self._click(C.RESIZE_MENU_MAINTAIN_ASPECT)
         self._click(C.RESIZE_MENU_H, num_clicks=2)
-        self._keyboard.tap(Key.delete)
-        self._keyboard.type(str(width))
+        self._tap("delete")
+        self._type(str(width))
         self._click(C.RESIZE_MENU_V, num_clicks=2)
-        self._keyboard.tap(Key.delete)
-        self._keyboard.type(str(height))
-        self._keyboard.tap(Key.enter)
-        # self._click(C.RESIZE_MENU_OK, post_delay=C.TOOLBAR_DROPDOWN_DELAY)
+        self._tap("delete")
+        self._type(str(height))
+        self._tap("enter")
+        # self._click(C.RESIZE_MENU_OK, post="toolbar")
+
+    def clear_canvas(self) -> None:
+        """Clear the whole canvas to the second color (white, unless changed), by selecting all of it and deleting the selection. Much quicker than restarting Paint to draw another image.
+        Selecting switches Paint to the select tool, so the tool is forgotten and the next click_bucket or set_brush selects it again."""
+        self._pacer.wait("toolbar")
+        self._backend.hotkey("ctrl", "a")
+        self._pacer.sent("key")
+        self._pacer.wait()
+        self._backend.tap("delete")
+        # give Paint the time to repaint the canvas before anything else
+        self._pacer.sent("toolbar")
+        self._toolbar_state.tool = None
 
     def click_bucket(self) -> None:
-        """Click the bucket button."""
-        self._click(C.BUCKET_BUTTON)
+        """Click the bucket button. Does nothing if the bucket is already selected."""
+        if self._toolbar_state.tool == "bucket":
+            return
+        self._toolbar_state.tool = "bucket"
+        self._verified("click_bucket", lambda: self._click(C.BUCKET_BUTTON))
 
     def click_brush(self) -> None:
-        """Click the brush button."""
-        self._click(C.BRUSH_BUTTON)
+        """Click the brush button. Does nothing if the brush is already selected."""
+        if self._toolbar_state.tool == "brush":
+            return
+        self._toolbar_state.tool = "brush"
+        self._verified("click_brush", lambda: self._click(C.BRUSH_BUTTON))
 
     def click_color_one(self) -> None:
         """Click the first color."""
@@ -140,14 +226,23 @@ class ToolbarInteractions(UniversalInteractionsHeader):
         `marker`,
         `natural_pencil`, or
         `watercolor_brush`.
+        Does nothing if that brush is already selected, and only clicks the brush button (rather than going through the dropdown) if the brush type is already right but another tool is selected.
         """
         if brush_type not in C.BRUSH_TYPES.keys():
             raise ValueError(
                 f"Brush type {brush_type} is not a valid brush type.")
 
-        self._click(C.BRUSH_TYPE_BUTTON, pre_delay=C.TOOLBAR_LONG_DELAY)
-        self._click(C.BRUSH_TYPES[brush_type],
-                    pre_delay=C.TOOLBAR_LONG_DELAY)
+        if self._toolbar_state.brush_type == brush_type:
+            self.click_brush()
+            return
+        self._toolbar_state.tool = "brush"
+        self._toolbar_state.brush_type = brush_type
+
+        def choose_brush():
+            self._click(C.BRUSH_TYPE_BUTTON, pre="toolbar")
+            self._click(C.BRUSH_TYPES[brush_type],
+                        pre="toolbar")
+        self._verified("set_brush", choose_brush)
 
     def set_stroke_size(self, size_number: int) -> None:
         """Set stroke size to size `size_number`, where `size_number` is the size between 1 and 4 in the dropdown menu when clicking the Size button."""
@@ -155,6 +250,12 @@ class ToolbarInteractions(UniversalInteractionsHeader):
             raise ValueError(
                 f"Stroke size {size_number} is not a valid. Must be between 1 and 4 (inclusive).")
 
-        self._click(C.STROKE_SIZE_BUTTON, pre_delay=C.TOOLBAR_LONG_DELAY)
-        self._click(C.STROKE_SIZES[str(size_number)],
-                    pre_delay=C.TOOLBAR_LONG_DELAY)
+        if self._toolbar_state.stroke_size == size_number:
+            return
+        self._toolbar_state.stroke_size = size_number
+
+        def choose_size():
+            self._click(C.STROKE_SIZE_BUTTON, pre="toolbar")
+            self._click(C.STROKE_SIZES[str(size_number)],
+                        pre="toolbar")
+        self._verified("set_stroke_size", choose_size)
@@ -1,8 +1,8 @@
 from interactions.window import PaintWindow, BoundingRect
 from interactions.cursor import Cursor, Point
-from pynput import keyboard
+from interactions.backends import InputBackend
+from interactions.pacing import Pacer
 import interactions.constants as C
-import time
 
 
 class UniversalInteractionsHeader:
@@ -12,29 +12,40 @@ class UniversalInteractionsHeader:
     def __init__(self) -> None:
         """Declares universally used properties and methods for the Toolbar and Canvas interaction subclasses, but are not defined until InteractionManager is created. 
             View InteractionsManager in manager.py for full explanation. The properties here are to be 'filled in' in manager.py's Manager class."""
-        self._window: PaintWindow
+        self._window: PaintWindow | None
         self._bounding_rect: BoundingRect
 
-        # "forward type define" the pynput keyboard and mouse controller for type annotation ease
+        # "forward type define" the input backend (see backends.py) and the cursor wrapping it for type annotation ease
+        self._backend: InputBackend
         self._mouse: Cursor
-        self._keyboard: keyboard.Controller
 
-    def _click(self, point: Point | tuple[int, int], *, num_clicks: int = 1, pre_delay: int | float = 0, post_delay: int | float = 0.005) -> None:
+        # all timing between input events goes through the pacer, see pacing.py
+        self._pacer: Pacer
+
+    def _click(self, point: Point | tuple[int, int], *, num_clicks: int = 1, pre: str | None = None, post: str = "click") -> None:
         """Move a mouse to a Point position, and left-click once. If tuple of length 2 is passed in, automatically convert it into a Point object. 
-        Then, sleep for at least `post_delay` seconds, depending on how slow the system may be.
-        Optionally also specify `pre_delay` in seconds, to delay a certain amount of time before clicking.
+        Then, the next event waits for the budget of the `post` event type (see EVENT_BUDGETS in constants.py), depending on how slow the system may be.
+        Optionally also specify a `pre` event type, to wait at least its budget since the last event before clicking.
         Optinally pass `num_clicks` to click more than once."""
-        # execute pre-delay
-        time.sleep(pre_delay)
-
         if type(point) is not Point:
             point = Point(*point)
 
+        self._pacer.wait(pre)
         self._move(point)
         self._mouse.click(num_clicks)
-
-        # execute post-delay
-        time.sleep(post_delay)
+        self._pacer.sent(post)
+
+    def _type(self, text: str) -> None:
+        """Type out `text` on the keyboard, paced like any other event."""
+        self._pacer.wait()
+        self._backend.type(text)
+        self._pacer.sent("key")
+
+    def _tap(self, key: str) -> None:
+        """Press and release a single key on the keyboard, named `key` (ie. "enter", see backends.py), paced like any other event."""
+        self._pacer.wait()
+        self._backend.tap(key)
+        self._pacer.sent("key")
 
     def _move(self, point: Point) -> None:
         """Move a mouse to a Point position. See Cursor.position in cursor.py."""
@@ -0,0 +1,105 @@
+"""
+Viewports onto canvases larger than the window, which Paint shows with scrollbars. Only a `size` part of the canvas is visible, starting at the viewport's `origin`.
+
+Scrolling moves the origin in whole notches of the mouse wheel, SCROLL_STEP_PX pixels each, and stops at either edge of the canvas (an origin of 0, or origin + size == canvas size).
+So the origins that can be reached exactly are the multiples of the scroll step, and the far edge of the canvas. A canvas pixel at (x, y) is then on screen at CANVAS_TOP_LEFT + (x, y) - origin.
+
+    PaintViewport       scrolls the canvas of the real Paint window, through the interactions manager
+    SimulatedViewport   only keeps track of where it would be scrolled, and can draw strokes onto an array of the canvas. For planning and testing headless, see instructions/tiles.py
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from interactions.canvas import CanvasInteractions
+import interactions.constants as C
+
+
+def max_origin(canvas_size: tuple[int, int], view_size: tuple[int, int]) -> tuple[int, int]:
+    """The furthest (x, y) origin a viewport of `view_size` can be scrolled to on a canvas of `canvas_size`."""
+    return (max(canvas_size[0] - view_size[0], 0), max(canvas_size[1] - view_size[1], 0))
+
+
+class Viewport(ABC):
+    def __init__(self, canvas_size: tuple[int, int], view_size: tuple[int, int], scroll_step: int = C.SCROLL_STEP_PX) -> None:
+        """A viewport of `view_size` onto a canvas of `canvas_size` (both (width, height)), scrolled to the top left."""
+        self.canvas_size = canvas_size
+        self.size = view_size
+        self.scroll_step = scroll_step
+        self._origin = (0, 0)
+        self.num_scrolls = 0
+
+    @property
+    def origin(self) -> tuple[int, int]:
+        """The (x, y) of the canvas pixel at the top left of the viewport."""
+        return self._origin
+
+    def scroll_to(self, origin: tuple[int, int]) -> None:
+        """Scroll until the viewport is at `origin`, which must be reachable (a multiple of the scroll step, or the furthest origin, on each axis)."""
+        furthest = max_origin(self.canvas_size, self.size)
+        for axis in (0, 1):
+            for notches in self._notches_to(self._origin[axis], origin[axis], furthest[axis]):
+                self._scroll_axis(axis, notches, furthest[axis])
+
+    def _notches_to(self, current: int, target: int, furthest: int) -> list[int]:
+        """The scrolls (in notches) that get from the origin `current` to `target` on one axis."""
+        if current == target:
+            return []
+        if (target - current) % self.scroll_step == 0:
+            return [(target - current) // self.scroll_step]
+        if target == furthest:
+            # overshoot, scrolling stops at the far edge anyway
+            return [-(-(target - current) // self.scroll_step)]
+        # off the grid of notches (at the far edge), go back to the start first
+        back = -(-current // self.scroll_step)
+        return [-back, target // self.scroll_step]
+
+    def _scroll_axis(self, axis: int, notches: int, furthest: int) -> None:
+        """Scroll `notches` along `axis` (0 for x, 1 for y), and keep track of where that stops."""
+        if not notches:
+            return
+        self._scroll((notches, 0) if axis == 0 else (0, notches))
+        origin = list(self._origin)
+        origin[axis] = min(max(origin[axis] + notches *
+                           self.scroll_step, 0), furthest)
+        self._origin = (origin[0], origin[1])
+        self.num_scrolls += 1
+
+    @abstractmethod
+    def _scroll(self, notches: tuple[int, int]) -> None:
+        """Actually scroll (x, y) `notches`."""
+
+
+class PaintViewport(Viewport):
+    def __init__(self, interactions: CanvasInteractions, canvas_size: tuple[int, int], scroll_step: int = C.SCROLL_STEP_PX) -> None:
+        """The viewport of the Paint window that `interactions` (ie. the interactions manager) sends events to, onto its canvas of `canvas_size`."""
+        super().__init__(canvas_size, interactions.visible_canvas_size(), scroll_step)
+        self._interactions = interactions
+
+    def _scroll(self, notches: tuple[int, int]) -> None:
+        self._interactions.canvas_scroll(*notches)
+
+
+class SimulatedViewport(Viewport):
+    def __init__(self, canvas_size: tuple[int, int], view_size: tuple[int, int], scroll_step: int = C.SCROLL_STEP_PX, fill: int = 0) -> None:
+        """A viewport that scrolls nothing, onto a simulated canvas (an array of palette indices, see `canvas`) filled with `fill`."""
+        super().__init__(canvas_size, view_size, scroll_step)
+        self.canvas = np.full(
+            (canvas_size[1], canvas_size[0]), fill, dtype=np.uint8)
+
+    def _scroll(self, notches: tuple[int, int]) -> None:
+        pass
+
+    def draw(self, strokes: np.ndarray, color: int) -> None:
+        """Draw (x, y, length) `strokes` (see parse_instructions), relative to the viewport, onto the simulated canvas with the palette index `color`.
+        Every stroke covers exactly the `length` pixels of its run."""
+        view_width, view_height = self.size
+        x, y, length = strokes[:, 0], strokes[:, 1], strokes[:, 2]
+        if len(strokes) and ((x < 0).any() or (y < 0).any() or (x + length > view_width).any() or (y >= view_height).any()):
+            raise ValueError("Strokes drawn outside of the viewport.")
+
+        origin_x, origin_y = self._origin
+        for stroke_x, stroke_y, stroke_length in strokes.tolist():
+            self.canvas[origin_y + stroke_y, origin_x +
+                        stroke_x:origin_x + stroke_x + stroke_length] = color
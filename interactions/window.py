@@ -1,11 +1,15 @@
 import subprocess
 import time
 from dotenv import dotenv_values
-import win32gui
-import win32con
-import win32api
 from collections import namedtuple
 import ctypes
+# only needed to actually find and control the Paint window, everything else (ie. the recording input backend) works without them
+try:
+    import win32gui
+    import win32con
+    import win32api
+except ImportError:
+    pass
 
 BoundingRect = namedtuple("BoundingRect", ["x", "y", "width", "height"])
 
@@ -103,6 +107,12 @@ class PaintWindow:
         time.sleep(PaintWindow.ACTION_DELAY)
         self._paint_window_hwnd = self._get_window()
 
+    def attach_window(self) -> None:
+        """Use the ms-paint window that is already open rather than starting a new one, ie. to resume an interrupted drawing on its canvas. Brings the window to the front."""
+        self._paint_window_hwnd = self._get_window()
+        self.modify()
+        time.sleep(PaintWindow.ACTION_DELAY)
+
     def modify(self) -> None:
         """Maximizes and focuses the Paint window."""
         self._check_window_exists()
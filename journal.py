@@ -0,0 +1,115 @@
+"""
+A progress journal for drawing, so that an interrupted drawing (ESC, a crash, a closed terminal) can be resumed instead of restarted from scratch.
+
+The journal is a text file that is only ever appended to. Each line records how far one color has been drawn:
+    <color key> <strokes drawn> <palette hash> <instruction bundle hash>
+ie. "2,3 1520 9f1c...e0 41ab...7d". The last line for a color is its progress, and the hashes make sure the progress belongs to the same palette and instructions being resumed.
+The first line is a header, "bucket_first true" or "bucket_first false", whether the drawing starts by bucketing its first color, so a drawing on top of an existing canvas (ie. a repair) is never bucketed over when resumed.
+
+Progress is buffered in memory and written at most every `flush_interval` seconds (and whenever flush is called), so journaling costs almost nothing per stroke.
+At most `flush_interval` seconds of strokes are redrawn after a resume, which is harmless since they're drawn with the same color in the same place.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class JournalMismatchError(Exception):
+    """Raised when resuming from a journal that was written for a different palette or set of instructions."""
+
+    def __init__(self, what: str, journal_path: Path):
+        super().__init__(f"The {what} being resumed does not match the {
+            what} recorded in the journal at \"{journal_path}\". Start a new drawing instead of resuming.")
+
+
+# first word of the header line, see the file docstring
+BUCKET_FIRST_HEADER = "bucket_first"
+
+
+class DrawingJournal:
+    def __init__(self, path: Path, palette_hash: str, bundle_hash: str | None, flush_interval: float = 2.0, progress: dict[str, int] | None = None,
+                 bucket_first: bool = True) -> None:
+        """Journal of drawing progress, appending to the file at `path`.
+        If `bundle_hash` isn't known yet (ie. the instructions are still being computed), nothing is written until set_bundle_hash is called.
+        `progress` is any progress already made (see DrawingJournal.read), so that resumed drawings keep counting from where they were.
+        `bucket_first` is whether the drawing buckets its first color (see _BasicRedrawer.redraw_stream), written to the header of a new journal."""
+        self._path = path
+        self._palette_hash = palette_hash
+        self._bundle_hash = bundle_hash
+        self._flush_interval = flush_interval
+
+        self._progress: dict[str, int] = dict(progress or {})
+        self._unflushed: set[str] = set()
+        self._last_flush = time.monotonic()
+
+        # flushes can come from the drawer, the instruction producer and the ESC failsafe
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a")
+        if not self._file.tell():
+            self._file.write(f"{BUCKET_FIRST_HEADER} {str(bucket_first).lower()}\n")
+            self._file.flush()
+
+    @property
+    def progress(self) -> dict[str, int]:
+        """Number of strokes drawn for every color recorded so far."""
+        return self._progress
+
+    def record(self, key: str, strokes_drawn: int) -> None:
+        """Record that `strokes_drawn` strokes of the color `key` have been drawn. Only writes to the file if the flush interval has passed."""
+        self._progress[key] = strokes_drawn
+        self._unflushed.add(key)
+        if time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def set_bundle_hash(self, bundle_hash: str) -> None:
+        """Set the instruction bundle hash once it is known, and write anything that was waiting on it."""
+        self._bundle_hash = bundle_hash
+        self.flush()
+
+    def flush(self) -> None:
+        """Write all progress recorded since the last flush, and make sure it has reached the disk."""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if self._bundle_hash is None or not self._unflushed or self._file.closed:
+                return
+
+            unflushed, self._unflushed = self._unflushed, set()
+            self._file.write("".join(f"{key} {self._progress[key]} {self._palette_hash} {self._bundle_hash}\n"
+                                     for key in sorted(unflushed)))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Flush and close the journal."""
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def read(path: Path, palette_hash: str, bundle_hash: str) -> dict[str, int]:
+        """Read the progress of every color from the journal at `path`. Raises JournalMismatchError if the journal was for a different palette or instruction bundle."""
+        progress = {}
+        with open(path) as f:
+            for line in f:
+                if line.startswith(BUCKET_FIRST_HEADER):
+                    continue
+                key, strokes_drawn, line_palette_hash, line_bundle_hash = line.split()
+                if line_palette_hash != palette_hash:
+                    raise JournalMismatchError("palette", path)
+                if line_bundle_hash != bundle_hash:
+                    raise JournalMismatchError("instructions", path)
+                progress[key] = int(strokes_drawn)
+        return progress
+
+    @staticmethod
+    def read_bucket_first(path: Path) -> bool:
+        """Whether the drawing journaled at `path` buckets its first color. True for journals written before the header existed, which were all full drawings."""
+        with open(path) as f:
+            words = f.readline().split()
+        if len(words) == 2 and words[0] == BUCKET_FIRST_HEADER:
+            return words[1] == "true"
+        return True
@@ -9,14 +9,23 @@ from redrawer import Redrawer
 # TODO:
 # Eventually add an auto-save feature
 
-INPUT_PATH = dotenv_values("settings.env")["INPUT_PATH"] or "not set"
+_settings = dotenv_values("settings.env")
+INPUT_PATH = _settings["INPUT_PATH"] or "not set"
+RESUME = _settings.get("RESUME") == "true"
+REPAIR_PATH = _settings.get("REPAIR_PATH")
 
 
 def main():
-    """DURING ANY POINT OF THE PROGRAM YOU WISH TO HARD STOP (non gracefully!), PRESS ESC KEY."""
+    """DURING ANY POINT OF THE PROGRAM YOU WISH TO HARD STOP (non gracefully!), PRESS ESC KEY.
+    The drawing can be continued later by setting RESUME=true in settings.env, as long as the Paint window is left open.
+    A drawing saved from that window can be touched up by setting REPAIR_PATH to where it was saved."""
+    rd: Redrawer | None = None
+
     def failsafe(key):
         if key == keyboard.Key.esc:
             PROGRESS_LOG.log("ESC PRESSED, EXITING PROGRAM.")
+            if rd is not None:
+                rd.checkpoint()
             os._exit(1)
 
     listener = keyboard.Listener(on_press=failsafe)
@@ -28,7 +37,12 @@ def main():
     image_path = Path(INPUT_PATH)
 
     rd = Redrawer(image_path)
-    rd.redraw()
+    if RESUME:
+        rd.resume()
+    elif REPAIR_PATH:
+        rd.repair(Path(REPAIR_PATH))
+    else:
+        rd.redraw()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,503 @@
+"""
+A plan server, so images can be planned on one (fast, any OS) machine and drawn on another, which only has to fetch the plan and draw it.
+
+The server plans images like batch.py, on a pool of worker processes started once and kept warm: everything planning needs is imported and run once when a worker starts rather than on its first job,
+and every worker keeps the palettes of the last few images it planned, so the same image planned again at the same size skips creating its palette.
+That only helps when the job lands on the worker that planned the image before: jobs go to whichever worker is free, and workers don't share their palettes.
+At most `--max-jobs` jobs are queued or running at once, a job submitted past that is turned away with a 503 and a Retry-After header, so a busy server never piles up work.
+Only the last `--keep-jobs` finished jobs are kept, older ones (and their directories) are dropped as new ones finish, so a long running server doesn't fill its disk. Fetch a plan soon after it's done.
+
+HTTP API (JSON unless said otherwise):
+    POST /jobs?name=<image name>[&size=WIDTHxHEIGHT][&time_budget=SECONDS]     the image file as the body. 202 with the job, or 503 when too many jobs are in flight
+    GET  /jobs/<id>                                                             the job: its state (queued, running, done or failed), timings and error
+    GET  /jobs/<id>/bundle                                                      the plan of a done job as a zip (409 until it's done), see batch.py for its files, plus metadata.json
+    GET  /status                                                                jobs in flight, done and failed, and the mean seconds spent in every stage
+Instructions are sent as dbm.dumb (see make_portable), since the drawing machine runs Windows, where Python has no other DBM implementation to open them with.
+
+Usage:
+    python plan_server.py serve [--host HOST] [--port PORT] [--workers N] [--max-jobs N] [--keep-jobs N] [--output DIR]
+    python plan_server.py fetch [image] [plan directory] [--server URL] [--size WIDTHxHEIGHT] [--time-budget SECONDS]
+    python plan_server.py draw [plan directory]
+Defaults for everything are taken from settings.env.
+"""
+
+import argparse
+import concurrent.futures
+import dbm
+import hashlib
+import io
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+import zipfile
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+from dotenv import dotenv_values
+from PIL import Image
+
+from batch import IMAGE_SUFFIXES, STAGES, plan_image
+from image_processing import Palette, create_palette, create_processed_image
+from image_processing.image.resize import set_target_size, target_size, parse_size
+from instructions import bundle_hash, make_portable
+from instructions.cost_model import CostModel
+from instructions.from_processed_image import INSTRUCTION_TYPE, PORTABLE_FORMAT
+from logger import PROGRESS_LOG
+
+
+_settings = dotenv_values("settings.env")
+PLAN_SERVER_HOST = _settings.get("PLAN_SERVER_HOST") or "127.0.0.1"
+PLAN_SERVER_PORT = int(_settings.get("PLAN_SERVER_PORT") or 8765)
+PLAN_SERVER_MAX_JOBS = int(_settings.get("PLAN_SERVER_MAX_JOBS") or 16)
+PLAN_SERVER_KEEP_JOBS = int(_settings.get("PLAN_SERVER_KEEP_JOBS") or 64)
+PLAN_SERVER_OUTPUT_DIR = _settings.get("PLAN_SERVER_OUTPUT_DIR") or "./output/plan_server"
+PLAN_SERVER_URL = _settings.get("PLAN_SERVER_URL") or f"http://{PLAN_SERVER_HOST}:{PLAN_SERVER_PORT}"
+_PRINT_REQUESTS = _settings.get("PRINT_ALL_PROGRESS") == "true"
+
+# palettes every worker keeps, see _cached_palette
+PALETTE_CACHE_SIZE = 8
+# seconds a client is told to wait before submitting again when the server is full
+RETRY_AFTER = 2
+
+
+class PlanServerError(Exception):
+    """Raised by the fetch client when the plan server turns a job away or fails to plan it."""
+
+    def __init__(self, what: str, server_url: str):
+        super().__init__(f"The plan server at {server_url} {what}.")
+
+
+@dataclass
+class PlanJob:
+    """A job of the plan server, from when it is submitted to when its plan is ready (or failed)."""
+    id: str
+    name: str
+    size: tuple[int, int]
+    time_budget: float | None
+    image_hash: str = ""        # SHA-1 of the image file, what palettes are cached by
+    state: str = "queued"       # queued, running, done or failed
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    # seconds spent in every stage of batch.plan_image, plus "queued" and "total"
+    timings: dict[str, float] = field(default_factory=dict)
+    error: str | None = None
+
+
+# ----- worker processes -----
+
+# the palettes a worker created last, by image hash and target size. Only ever used by the worker process that owns it
+_palettes: "OrderedDict[tuple[str, tuple[int, int]], Palette]" = OrderedDict()
+
+
+def _init_server_worker() -> None:
+    """Process pool initializer. Plans a tiny image, so everything planning needs is imported and warmed up before the first real job comes in."""
+    image_array = np.random.default_rng(0).integers(
+        0, 256, (8, 8, 3), dtype=np.uint8)
+    create_processed_image(image_array, create_palette(image_array))
+
+
+def _warmed() -> None:
+    """Does nothing, submitted once per worker process to get them started (and _init_server_worker run)."""
+
+
+def _cached_palette(key: tuple[str, tuple[int, int]], palette: Palette | None = None) -> Palette | None:
+    """Get the cached palette of `key`, or cache `palette` as it if one is given. The least recently used palettes are dropped past PALETTE_CACHE_SIZE."""
+    if palette is None:
+        if key in _palettes:
+            _palettes.move_to_end(key)
+        return _palettes.get(key)
+    _palettes[key] = palette
+    while len(_palettes) > PALETTE_CACHE_SIZE:
+        _palettes.popitem(last=False)
+    return palette
+
+
+def _run_job(image_path: Path, output_dir: Path, size: tuple[int, int], time_budget: float | None, model: CostModel | None,
+             palette_key: tuple[str, tuple[int, int]]) -> dict[str, float]:
+    """Worker process side of a job, plan the image at `image_path` into `output_dir` (see batch.plan_image), with the palette cached as `palette_key` if this worker has it.
+    Returns the seconds spent in each stage."""
+    set_target_size(size)
+    timings = plan_image(image_path, output_dir, time_budget,
+                         model, palette=_cached_palette(palette_key))
+    _cached_palette(palette_key, Palette.load(output_dir / "palette.json"))
+    make_portable(output_dir / "instructions")
+    return timings
+
+
+# ----- server -----
+
+class PlanServer:
+    def __init__(self, output_dir: Path, workers: int | None = None, max_jobs: int = PLAN_SERVER_MAX_JOBS, keep_jobs: int = PLAN_SERVER_KEEP_JOBS) -> None:
+        """Plans jobs on a pool of `workers` processes (default: number of CPUs), with at most `max_jobs` queued or running at once. Every job is planned into its own directory in `output_dir`,
+        which is removed (and the job forgotten) once `keep_jobs` jobs finished after it."""
+        self._output_dir = output_dir
+        self._max_jobs = max_jobs
+        self._keep_jobs = keep_jobs
+        workers = workers or os.cpu_count() or 1
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_server_worker)
+        # the pool only starts a process when a task is submitted with none idle, so start (and warm) them all now rather than on the first jobs
+        concurrent.futures.wait([self._executor.submit(_warmed) for _ in range(workers)])
+        # calibrated once, rather than for every job
+        self._model = CostModel.calibrated()
+
+        self._jobs: dict[str, PlanJob] = {}
+        # ids of finished jobs, oldest first, see _forget_old_jobs
+        self._finished: "deque[str]" = deque()
+        self._in_flight = 0
+        self._num_done = 0
+        self._num_failed = 0
+        self._stage_totals = {stage: 0.0 for stage in ("queued", *STAGES, "total")}
+        # jobs are submitted from the request handler threads, and finished from the dispatcher threads
+        self._lock = threading.Lock()
+
+        # one dispatcher thread per worker process, each hands the next queued job to the pool only once its last one is done,
+        # so a job is only ever running while a worker is actually planning it
+        self._queue: "queue.Queue[PlanJob | None]" = queue.Queue()
+        self._dispatchers = [threading.Thread(target=self._dispatch, daemon=True)
+                             for _ in range(workers)]
+        for dispatcher in self._dispatchers:
+            dispatcher.start()
+
+    def job_dir(self, job_id: str) -> Path:
+        """The directory job `job_id` is planned into."""
+        return self._output_dir / job_id
+
+    def submit(self, image: bytes, name: str, size: tuple[int, int] | None = None, time_budget: float | None = None) -> PlanJob | None:
+        """Queue planning the `image` file named `name` (for its suffix), resized to fit `size` (default: TARGET_SIZE or the monitor) and planned to be drawn in `time_budget` seconds.
+        Returns the job, or None if too many jobs are in flight already."""
+        suffix = Path(name).suffix.lower()
+        if suffix not in IMAGE_SUFFIXES:
+            raise ValueError(f"Images must be one of {", ".join(IMAGE_SUFFIXES)}, not \"{name}\".")
+        if size is None:
+            # reads the monitors when TARGET_SIZE isn't set, which fails on a headless server
+            try:
+                size = target_size()
+            except Exception as e:
+                raise ValueError(f"No size was given, and the server can't size images itself ({e!r}), pass size=WIDTHxHEIGHT.") from e
+
+        # hashed here rather than in the worker, which would have to read the image back first
+        image_hash = hashlib.sha1(image).hexdigest()
+
+        with self._lock:
+            if self._in_flight >= self._max_jobs:
+                return None
+            self._in_flight += 1
+            job = PlanJob(uuid.uuid4().hex, name, size, time_budget, image_hash)
+            self._jobs[job.id] = job
+
+        job_dir = self.job_dir(job.id)
+        try:
+            job_dir.mkdir(parents=True, exist_ok=True)
+            image_path = job_dir / f"source{suffix}"
+            image_path.write_bytes(image)
+            self._queue.put(job)
+        except BaseException:
+            # the job never got queued, so nothing else will ever give its slot back
+            with self._lock:
+                self._in_flight -= 1
+                del self._jobs[job.id]
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        PROGRESS_LOG.log(f"QUEUED JOB {job.id} ({name})")
+        return job
+
+    def _dispatch(self) -> None:
+        """Dispatcher thread, plans queued jobs one at a time until a None is queued."""
+        while (job := self._queue.get()) is not None:
+            job.started = time.time()
+            job.state = "running"
+            job_dir = self.job_dir(job.id)
+            try:
+                job.timings = self._executor.submit(_run_job, next(job_dir.glob("source.*")), job_dir, job.size, job.time_budget,
+                                                    self._model if job.time_budget is not None else None, (job.image_hash, job.size)).result()
+                job.finished = time.time()
+                job.timings["queued"] = job.started - job.submitted
+                job.timings["total"] = job.finished - job.submitted
+                job.state = "done"
+                self._write_metadata(job)
+            except Exception as e:
+                job.finished = time.time()
+                job.error = repr(e)
+                job.state = "failed"
+
+            with self._lock:
+                self._in_flight -= 1
+                if job.state == "done":
+                    self._num_done += 1
+                    for stage, seconds in job.timings.items():
+                        self._stage_totals[stage] = self._stage_totals.get(
+                            stage, 0) + seconds
+                else:
+                    self._num_failed += 1
+                self._finished.append(job.id)
+                forgotten = self._forget_old_jobs()
+            for job_id in forgotten:
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+            PROGRESS_LOG.log(f"JOB {job.id} {job.state.upper()} IN {
+                             job.finished - job.submitted:.2f}s{f": {job.error}" if job.error else ""}")
+
+    def _forget_old_jobs(self) -> list[str]:
+        """Forget the oldest finished jobs past `keep_jobs`, returning their ids so their directories can be removed outside of the lock. Must hold the lock."""
+        forgotten = []
+        while len(self._finished) > self._keep_jobs:
+            job_id = self._finished.popleft()
+            del self._jobs[job_id]
+            forgotten.append(job_id)
+        return forgotten
+
+    def _write_metadata(self, job: PlanJob) -> None:
+        """Write metadata.json of a finished `job`, with everything a drawing host needs to check the plan it fetched."""
+        job_dir = self.job_dir(job.id)
+        metadata = asdict(job)
+        metadata.update(instruction_type=INSTRUCTION_TYPE,
+                        instructions_format=dbm.whichdb(
+                            str(job_dir / "instructions")),
+                        palette_hash=Palette.load(
+                            job_dir / "palette.json").content_hash,
+                        bundle_hash=bundle_hash(job_dir / "instructions"))
+        with open(job_dir / "metadata.json", "w") as f:
+            json.dump(metadata, f, indent=4)
+
+    def job(self, job_id: str) -> PlanJob | None:
+        """The job `job_id`, if there is one."""
+        return self._jobs.get(job_id)
+
+    def bundle(self, job_id: str) -> bytes:
+        """A zip of everything planned for the done job `job_id`, other than its source image."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as bundle:
+            for path in sorted(self.job_dir(job_id).iterdir()):
+                if path.is_file() and path.stem != "source":
+                    bundle.write(path, path.name)
+        return buffer.getvalue()
+
+    def status(self) -> dict:
+        """Jobs in flight, done and failed, and the mean seconds per stage of done jobs."""
+        with self._lock:
+            return {"in_flight": self._in_flight, "max_jobs": self._max_jobs,
+                    "done": self._num_done, "failed": self._num_failed,
+                    "mean_seconds": {stage: seconds / self._num_done if self._num_done else 0
+                                     for stage, seconds in self._stage_totals.items()}}
+
+    def shutdown(self) -> None:
+        """Wait for every job in flight, then stop the workers."""
+        for _ in self._dispatchers:
+            self._queue.put(None)
+        for dispatcher in self._dispatchers:
+            dispatcher.join()
+        self._executor.shutdown()
+
+
+class _PlanRequestHandler(BaseHTTPRequestHandler):
+    """Serves the HTTP API of the PlanServer in `server.plan_server`, see the module docstring."""
+    server: "_PlanHTTPServer"
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, content, headers: dict[str, str] | None = None) -> None:
+        self._send(status, json.dumps(content).encode(), headers=headers)
+
+    def do_POST(self) -> None:
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/jobs":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        query = urllib.parse.parse_qs(url.query)
+        image = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            name = query.get("name", ["image.png"])[0]
+            size = parse_size(query["size"][0]) if "size" in query else None
+            time_budget = float(
+                query["time_budget"][0]) if "time_budget" in query else None
+            job = self.server.plan_server.submit(image, name, size, time_budget)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        if job is None:
+            self._send_json(503, {"error": "too many jobs in flight, try again later"},
+                            headers={"Retry-After": str(RETRY_AFTER)})
+            return
+        self._send_json(202, asdict(job))
+
+    def do_GET(self) -> None:
+        parts = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+        if parts == ["status"]:
+            self._send_json(200, self.server.plan_server.status())
+            return
+        if len(parts) not in (2, 3) or parts[0] != "jobs" or (len(parts) == 3 and parts[2] != "bundle"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        job = self.server.plan_server.job(parts[1])
+        if job is None:
+            self._send_json(404, {"error": "no such job"})
+        elif len(parts) == 2:
+            self._send_json(200, asdict(job))
+        elif job.state != "done":
+            self._send_json(409, {"error": f"job is {job.state}"})
+        else:
+            self._send(200, self.server.plan_server.bundle(job.id), "application/zip")
+
+    def log_message(self, format: str, *args) -> None:
+        if _PRINT_REQUESTS:
+            PROGRESS_LOG.log(f"{self.address_string()} {format % args}")
+
+
+class _PlanHTTPServer(ThreadingHTTPServer):
+    def __init__(self, address: tuple[str, int], plan_server: PlanServer) -> None:
+        super().__init__(address, _PlanRequestHandler)
+        self.plan_server = plan_server
+
+
+def serve(host: str, port: int, output_dir: Path, workers: int | None = None, max_jobs: int = PLAN_SERVER_MAX_JOBS, keep_jobs: int = PLAN_SERVER_KEEP_JOBS) -> None:
+    """Run a plan server on `host`:`port` until interrupted, see PlanServer."""
+    plan_server = PlanServer(output_dir, workers, max_jobs, keep_jobs)
+    with _PlanHTTPServer((host, port), plan_server) as http_server:
+        PROGRESS_LOG.log(f"PLAN SERVER LISTENING ON http://{host}:{port}")
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    plan_server.shutdown()
+
+
+# ----- drawing host -----
+
+def fetch_plan(server_url: str, image_path: Path, plan_dir: Path, size: tuple[int, int] | None = None, time_budget: float | None = None, poll_interval: float = 0.5) -> dict:
+    """Have the plan server at `server_url` plan the image at `image_path`, wait for it, and extract the plan into `plan_dir`.
+    Submitting is retried for as long as the server is full. Returns the plan's metadata (see metadata.json)."""
+    query = {"name": image_path.name}
+    if size is not None:
+        query["size"] = f"{size[0]}x{size[1]}"
+    if time_budget is not None:
+        query["time_budget"] = str(time_budget)
+    request = urllib.request.Request(f"{server_url}/jobs?{urllib.parse.urlencode(query)}",
+                                     data=image_path.read_bytes(), method="POST")
+
+    while True:
+        try:
+            with urllib.request.urlopen(request) as response:
+                job = json.load(response)
+            break
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise PlanServerError(f"refused the job ({e.code}: {e.read().decode()})", server_url)
+            time.sleep(float(e.headers.get("Retry-After", RETRY_AFTER)))
+
+    while job["state"] in ("queued", "running"):
+        time.sleep(poll_interval)
+        with urllib.request.urlopen(f"{server_url}/jobs/{job["id"]}") as response:
+            job = json.load(response)
+    if job["state"] != "done":
+        raise PlanServerError(f"failed to plan \"{image_path}\" ({job["error"]})", server_url)
+
+    with urllib.request.urlopen(f"{server_url}/jobs/{job["id"]}/bundle") as response:
+        bundle = response.read()
+    with zipfile.ZipFile(io.BytesIO(bundle)) as zipped:
+        metadata = json.loads(zipped.read("metadata.json"))
+        if metadata.get("instructions_format") != PORTABLE_FORMAT:
+            raise PlanServerError(f"sent instructions in the {metadata.get("instructions_format")} format rather than {
+                PORTABLE_FORMAT}, which can't be opened on every machine", server_url)
+        plan_dir.mkdir(parents=True, exist_ok=True)
+        zipped.extractall(plan_dir)
+    PROGRESS_LOG.log(f"FETCHED PLAN OF \"{image_path}\" TO {plan_dir} ({
+                     metadata["timings"]["total"]:.2f}s on the server)")
+    return metadata
+
+
+def draw_plan(plan_dir: Path) -> None:
+    """Draw a plan fetched (or batch planned) into `plan_dir` in Paint."""
+    # imported here so that serving and fetching never need Paint
+    from interactions import PaintWindow, InteractionsManager
+    from redrawer import _BasicRedrawer, order_drawing_keys, BRUSH_TYPE, STROKE_SIZE, STATUS_FPATH, TELEMETRY_INTERVAL
+    from telemetry import DrawingTelemetry
+
+    palette = Palette.load(plan_dir / "palette.json")
+    with Image.open(plan_dir / "preview.png") as preview:
+        width, height = preview.size
+    stroke_size = int(STROKE_SIZE)  # type: ignore
+    if (plan_dir / "plan.json").exists():
+        with open(plan_dir / "plan.json") as f:
+            stroke_size = json.load(f)["stroke_size"]
+
+    window = PaintWindow()
+    window.initialize_window()
+    interactions_manager = InteractionsManager(window)
+    interactions_manager.resize(width, height)
+    interactions_manager.set_palette(palette)
+    interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
+    interactions_manager.set_stroke_size(stroke_size)
+
+    instruc_path = plan_dir / "instructions"
+    drawer = _BasicRedrawer(interactions_manager, instruc_path,
+                            telemetry=DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+    drawer.redraw(order_drawing_keys(instruc_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plan images on a server, and fetch and draw them elsewhere.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the plan server")
+    serve_parser.add_argument("--host", default=PLAN_SERVER_HOST)
+    serve_parser.add_argument("--port", type=int, default=PLAN_SERVER_PORT)
+    serve_parser.add_argument("--workers", type=int, default=None,
+                              help="number of worker processes (default: number of CPUs)")
+    serve_parser.add_argument("--max-jobs", type=int, default=PLAN_SERVER_MAX_JOBS,
+                              help="jobs queued or running at once before new ones are turned away")
+    serve_parser.add_argument("--keep-jobs", type=int, default=PLAN_SERVER_KEEP_JOBS,
+                              help="finished jobs to keep the plans of, older ones are removed")
+    serve_parser.add_argument("--output", default=PLAN_SERVER_OUTPUT_DIR,
+                              help="directory to plan every job into")
+
+    fetch_parser = commands.add_parser(
+        "fetch", help="have an image planned by a plan server, and download the plan")
+    fetch_parser.add_argument("image", help="image to plan")
+    fetch_parser.add_argument("plan", nargs="?", default="./output/plan",
+                              help="directory to extract the plan to")
+    fetch_parser.add_argument("--size", type=parse_size, default=None,
+                              help="WIDTHxHEIGHT to resize the image to fit in, instead of the server's TARGET_SIZE or monitor")
+    fetch_parser.add_argument("--time-budget", type=float, default=None,
+                              help="seconds the drawing should take at most (see instructions/budget.py)")
+    fetch_parser.add_argument("--server", default=PLAN_SERVER_URL,
+                              help="URL of the plan server")
+
+    draw_parser = commands.add_parser("draw", help="draw a fetched plan in Paint")
+    draw_parser.add_argument("plan", nargs="?", default="./output/plan",
+                             help="directory the plan was extracted to")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, Path(args.output), args.workers, args.max_jobs, args.keep_jobs)
+    elif args.command == "fetch":
+        fetch_plan(args.server, Path(args.image), Path(args.plan),
+                   args.size, args.time_budget)
+    else:
+        draw_plan(Path(args.plan))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,33 @@
 
 
+import concurrent.futures
 import dbm
+import queue
+import threading
+import time
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
-from image_processing import create_palette, open_image, create_processed_image, show_image
-from instructions import from_processed_image
+import numpy as np
+
+from image_processing import create_palette, open_image, create_processed_image, show_image, Palette
+from image_processing.image.delta import UNCHANGED
+from image_processing.image.repair import open_canvas, repair_image
+from instructions import from_processed_image, bundle_hash, parse_instructions, parse_polylines, pixel_areas, read_areas, color_keys, read_instructions, TEMP_DIR, TEMP_FPATH
+from instructions.cost_model import PlanStats, record_sample
+from instructions.adaptive import plan_adaptive
+from instructions.progressive import DrawingPass, plan_progressive
+from instructions.tiles import plan_tiles
+from instructions.verify import check_instructions
 
 from interactions import PaintWindow, InteractionsManager, Point
+from interactions.canvas import CompiledStrokes
+from interactions.constants import SCROLL_STEP_PX, STROKE_SIZE_PX
+from interactions.viewport import PaintViewport
 from dotenv import dotenv_values
 
+from journal import DrawingJournal
+from telemetry import DrawingTelemetry
 from logger import PROGRESS_LOG
 
 
@@ -18,6 +37,38 @@ SHOW_PALETTE = _settings["SHOW_PALETTE"] == "true"
 SHOW_PROCESSED_IMAGE = _settings["SHOW_PROCESSED_IMAGE"] == "true"
 BRUSH_TYPE = _settings["BRUSH_TYPE"]
 STROKE_SIZE = _settings["STROKE_SIZE"]
+PIPELINED = _settings.get("PIPELINED") == "true"
+PROGRESSIVE = _settings.get("PROGRESSIVE") == "true"
+ADAPTIVE = _settings.get("ADAPTIVE") == "true"
+TILED = _settings.get("TILED") == "true"
+JOURNAL_FLUSH_INTERVAL = float(_settings.get("JOURNAL_FLUSH_INTERVAL") or 2)
+TELEMETRY_INTERVAL = float(_settings.get("TELEMETRY_INTERVAL") or 5)
+REPAIR_TOLERANCE = float(_settings.get("REPAIR_TOLERANCE") or 10)
+
+# where the progress journal and the palette it belongs to are kept, for resuming interrupted drawings
+JOURNAL_FPATH: Path = TEMP_DIR / (_settings.get("JOURNAL_FNAME") or "redrawer_journal")
+PALETTE_FPATH: Path = TEMP_DIR / "redrawer_palette.json"
+# rewritten with the drawing's throughput, progress and ETA while drawing, see telemetry.py
+STATUS_FPATH: Path = TEMP_DIR / (_settings.get("STATUS_FNAME") or "redrawer_status.json")
+
+# strokes are replayed this many at a time, with progress recorded to the journal in between
+REPLAY_CHUNK_SIZE = 64
+
+
+def order_drawing_keys(instruc_path: Path) -> tuple:
+    """Returns the instruction keys of the DBM at `instruc_path` in drawing order, the colors covering the most pixels of the processed image first (see pixel_areas),
+    so the first color, which is bucketed, is the one that really is the most frequent after quantizing.
+    Bundles written before pixel areas were stored are ordered by how many strokes each color has instead.
+    """
+    areas = read_areas(instruc_path)
+    with dbm.open(instruc_path, 'r') as instrucs:
+        keys = sorted(color_keys(instrucs))
+        if areas is None:
+            sizes = {key: read_instructions(instrucs, key).count(b";") for key in keys}
+        else:
+            sizes = {key: areas.get(key.decode(), 0) for key in keys}
+
+    return tuple(sorted(keys, key=lambda key: sizes[key], reverse=True))
 
 
 class ImagePathError(Exception):
@@ -28,10 +79,14 @@ class ImagePathError(Exception):
 
 # as different redrawer types are created, it should most definitely be split up into seperate files and it's own module
 class _BasicRedrawer:
-    def __init__(self, interactions_manager: InteractionsManager, instruc_path: Path):
-        """Redrawing process for basic redrawing method. To be "injected" into the main Redrawer."""
+    def __init__(self, interactions_manager: InteractionsManager, instruc_path: Path, journal: DrawingJournal | None = None, telemetry: DrawingTelemetry | None = None):
+        """Redrawing process for basic redrawing method. To be "injected" into the main Redrawer.
+        If a `journal` is given, progress is recorded to it after every stroke, and any progress already in it is skipped.
+        If `telemetry` is given, throughput and progress are reported to it while drawing."""
         self._interactions_manager = interactions_manager
         self._instruc_path = instruc_path
+        self._journal = journal
+        self._telemetry = telemetry
 
     def _redraw_first_color(self) -> None:
         """A special redrawing method for the most frequent color, rather than drag drawing, buckets the canvas. Assumes correct color is selected"""
@@ -39,42 +94,103 @@ class _BasicRedrawer:
         self._interactions_manager.canvas_click(Point(5, 5))
         self._interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
 
-    def _redraw_one_color(self, color_instrucs: str) -> None:
-        """The redrawing of exactly one color, meaning a bunch of clicks and drags."""
-        # note the splice [:-1] to get rid of the last "empty" element
-        for instruc in color_instrucs.split(";")[:-1]:
-            # remove the surrounding braces and split by delimeter
-            x, y, length = instruc[1:-1].split(",")
-            x = int(x)
-            y = int(y)
-            length = int(length)
+    def _redraw_one_color(self, color_instrucs: str, key: str = "", start: int = 0) -> None:
+        """The redrawing of exactly one color, meaning a bunch of clicks and drags. Starts from stroke number `start`, skipping the strokes before it.
+        All of the color's strokes are compiled into screen events up front (see CanvasInteractions.compile_strokes), so nothing but sending events happens while drawing."""
+        if INSTRUCTION_TYPE == "polyline":
+            compiled = self._compile_polylines(color_instrucs)
+        else:
+            strokes = parse_instructions(color_instrucs)
             # if smallest stroke size, clicking simply will not draw anything for some odd reason. Thus, we have to drag at least one px, thus add one in length
-            length += 1 if STROKE_SIZE == 1 else 0
-            if length == 1:
-                self._interactions_manager.canvas_click(Point(x, y))
-            else:
-                self._interactions_manager.canvas_drag(
-                    Point(x, y), Point(x+length, y))
-
-    def redraw(self, ordered_drawing_keys: tuple["dbm._KeyType"]) -> None:
-        """Basic redrawing function for basic redrawing"""
+            strokes[:, 2] += 1 if int(STROKE_SIZE) == 1 else 0  # type: ignore
+            compiled = self._interactions_manager.compile_strokes(strokes)
+        num_strokes = len(compiled.stroke_ends)
+
+        for chunk_start in range(start, num_strokes, REPLAY_CHUNK_SIZE):
+            chunk_stop = min(chunk_start + REPLAY_CHUNK_SIZE, num_strokes)
+            self._interactions_manager.replay_strokes(
+                compiled, chunk_start, chunk_stop)
+
+            if self._journal is not None:
+                self._journal.record(key, chunk_stop)
+            if self._telemetry is not None:
+                first_event = compiled.stroke_ends[chunk_start -
+                                                   1] if chunk_start else 0
+                self._telemetry.record(key, chunk_stop, int(
+                    compiled.stroke_ends[chunk_stop - 1] - first_event))
+
+    def _compile_polylines(self, color_instrucs: str) -> CompiledStrokes:
+        """Compile the polyline instructions of one color, see CanvasInteractions.compile_polylines."""
+        points, polyline_ends = parse_polylines(color_instrucs)
+        if int(STROKE_SIZE) == 1:  # type: ignore
+            # the same as for basic instructions, clicks don't draw with the smallest stroke size, so single points become a one pixel drag
+            clicks = polyline_ends[np.diff(polyline_ends, prepend=0) == 1]
+            points = np.insert(points, clicks, points[clicks - 1] + (1, 0), axis=0)
+            polyline_ends = polyline_ends + \
+                np.searchsorted(clicks, polyline_ends, side="right")
+        return self._interactions_manager.compile_polylines(points, polyline_ends)
+
+    def redraw(self, ordered_drawing_keys: tuple["dbm._KeyType"], bucket_first: bool = True) -> None:
+        """Basic redrawing function for basic redrawing. See redraw_stream for `bucket_first`."""
         with dbm.open(self._instruc_path, 'r') as instrucs:
-            for cur_color_num, key in enumerate(ordered_drawing_keys):
-                row, col = key.decode().split(',')  # type: ignore
-                PROGRESS_LOG.log(f"Selecting color at {row}, {col} to execute ~{len(
-                    instrucs[key])} worth of redrawing instructions ({cur_color_num+1}/{len(ordered_drawing_keys)})")
+            # every color is known up front here, so the ETA covers the whole drawing from the start
+            if self._telemetry is not None:
+                progress = self._journal.progress if self._journal is not None else {}
+                for key in ordered_drawing_keys:
+                    self._telemetry.add_color(key.decode(), read_instructions(instrucs, key).count(b";"),  # type: ignore
+                                              progress.get(key.decode(), 0))  # type: ignore
+            self.redraw_stream(((key.decode(), read_instructions(instrucs, key).decode()) for key in ordered_drawing_keys),  # type: ignore
+                               len(ordered_drawing_keys), bucket_first)
+
+    def redraw_stream(self, color_instrucs: Iterable[tuple[str, str]], num_colors: int, bucket_first: bool = True) -> None:
+        """Redraw (key, instructions) pairs in the order they're given, as they're given. The first pair is bucketed rather than drawn, unless `bucket_first` is false (ie. when drawing on top of an existing drawing).
+        Lets drawing start before all the instructions exist, see Redrawer's pipelined mode."""
+        progress = dict(self._journal.progress) if self._journal is not None else {}
+
+        for cur_color_num, (key, instrucs) in enumerate(color_instrucs):
+            self._draw_color(cur_color_num, key, instrucs,
+                             num_colors, progress, bucket_first)
+
+        if self._telemetry is not None:
+            self._telemetry.finish()
 
-                # skips any colors that have no instructions
-                if not instrucs[key].decode():
-                    continue
+    def _draw_color(self, cur_color_num: int, key: str, instrucs: str, num_colors: int, progress: dict[str, int], bucket_first: bool = True) -> None:
+        """Redraw the color number `cur_color_num` of redraw_stream, given the `progress` made before resuming."""
+        row, col = key.split(',')
+        PROGRESS_LOG.log(f"Selecting color at {row}, {col} to execute ~{len(
+            instrucs)} worth of redrawing instructions ({cur_color_num+1}/{num_colors})")
 
-                self._interactions_manager.set_color(int(row), int(col))
+        # first color, assuming ordered correctly, should be the most frequent, thus we can just bucket it
+        # it is bucketed even without instructions, drawing in passes leaves the background out of the instructions and relies on the bucket
+        # never bucket a canvas that already has progress on it though, it would paint over everything
+        num_strokes = instrucs.count(";")
+        if bucket_first and cur_color_num == 0 and not progress:
+            if self._telemetry is not None:
+                self._telemetry.add_color(key, num_strokes)
+                self._telemetry.start_color(key)
+            self._interactions_manager.set_color(int(row), int(col))
+            self._redraw_first_color()
+            if self._journal is not None:
+                self._journal.record(key, num_strokes)
+            if self._telemetry is not None:
+                self._telemetry.complete(key)
+            return
 
-                if cur_color_num == 0:  # first color, assuming ordered correctly, should be the most frequent, thus we can just bucket it
-                    self._redraw_first_color()
-                    continue
+        # skips any colors that have no instructions
+        if not instrucs:
+            return
 
-                self._redraw_one_color(instrucs[key].decode())
+        # skips any colors (or the strokes of colors) that were already drawn before resuming
+        strokes_drawn = progress.get(key, 0)
+        if self._telemetry is not None:
+            self._telemetry.add_color(key, num_strokes, strokes_drawn)
+        if strokes_drawn >= num_strokes:
+            return
+
+        self._interactions_manager.set_color(int(row), int(col))
+        if self._telemetry is not None:
+            self._telemetry.start_color(key)
+        self._redraw_one_color(instrucs, key, strokes_drawn)
 
 
 class Redrawer:
@@ -89,6 +205,7 @@ class Redrawer:
         self._output_path = self._source_path.parent / (output_name + ".png")
 
         self._instruc_path: Path  # to be defined later in _setup
+        self._journal: DrawingJournal | None = None
 
     def _compute_instructions(self):
         """Set up and initialize components that support/calculate the instructions. Needs to be called before _initialize_drawer. 
@@ -99,22 +216,51 @@ class Redrawer:
         # will be the same as the combined path found in settings.env
         self._instruc_path = from_processed_image(
             self._processed_img, self._palette)
+        check_instructions(self._instruc_path, self._processed_img, self._palette)
+        self._start_journal(bundle_hash(self._instruc_path))
+
+    def _start_journal(self, instrucs_hash: str | None, bucket_first: bool = True) -> None:
+        """Start a new progress journal for this drawing (replacing any old one), and save the palette next to it so the drawing can be resumed without recomputing anything.
+        `bucket_first` is whether the drawing buckets its first color, so resuming it does the same."""
+        TEMP_DIR.mkdir(exist_ok=True)
+        self._palette.save(PALETTE_FPATH)
+        self._forget_journal()
+        self._journal = DrawingJournal(
+            JOURNAL_FPATH, self._palette.content_hash, instrucs_hash, JOURNAL_FLUSH_INTERVAL, bucket_first=bucket_first)
+
+    @staticmethod
+    def _forget_journal() -> None:
+        """Remove the journal of any earlier drawing, so it can't be resumed onto the canvas of a drawing that isn't journaled (ie. in passes or tiles)."""
+        JOURNAL_FPATH.unlink(missing_ok=True)
+
+    def checkpoint(self) -> None:
+        """Write any drawing progress that hasn't been written to the journal yet. Safe to call from another thread, ie. right before a hard exit."""
+        if self._journal is not None:
+            self._journal.flush()
 
     def _initialize_drawer(self):
         """Set up and initialize copmonents supporting the drawer (what interacts with the canvas). Needs to be called after _compute_instructions.
          Required `self._instruc_path` and corresponding DBM is created correctly."""
+        self._open_window()
+        self._drawer = _BasicRedrawer(
+            self._interactions_manager, self._instruc_path, self._journal, DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+        self._setup_canvas()
+
+    def _open_window(self):
+        """Start Paint and the interaction manager. Doesn't depend on the image at all, so it can run while the image is being processed."""
         PROGRESS_LOG.log("INITIALIZING PAINT WINDOW")
         # set up paint window and interaction manager
         self._window = PaintWindow()
         self._window.initialize_window()
         self._interactions_manager = InteractionsManager(self._window)
-        self._drawer = _BasicRedrawer(
-            self._interactions_manager, self._instruc_path)
 
+    def _setup_canvas(self):
+        """Set up the canvas size and toolbar. Requires the window to be open, and the palette and processed image to exist."""
         # set up some canvas settings and toolbar palette
         self._interactions_manager.resize(
             self._processed_img.shape[1],
-            self._processed_img.shape[0]
+            self._processed_img.shape[0],
+            fit_window=not TILED
         )
         self._interactions_manager.set_palette(self._palette)
         self._interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
@@ -127,18 +273,8 @@ class Redrawer:
             raise ImagePathError(path)
 
     def _order_drawing_keys(self) -> tuple:
-        """Returns the sorted instruction keys by length of their corresponding instructions. 
-        Intended to produce a drawing order where the most frequent colors are drawn first, without having to parse THEN count instructions.
-        Because of how palette works and blah blah, the first custom color (2, 0) is guaranteed to be the most common (amongst the custom colors) which usually means it's the most common out of all.
-        """
-        data = []
-        with dbm.open(self._instruc_path, 'r') as instrucs:
-            for key in instrucs.keys():
-                if key != b"2,0":
-                    data.append((key, len(instrucs[key].split(b";"))))
-
-        # sort by length of instructions
-        return (b"2,0", *[key for (key, _) in sorted(data, key=lambda d: d[1], reverse=True)])
+        """See order_drawing_keys."""
+        return order_drawing_keys(self._instruc_path)
 
     def _setup(self) -> None:
         """Compute instructions, then set up the the toolbar and canvas so redrawing goes without issues."""
@@ -153,6 +289,213 @@ class Redrawer:
 
     def redraw(self) -> None:
         """The core function that executes everything."""
+        if PIPELINED:
+            self._redraw_pipelined()
+            return
+        if TILED:
+            self._redraw_tiled()
+            return
+        if PROGRESSIVE or ADAPTIVE:
+            self._redraw_passes()
+            return
+
         PROGRESS_LOG.log("SETTING UP PAINT WINDOW AND CANVAS")
         self._setup()
-        self._drawer.redraw(self._order_drawing_keys())
+        ordered_keys = self._order_drawing_keys()
+        try:
+            start = time.perf_counter()
+            self._drawer.redraw(ordered_keys)
+            # every finished drawing is a sample for calibrating the cost model, see instructions/cost_model.py
+            record_sample(PlanStats.from_dbm(self._instruc_path, list(ordered_keys)),
+                          time.perf_counter() - start)
+        finally:
+            self._journal.close()  # type: ignore
+
+    def _redraw_passes(self) -> None:
+        """Like redraw, but in passes of different stroke sizes, either from a coarse version of the image down to the full resolution (see instructions/progressive.py),
+        or with flat areas in wide single color blocks and only the details at the full resolution (see instructions/adaptive.py).
+        Drawings in passes aren't journaled, so they can't be resumed."""
+        self._forget_journal()
+        self._img = open_image(self._source_path)
+        self._palette = create_palette(self._img)
+        self._processed_img = create_processed_image(self._img, self._palette)
+
+        plan = plan_progressive if PROGRESSIVE else plan_adaptive
+        passes: list[DrawingPass] = plan(self._processed_img, self._palette, int(
+            STROKE_SIZE), STROKE_SIZE_PX)  # type: ignore
+        pass_paths = [from_processed_image(drawing_pass.image, self._palette, TEMP_FPATH.with_name(f"{TEMP_FPATH.name}_pass{pass_num}"), pitch=drawing_pass.pitch)
+                      for pass_num, drawing_pass in enumerate(passes)]
+        for drawing_pass, pass_path in zip(passes, pass_paths):
+            check_instructions(pass_path, drawing_pass.image, self._palette, drawing_pass.pitch)
+
+        PROGRESS_LOG.log("SETTING UP PAINT WINDOW AND CANVAS")
+        self._open_window()
+        self._setup_canvas()
+        for pass_num, (drawing_pass, pass_path) in enumerate(zip(passes, pass_paths)):
+            PROGRESS_LOG.log(f"DRAWING PASS {pass_num + 1}/{len(passes)} WITH STROKE SIZE {
+                             drawing_pass.stroke_size} ({drawing_pass.num_cells} cells)")
+            self._interactions_manager.set_stroke_size(
+                drawing_pass.stroke_size)
+            drawer = _BasicRedrawer(self._interactions_manager, pass_path,
+                                    telemetry=DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+            # only the first pass starts from a blank canvas, the rest draw on top of it
+            drawer.redraw(drawing_pass.order, bucket_first=pass_num == 0)
+
+    def _redraw_tiled(self) -> None:
+        """Like redraw, but for images larger than the canvas the window can show, scrolling the canvas to draw it one tile at a time (see instructions/tiles.py).
+        Tiled drawings aren't journaled, so they can't be resumed."""
+        self._forget_journal()
+        self._img = open_image(self._source_path)
+        self._palette = create_palette(self._img)
+        self._processed_img = create_processed_image(self._img, self._palette)
+
+        PROGRESS_LOG.log("SETTING UP PAINT WINDOW AND CANVAS")
+        self._open_window()
+        self._setup_canvas()
+        canvas_size = (self._processed_img.shape[1], self._processed_img.shape[0])
+        viewport = PaintViewport(self._interactions_manager, canvas_size)
+
+        tiles = plan_tiles(self._processed_img, self._palette,
+                           viewport.size, SCROLL_STEP_PX)
+        for tile_num, tile in enumerate(tiles):
+            # computed one tile at a time, every tile's instructions are as big as the viewport
+            tile_path = from_processed_image(tile.image, self._palette, TEMP_FPATH.with_name(f"{TEMP_FPATH.name}_tile"))
+            check_instructions(tile_path, tile.image, self._palette)
+            PROGRESS_LOG.log(f"DRAWING TILE {tile_num + 1}/{len(tiles)} AT {
+                             tile.bounds} ({tile.num_pixels} pixels)")
+            viewport.scroll_to(tile.origin)
+            drawer = _BasicRedrawer(self._interactions_manager, tile_path,
+                                    telemetry=DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+            # only the first tile buckets, which fills the whole canvas
+            drawer.redraw(tile.order, bucket_first=tile_num == 0)
+        PROGRESS_LOG.log(f"DREW {len(tiles)} TILES WITH {viewport.num_scrolls} SCROLLS")
+
+    def resume(self) -> None:
+        """Continue an interrupted drawing from the last stroke recorded in its journal, on the Paint window that is still open from it.
+        Nothing is recomputed, the palette and instructions of the interrupted drawing are reused (and checked against the journal)."""
+        PROGRESS_LOG.log("RESUMING DRAWING FROM JOURNAL")
+        self._instruc_path = TEMP_FPATH
+        self._palette = Palette.load(PALETTE_FPATH)
+        instrucs_hash = bundle_hash(self._instruc_path)
+        progress = DrawingJournal.read(
+            JOURNAL_FPATH, self._palette.content_hash, instrucs_hash)
+        # a drawing on top of an existing canvas (ie. a repair) must not be bucketed over, even if nothing was drawn yet
+        bucket_first = DrawingJournal.read_bucket_first(JOURNAL_FPATH)
+        self._journal = DrawingJournal(
+            JOURNAL_FPATH, self._palette.content_hash, instrucs_hash, JOURNAL_FLUSH_INTERVAL, progress, bucket_first)
+
+        self._attach_window()
+        self._drawer = _BasicRedrawer(
+            self._interactions_manager, self._instruc_path, self._journal, DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+        try:
+            self._drawer.redraw(self._order_drawing_keys(), bucket_first)
+        finally:
+            self._journal.close()
+
+    def _attach_window(self) -> None:
+        """Start the interaction manager on the Paint window left open from an earlier drawing of this image.
+        The canvas is already sized and the custom colors already exist in the open window, only the tool needs to be set."""
+        self._window = PaintWindow()
+        self._window.attach_window()
+        self._interactions_manager = InteractionsManager(self._window)
+        self._interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
+        self._interactions_manager.set_stroke_size(
+            int(STROKE_SIZE))  # type: ignore
+
+    def repair(self, canvas_path: Path) -> None:
+        """Touch up an earlier drawing of this image (partial or botched), saved from Paint to `canvas_path`, on the Paint window it is still open in.
+        Only pixels of the canvas further than REPAIR_TOLERANCE (delta E) from what they should be are drawn, see image_processing/image/repair.py."""
+        PROGRESS_LOG.log(f"PLANNING REPAIR OF \"{canvas_path}\"")
+        self._img = open_image(self._source_path)
+        self._palette = create_palette(self._img)
+        self._processed_img = create_processed_image(self._img, self._palette)
+
+        canvas = open_canvas(canvas_path, self._processed_img.shape)
+        repair = repair_image(canvas, self._processed_img,
+                              self._palette, REPAIR_TOLERANCE)
+        num_wrong = int(np.count_nonzero(repair != UNCHANGED))
+        PROGRESS_LOG.log(f"{num_wrong}/{repair.size} PIXELS NEED REPAIRING")
+
+        self._instruc_path = from_processed_image(repair, self._palette)
+        check_instructions(self._instruc_path, repair, self._palette)
+        # a repair is a drawing like any other, so it can be resumed too
+        self._start_journal(bundle_hash(self._instruc_path), bucket_first=False)
+
+        self._attach_window()
+        self._drawer = _BasicRedrawer(
+            self._interactions_manager, self._instruc_path, self._journal, DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+        try:
+            # the canvas is already drawn on, bucketing would paint over it
+            self._drawer.redraw(self._order_drawing_keys(), bucket_first=False)
+        finally:
+            self._journal.close()  # type: ignore
+
+    def _order_by_pixel_area(self) -> list[tuple[int, int]]:
+        """Returns palette positions ordered for drawing without needing the instructions, the same as order_drawing_keys: by how many pixels of the processed image they cover, most first."""
+        areas = pixel_areas(self._processed_img, self._palette)
+        return sorted(self._palette.positions, key=lambda position: areas["{},{}".format(*position)], reverse=True)
+
+    def _produce_instructions(self, order: list[tuple[int, int]], out: "queue.Queue[tuple[str, str] | BaseException | None]") -> None:
+        """Producer side of pipelined mode. Compute the instructions of every color in `order`, putting each into `out` as soon as it is ready. Ends with None, or the exception that stopped it."""
+        try:
+            from_processed_image(self._processed_img, self._palette, self._instruc_path,
+                                 order=order, on_color=lambda key, instrucs: out.put((key, instrucs)))
+            # too late to stop the colors already drawn, but a broken plan still stops the drawing rather than finishing wrong
+            check_instructions(self._instruc_path, self._processed_img, self._palette)
+            # drawing progress can only be written once the instructions it refers to are complete
+            self._journal.set_bundle_hash(  # type: ignore
+                bundle_hash(self._instruc_path))
+        except BaseException as e:
+            out.put(e)
+        else:
+            out.put(None)
+
+    @staticmethod
+    def _consume_instructions(source: "queue.Queue[tuple[str, str] | BaseException | None]") -> Iterator[tuple[str, str]]:
+        """Consumer side of pipelined mode. Yield (key, instructions) from the producer until it is done, re-raising anything that went wrong in it."""
+        while (item := source.get()) is not None:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def _redraw_pipelined(self) -> None:
+        """Like redraw, but overlapping the slow parts instead of doing them one after another:
+            - Paint is started while the image is being processed
+            - instructions are computed while the canvas and toolbar are set up, and while drawing
+            - each color is drawn as soon as its instructions are ready, in drawing order
+        """
+        PROGRESS_LOG.log("SETTING UP PAINT WINDOW WHILE PROCESSING IMAGE")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            window_future = executor.submit(self._open_window)
+
+            self._img = open_image(self._source_path)
+            self._palette = create_palette(self._img)
+            self._processed_img = create_processed_image(
+                self._img, self._palette)
+
+            order = self._order_by_pixel_area()
+            self._instruc_path = TEMP_FPATH
+            self._start_journal(None)
+            instrucs_queue: queue.Queue[tuple[str, str] |
+                                        BaseException | None] = queue.Queue()
+            producer = threading.Thread(
+                target=self._produce_instructions, args=(order, instrucs_queue), daemon=True)
+            producer.start()
+
+            if SHOW_PALETTE:
+                self._palette.show_in_image()
+            if SHOW_PROCESSED_IMAGE:
+                show_image(self._processed_img, self._palette)
+
+            # re-raises anything that went wrong opening Paint
+            window_future.result()
+
+        self._setup_canvas()
+        self._drawer = _BasicRedrawer(
+            self._interactions_manager, self._instruc_path, self._journal, DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+        try:
+            self._drawer.redraw_stream(
+                self._consume_instructions(instrucs_queue), len(order))
+            producer.join()
+        finally:
+            self._journal.close()  # type: ignore
@@ -0,0 +1,173 @@
+"""
+Sequence mode, for drawing the frames of an animation one after another on the same canvas.
+
+Planning (headless, any OS):
+    - one palette is shared by every frame, from the most frequent colors across all of them
+    - frames are quantized in parallel across a process pool
+    - the first frame is planned in full. Every frame after only gets the strokes that turn the previous frame into it (see image_processing/image/delta.py),
+      so mostly static footage needs a tiny fraction of the strokes per frame
+For frames planned to `<output dir>`, the following is written:
+    palette.json                    the shared palette, see Palette.save
+    <frame number>/instructions     the DBM instruction bundle of the frame (only the changes from the previous frame after the first)
+    <frame number>/preview.png      what the frame looks like once drawn
+
+Drawing (Windows, with Paint): the frames are drawn in order on one canvas, pausing after each frame so it can be saved (or captured) before the next is drawn on top of it.
+
+Usage:
+    python sequence.py plan [frames directory or glob] [output directory] [--workers N] [--size WIDTHxHEIGHT]
+    python sequence.py draw [output directory]
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from batch import find_images, _init_worker
+from image_processing import create_shared_palette, create_processed_image, open_image, save_image, Palette
+from image_processing.image.delta import delta_image
+from image_processing.image.resize import set_target_size, target_size, parse_size
+from instructions import from_processed_image, shutdown_pool
+from instructions.verify import check_instructions
+from logger import PROGRESS_LOG
+
+
+SEQUENCE_OUTPUT_DIR = "./output/sequence"
+
+
+class FrameSizeMismatchError(Exception):
+    """Raised when the frames of a sequence aren't all the same size, so they can't be drawn on top of each other."""
+
+    def __init__(self, frame_path: Path, size: tuple[int, int], expected: tuple[int, int]):
+        super().__init__(f"Frame \"{frame_path}\" is {size[0]}x{size[1]} after resizing, but the frames before it are {
+            expected[0]}x{expected[1]}. Every frame of a sequence must be the same size.")
+
+
+def _frame_dirs(output_dir: Path) -> list[Path]:
+    """The directories of every planned frame in `output_dir`, in order."""
+    return sorted(d for d in output_dir.iterdir() if d.is_dir() and d.name.isdigit())
+
+
+def plan_sequence(frame_paths: list[Path], output_dir: Path, workers: int | None = None) -> list[int]:
+    """Plan every frame in `frame_paths` (in order) to be drawn on top of the one before it, writing everything to `output_dir`. Returns the number of pixels drawn for each frame."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # frames of an earlier, longer sequence planned here would otherwise be drawn after this one's, on top of frames they weren't diffed against
+    for frame_dir in _frame_dirs(output_dir):
+        shutil.rmtree(frame_dir)
+
+    frames = [open_image(path) for path in frame_paths]
+    for path, frame in zip(frame_paths, frames):
+        if frame.shape != frames[0].shape:
+            raise FrameSizeMismatchError(
+                path, frame.shape[1::-1], frames[0].shape[1::-1])
+
+    palette = create_shared_palette(frames)
+    palette.save(output_dir / "palette.json")
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(target_size(),)) as executor:
+        processed_frames = list(executor.map(
+            create_processed_image, frames, itertools.repeat(palette)))
+    PROGRESS_LOG.log(f"QUANTIZED {len(frames)} FRAMES IN {
+                     time.perf_counter() - start:.2f}s")
+
+    pixels_drawn = []
+    previous = None
+    for frame_num, processed in enumerate(processed_frames):
+        frame_dir = output_dir / f"{frame_num:05}"
+        frame_dir.mkdir(exist_ok=True)
+
+        to_draw = processed if previous is None else delta_image(
+            previous, processed)
+        from_processed_image(to_draw, palette, frame_dir / "instructions")
+        check_instructions(frame_dir / "instructions", to_draw, palette)
+        save_image(processed, palette, frame_dir / "preview.png")
+
+        pixels_drawn.append(processed.size if previous is None else int(
+            np.count_nonzero(processed != previous)))
+        PROGRESS_LOG.log(f"PLANNED FRAME {frame_num + 1}/{len(frames)}, {
+                         pixels_drawn[-1]}/{processed.size} pixels to draw")
+        previous = processed
+
+    shutdown_pool()
+    return pixels_drawn
+
+
+def draw_sequence(output_dir: Path) -> None:
+    """Draw every frame planned in `output_dir` in order on one canvas, waiting for enter to be pressed between frames."""
+    # imported here so that planning never needs Paint
+    from interactions import PaintWindow, InteractionsManager
+    from redrawer import _BasicRedrawer, order_drawing_keys, BRUSH_TYPE, STROKE_SIZE, STATUS_FPATH, TELEMETRY_INTERVAL
+    from telemetry import DrawingTelemetry
+
+    palette = Palette.load(output_dir / "palette.json")
+    frame_dirs = _frame_dirs(output_dir)
+    with Image.open(frame_dirs[0] / "preview.png") as preview:
+        width, height = preview.size
+
+    window = PaintWindow()
+    window.initialize_window()
+    interactions_manager = InteractionsManager(window)
+    interactions_manager.resize(width, height)
+    interactions_manager.set_palette(palette)
+    interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
+    interactions_manager.set_stroke_size(int(STROKE_SIZE))  # type: ignore
+
+    for frame_num, frame_dir in enumerate(frame_dirs):
+        PROGRESS_LOG.log(f"DRAWING FRAME {frame_num + 1}/{len(frame_dirs)}")
+        instruc_path = frame_dir / "instructions"
+        drawer = _BasicRedrawer(interactions_manager, instruc_path,
+                                telemetry=DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+        # later frames are drawn on top of the previous frame, which bucketing would paint over
+        drawer.redraw(order_drawing_keys(instruc_path),
+                      bucket_first=frame_num == 0)
+
+        if frame_num < len(frame_dirs) - 1:
+            input("Frame drawn. Save it, then press enter to draw the next frame...")
+            # whatever was done in Paint to save the frame may have changed the toolbar
+            interactions_manager.forget_toolbar_state()
+            window.modify()
+            interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
+            interactions_manager.set_stroke_size(
+                int(STROKE_SIZE))  # type: ignore
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plan and draw the frames of an animation, each frame drawn on top of the last.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser(
+        "plan", help="plan every frame, without drawing")
+    plan_parser.add_argument("input", help="directory or glob of frames, in order by name")
+    plan_parser.add_argument("output", nargs="?", default=SEQUENCE_OUTPUT_DIR,
+                             help="directory to write the plan to")
+    plan_parser.add_argument("--workers", type=int, default=None,
+                             help="number of worker processes quantizing frames (default: number of CPUs)")
+    plan_parser.add_argument("--size", type=parse_size, default=None,
+                             help="WIDTHxHEIGHT to resize frames to fit in, instead of TARGET_SIZE or the monitor")
+
+    draw_parser = commands.add_parser(
+        "draw", help="draw planned frames in Paint")
+    draw_parser.add_argument("output", nargs="?", default=SEQUENCE_OUTPUT_DIR,
+                             help="directory the plan was written to")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        if args.size is not None:
+            set_target_size(args.size)
+        frame_paths = find_images(args.input)
+        PROGRESS_LOG.log(f"PLANNING SEQUENCE OF {len(frame_paths)} FRAMES FROM {
+                         args.input} TO {args.output}")
+        plan_sequence(frame_paths, Path(args.output), args.workers)
+    else:
+        draw_sequence(Path(args.output))
+
+
+if __name__ == '__main__':
+    main()
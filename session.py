@@ -0,0 +1,160 @@
+"""
+Session mode, for drawing a queue of images one after another in the same Paint window, rather than starting Paint and setting up its toolbar again for every image.
+
+Planning (headless, any OS):
+    - with --shared-palette, one palette is shared by every image, from the most frequent colors across all of them (like sequence.py),
+      so the custom colors are only ever created once. Otherwise each image gets its own palette
+    - images are quantized in parallel across a process pool
+For images planned to `<output dir>`, the following is written:
+    <image number>/palette.json     the image's palette (the same for every image with --shared-palette), see Palette.save
+    <image number>/instructions     the DBM instruction bundle of the image
+    <image number>/preview.png      what the image looks like once drawn
+
+Drawing (Windows, with Paint): Paint is started once, and between images the canvas is only cleared, and resized if the next image is a different size.
+Custom colors are only created when they differ from the ones the image before already created (see ToolbarInteractions.set_palette), so none are with a shared palette.
+Drawing pauses after each image so it can be saved before the next one clears it, unless --no-pause.
+
+Usage:
+    python session.py plan [images directory or glob] [output directory] [--shared-palette] [--workers N] [--size WIDTHxHEIGHT]
+    python session.py draw [output directory] [--no-pause]
+"""
+
+import argparse
+import concurrent.futures
+import shutil
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from batch import find_images, _init_worker
+from image_processing import create_palette, create_shared_palette, create_processed_image, open_image, save_image, Palette
+from image_processing.image.resize import set_target_size, target_size, parse_size
+from instructions import from_processed_image, shutdown_pool
+from instructions.verify import check_instructions
+from logger import PROGRESS_LOG
+
+
+SESSION_OUTPUT_DIR = "./output/session"
+
+
+def _image_dirs(output_dir: Path) -> list[Path]:
+    """The directories of every planned image in `output_dir`, in order."""
+    return sorted(d for d in output_dir.iterdir() if d.is_dir() and d.name.isdigit())
+
+
+def plan_session(image_paths: list[Path], output_dir: Path, shared_palette: bool = False, workers: int | None = None) -> None:
+    """Plan every image in `image_paths` (in order) to be drawn one after another in the same Paint window, writing everything to `output_dir`.
+    With `shared_palette`, one palette is created for all of the images, rather than one for each."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # images of an earlier, longer session planned here would otherwise be drawn after this one's
+    for image_dir in _image_dirs(output_dir):
+        shutil.rmtree(image_dir)
+
+    images = [open_image(path) for path in image_paths]
+    if shared_palette:
+        palettes = [create_shared_palette(images)] * len(images)
+    else:
+        palettes = [create_palette(image) for image in images]
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(target_size(),)) as executor:
+        processed_images = list(executor.map(
+            create_processed_image, images, palettes))
+    PROGRESS_LOG.log(f"QUANTIZED {len(images)} IMAGES IN {
+                     time.perf_counter() - start:.2f}s")
+
+    for image_num, (path, processed, palette) in enumerate(zip(image_paths, processed_images, palettes)):
+        image_dir = output_dir / f"{image_num:05}"
+        image_dir.mkdir(exist_ok=True)
+
+        from_processed_image(processed, palette, image_dir / "instructions")
+        check_instructions(image_dir / "instructions", processed, palette)
+        palette.save(image_dir / "palette.json")
+        save_image(processed, palette, image_dir / "preview.png")
+        PROGRESS_LOG.log(f"PLANNED IMAGE {image_num + 1}/{len(images)} ({path})")
+
+    shutdown_pool()
+
+
+def draw_session(output_dir: Path, pause: bool = True) -> None:
+    """Draw every image planned in `output_dir` in order in one Paint window, clearing the canvas between them.
+    Unless not `pause`, waits for enter to be pressed between images."""
+    # imported here so that planning never needs Paint
+    from interactions import PaintWindow, InteractionsManager
+    from redrawer import _BasicRedrawer, order_drawing_keys, BRUSH_TYPE, STROKE_SIZE, STATUS_FPATH, TELEMETRY_INTERVAL
+    from telemetry import DrawingTelemetry
+
+    image_dirs = _image_dirs(output_dir)
+
+    window = PaintWindow()
+    window.initialize_window()
+    interactions_manager = InteractionsManager(window)
+
+    for image_num, image_dir in enumerate(image_dirs):
+        palette = Palette.load(image_dir / "palette.json")
+        with Image.open(image_dir / "preview.png") as preview:
+            width, height = preview.size
+
+        PROGRESS_LOG.log(f"SETTING UP IMAGE {image_num + 1}/{len(image_dirs)}")
+        # a new Paint canvas is already blank
+        if image_num:
+            interactions_manager.clear_canvas()
+        # all of these do nothing if the image before already set them the same, see ToolbarState
+        interactions_manager.resize(width, height)
+        interactions_manager.set_palette(palette)
+        interactions_manager.set_brush(BRUSH_TYPE)  # type: ignore
+        interactions_manager.set_stroke_size(int(STROKE_SIZE))  # type: ignore
+
+        PROGRESS_LOG.log(f"DRAWING IMAGE {image_num + 1}/{len(image_dirs)}")
+        instruc_path = image_dir / "instructions"
+        drawer = _BasicRedrawer(interactions_manager, instruc_path,
+                                telemetry=DrawingTelemetry(STATUS_FPATH, TELEMETRY_INTERVAL))
+        drawer.redraw(order_drawing_keys(instruc_path))
+
+        if pause and image_num < len(image_dirs) - 1:
+            input("Image drawn. Save it, then press enter to draw the next image...")
+            # saving may have changed the toolbar, but it can't have removed custom colors
+            interactions_manager.forget_toolbar_state(keep_custom_colors=True)
+            window.modify()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plan and draw many images one after another in the same Paint window.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = commands.add_parser(
+        "plan", help="plan every image, without drawing")
+    plan_parser.add_argument("input", help="directory or glob of images, drawn in order by name")
+    plan_parser.add_argument("output", nargs="?", default=SESSION_OUTPUT_DIR,
+                             help="directory to write the plan to")
+    plan_parser.add_argument("--shared-palette", action="store_true",
+                             help="create one palette for every image, so custom colors are only created once")
+    plan_parser.add_argument("--workers", type=int, default=None,
+                             help="number of worker processes quantizing images (default: number of CPUs)")
+    plan_parser.add_argument("--size", type=parse_size, default=None,
+                             help="WIDTHxHEIGHT to resize images to fit in, instead of TARGET_SIZE or the monitor")
+
+    draw_parser = commands.add_parser(
+        "draw", help="draw planned images in Paint")
+    draw_parser.add_argument("output", nargs="?", default=SESSION_OUTPUT_DIR,
+                             help="directory the plan was written to")
+    draw_parser.add_argument("--no-pause", action="store_true",
+                             help="draw the next image as soon as one is done, without waiting to save it")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        if args.size is not None:
+            set_target_size(args.size)
+        image_paths = find_images(args.input)
+        PROGRESS_LOG.log(f"PLANNING SESSION OF {len(image_paths)} IMAGES FROM {
+                         args.input} TO {args.output}")
+        plan_session(image_paths, Path(args.output),
+                     args.shared_palette, args.workers)
+    else:
+        draw_session(Path(args.output), not args.no_pause)
+
+
+if __name__ == '__main__':
+    main()
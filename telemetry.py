@@ -0,0 +1,129 @@
+"""
+Live telemetry while drawing: throughput, per-color progress and an ETA, so slowdowns (a busy host, Paint lagging behind) show up while drawing rather than only once it is done.
+
+Throughput (strokes/sec and events/sec) is measured over a rolling window of the last `window` seconds, and the ETA is the remaining strokes at that throughput.
+Every `interval` seconds, a line is logged and the status file is rewritten with everything as JSON. The file is replaced atomically, so whatever reads it never sees half of it:
+    {
+        "state": "drawing",                 "drawing" or "done"
+        "updated": 1700000000.0,            unix time the file was written
+        "elapsed_seconds": 12.5,
+        "strokes_per_second": 850.2,
+        "events_per_second": 1600.7,
+        "strokes_drawn": 10628,             including strokes drawn before resuming
+        "strokes_remaining": 51320,         of the colors known so far (in pipelined mode, colors are only known once their instructions are ready)
+        "eta_seconds": 60.4,                null until there is a measured throughput
+        "current_color": "2,4",
+        "colors_done": 3,
+        "num_colors": 30,
+        "colors": {"2,0": {"drawn": 1, "total": 1}, ...}
+    }
+"""
+
+import json
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+from logger import PROGRESS_LOG
+
+
+class DrawingTelemetry:
+    def __init__(self, status_path: Path | None, interval: float = 5.0, window: float = 10.0) -> None:
+        """Telemetry of a drawing, reported every `interval` seconds to the log and to the status file at `status_path` (if any). Throughput is measured over the last `window` seconds."""
+        self._status_path = status_path
+        self._interval = interval
+        self._window = window
+
+        # (drawn, total) strokes of every color, in the order they were added
+        self._colors: dict[str, list[int]] = {}
+        self._current_color: str | None = None
+
+        self._start = time.monotonic()
+        self._last_report = self._start
+        # strokes and events actually sent since the start (ie. not bucketed or drawn before resuming), and timed samples of them for the rolling window
+        self._strokes_sent = 0
+        self._events_sent = 0
+        self._samples: deque[tuple[float, int, int]] = deque(
+            [(self._start, 0, 0)])
+
+    def add_color(self, key: str, num_strokes: int, strokes_drawn: int = 0) -> None:
+        """Add a color with `num_strokes` strokes to the drawing, `strokes_drawn` of which are already drawn (ie. before resuming)."""
+        self._colors[key] = [min(strokes_drawn, num_strokes), num_strokes]
+
+    def start_color(self, key: str) -> None:
+        """Mark the color being drawn now."""
+        self._current_color = key
+
+    def complete(self, key: str) -> None:
+        """Mark a color as fully drawn without having sent its strokes, ie. when it was bucketed."""
+        progress = self._colors[key]
+        progress[0] = progress[1]
+
+    def record(self, key: str, strokes_drawn: int, events_sent: int) -> None:
+        """Record that `strokes_drawn` strokes of the color `key` have been drawn now, `events_sent` input events having been sent since the last record."""
+        progress = self._colors[key]
+        self._strokes_sent += max(strokes_drawn - progress[0], 0)
+        self._events_sent += events_sent
+        progress[0] = strokes_drawn
+
+        now = time.monotonic()
+        self._samples.append((now, self._strokes_sent, self._events_sent))
+        # keep one sample at least as old as the window, so the window is always fully covered
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self._window:
+            self._samples.popleft()
+
+        if self._interval and now - self._last_report >= self._interval:
+            self.report()
+
+    def throughput(self) -> tuple[float, float]:
+        """Strokes per second and events per second over the rolling window."""
+        (first_time, first_strokes, first_events) = self._samples[0]
+        (last_time, last_strokes, last_events) = self._samples[-1]
+        elapsed = last_time - first_time
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (last_strokes - first_strokes) / elapsed, (last_events - first_events) / elapsed
+
+    def status(self, state: str = "drawing") -> dict:
+        """Everything the telemetry knows, as written to the status file."""
+        strokes_per_second, events_per_second = self.throughput()
+        strokes_drawn = sum(drawn for drawn, _ in self._colors.values())
+        strokes_remaining = sum(
+            total - drawn for drawn, total in self._colors.values())
+        return {
+            "state": state,
+            "updated": time.time(),
+            "elapsed_seconds": time.monotonic() - self._start,
+            "strokes_per_second": strokes_per_second,
+            "events_per_second": events_per_second,
+            "strokes_drawn": strokes_drawn,
+            "strokes_remaining": strokes_remaining,
+            "eta_seconds": strokes_remaining / strokes_per_second if strokes_per_second else None,
+            "current_color": self._current_color,
+            "colors_done": sum(drawn >= total for drawn, total in self._colors.values()),
+            "num_colors": len(self._colors),
+            "colors": {key: {"drawn": drawn, "total": total} for key, (drawn, total) in self._colors.items()},
+        }
+
+    def report(self, state: str = "drawing") -> None:
+        """Log the throughput, progress and ETA, and rewrite the status file."""
+        self._last_report = time.monotonic()
+        status = self.status(state)
+
+        eta = f"{status['eta_seconds']:.0f}s" if status["eta_seconds"] is not None else "unknown"
+        PROGRESS_LOG.log(f"{status['strokes_per_second']:.0f} strokes/sec, {status['events_per_second']:.0f} events/sec, "
+                         f"{status['strokes_remaining']} strokes remaining ({status['colors_done']}/{status['num_colors']} colors done), ETA {eta}")
+
+        if self._status_path is not None:
+            self._status_path.parent.mkdir(parents=True, exist_ok=True)
+            # write next to the status file then swap it in, so it's never read half written
+            temp_path = self._status_path.with_name(
+                self._status_path.name + ".tmp")
+            with open(temp_path, "w") as f:
+                json.dump(status, f, indent=4)
+            os.replace(temp_path, self._status_path)
+
+    def finish(self) -> None:
+        """Report one last time, marking the drawing as done."""
+        self.report("done")
@@ -0,0 +1,60 @@
+"""
+Draws every tile of instructions/tiles.py through a SimulatedViewport, without a display, and checks the canvas comes out as the processed image.
+
+Run from the repository root (settings.env is read from the CWD):
+    python -m pytest tests
+"""
+
+import dbm
+
+import numpy as np
+import pytest
+
+from image_processing.palette import Palette
+from instructions import color_keys, from_processed_image, parse_instructions, read_instructions
+from instructions.from_processed_image import INSTRUCTION_TYPE
+from instructions.tiles import plan_tiles
+from interactions.viewport import SimulatedViewport
+
+
+VIEW_SIZE = (100, 80)
+
+
+def _synthetic_image(size: tuple[int, int], palette: Palette) -> np.ndarray:
+    """A processed image of `size` (width, height), mostly one background color with blocks and noise of the others, so tiles differ."""
+    width, height = size
+    rng = np.random.default_rng(0)
+    image = np.zeros((height, width), dtype=np.uint8)
+    for _ in range(12):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        image[y:y + rng.integers(5, 40), x:x + rng.integers(5, 60)] = rng.integers(1, palette.num_colors)
+    noise = rng.random((height, width)) < 0.05
+    image[noise] = rng.integers(0, palette.num_colors, int(noise.sum()))
+    return image
+
+
+# origins (0, 40, 80) by (0, 40, 50, 50), and (0, 60, 120, 133) by (0, 17). Scrolling back from the far edge (133 to 120) is off the notches, so it takes two scrolls
+@pytest.mark.skipif(INSTRUCTION_TYPE != "basic", reason="SimulatedViewport only draws basic instructions")
+@pytest.mark.parametrize(("size", "scroll_step", "num_scrolls"), [
+    ((180, 130), 40, 10),
+    ((233, 97), 30, 8),
+])
+def test_tiles_draw_the_processed_image(tmp_path, size, scroll_step, num_scrolls):
+    palette = Palette()
+    image = _synthetic_image(size, palette)
+    tiles = plan_tiles(image, palette, VIEW_SIZE, scroll_step)
+    background = int(np.argmax(np.bincount(image.ravel())))
+
+    # the first tile buckets the background, which fills the whole canvas
+    viewport = SimulatedViewport(size, VIEW_SIZE, scroll_step, fill=background)
+    for tile_num, tile in enumerate(tiles):
+        path = from_processed_image(tile.image, palette, tmp_path / f"tile_{tile_num}", parallel=False)
+        viewport.scroll_to(tile.origin)
+        assert viewport.origin == tile.origin
+        with dbm.open(path, "r") as db:
+            for key in color_keys(db):
+                strokes = parse_instructions(read_instructions(db, key).decode())
+                viewport.draw(strokes, palette.index(*map(int, key.split(b","))))
+
+    assert np.count_nonzero(viewport.canvas != image) == 0
+    assert viewport.num_scrolls == num_scrolls
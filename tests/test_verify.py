@@ -0,0 +1,65 @@
+"""
+Checks instructions/verify.py catches instruction bundles that don't draw their processed image, without a display.
+
+Run from the repository root (settings.env is read from the CWD):
+    python -m pytest tests
+"""
+
+import dbm
+
+import numpy as np
+import pytest
+
+from image_processing.image.delta import UNCHANGED
+from image_processing.palette import Palette
+from instructions import from_processed_image, read_instructions
+from instructions.verify import PlanVerificationError, check_instructions, verify_instructions
+
+
+@pytest.fixture
+def plan(tmp_path):
+    """A processed image with every palette color and some UNCHANGED pixels, its palette, and the path of its instructions."""
+    palette = Palette()
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, palette.num_colors, (60, 90), dtype=np.uint8)
+    image[rng.random(image.shape) < 0.1] = UNCHANGED
+    path = from_processed_image(image, palette, tmp_path / "instructions", parallel=False)
+    return image, palette, path
+
+
+def _color_key(palette: Palette, index: int) -> bytes:
+    return "{},{}".format(*palette.position(index)).encode()
+
+
+def test_intact_bundle_verifies(plan):
+    image, palette, path = plan
+    reconstruction = np.empty_like(image)
+    report = verify_instructions(path, image, palette, reconstruction=reconstruction)
+    assert report.ok, str(report)
+    assert report.num_strokes > 0
+    assert (reconstruction == image).all()
+    check_instructions(path, image, palette)
+
+
+def test_truncated_color_reports_gaps(plan):
+    image, palette, path = plan
+    key = _color_key(palette, 3)
+    with dbm.open(path, "w") as db:
+        strokes = read_instructions(db, key).decode().split(";")[:-1]
+        # drop the strokes at the end, like a bundle cut off while it was written
+        db[key] = "".join(f"{stroke};" for stroke in strokes[:len(strokes) // 2])
+
+    report = verify_instructions(path, image, palette)
+    assert 0 < report.gaps < np.count_nonzero(image == 3)
+    assert (report.overlaps, report.wrong_color, report.out_of_bounds, report.malformed) == (0, 0, 0, 0)
+    with pytest.raises(PlanVerificationError):
+        check_instructions(path, image, palette)
+
+
+def test_emptied_color_reports_all_its_pixels_as_gaps(plan):
+    image, palette, path = plan
+    with dbm.open(path, "w") as db:
+        db[_color_key(palette, 3)] = b""
+
+    report = verify_instructions(path, image, palette)
+    assert report.gaps == np.count_nonzero(image == 3)